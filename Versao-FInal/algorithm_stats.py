@@ -0,0 +1,142 @@
+# algorithm_stats.py
+
+import os
+import json
+import math
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+class AlgorithmStats:
+    """
+    Histórico local do desempenho dos algoritmos de nesting.
+    Para cada impressão digital de job (quantidade de peças, dispersão das proporções,
+    área média das peças em relação à chapa e espessura) guarda quantas vezes cada algoritmo
+    rodou, quantas vezes venceu e o tempo gasto. Jobs parecidos usam esse histórico para
+    testar primeiro os algoritmos que costumam vencer.
+    """
+    # Com pelo menos MIN_EXECUCOES_DESCARTE execuções e menos de TAXA_MINIMA_VITORIAS de
+    # vitórias, o algoritmo é considerado perdedor crônico para aquela impressão digital.
+    MIN_EXECUCOES_DESCARTE = 10
+    TAXA_MINIMA_VITORIAS = 0.05
+    MIN_ALGORITMOS = 3
+
+    def __init__(self, stats_path="algorithm_stats.json"):
+        self.stats_path = stats_path
+
+    @staticmethod
+    def impressao_digital(retangulos, bins, espessura):
+        """Agrupa jobs parecidos em faixas logarítmicas; retorna a chave usada no histórico."""
+        if not retangulos or not bins:
+            return None
+        largura, altura, margin = bins[0][:3]
+        area_util = max(1.0, (largura - 2 * margin) * (altura - 2 * margin))
+        proporcoes = [max(w, h) / max(1e-9, min(w, h)) for w, h, _ in retangulos]
+        area_media = sum(w * h for w, h, _ in retangulos) / len(retangulos)
+
+        faixa_qtd = int(math.log2(len(retangulos)))
+        faixa_dispersao = int(math.log2(max(proporcoes) / min(proporcoes)))
+        faixa_area = int(-math.log2(min(1.0, area_media / area_util)))
+        return f"n{faixa_qtd}|disp{faixa_dispersao}|area{faixa_area}|esp{float(espessura or 0):g}"
+
+    def _load_stats(self):
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_stats(self, stats):
+        # Vários processos de cálculo podem gravar ao mesmo tempo: escreve e troca de uma vez.
+        tmp_path = f"{self.stats_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=4)
+        os.replace(tmp_path, self.stats_path)
+
+    @contextmanager
+    def _bloqueio(self):
+        """
+        Trava exclusiva entre processos (um arquivo '.lock' ao lado do histórico): cada espessura
+        calculada em paralelo registra o seu job, e sem a trava uma gravação apagaria a outra.
+        """
+        with open(f"{self.stats_path}.lock", 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        time.sleep(0.05)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def ordenar(self, impressao, algoritmos):
+        """
+        Ordena os algoritmos pela taxa de vitórias (com suavização de Laplace) e, no empate,
+        pelo tempo médio. Sem histórico para a impressão digital, a ordem original é mantida.
+        """
+        historico = self._load_stats().get(impressao, {}) if impressao else {}
+        if not historico:
+            return list(algoritmos)
+
+        def _chave(algo):
+            dados = historico.get(algo.__name__, {})
+            execucoes = dados.get('execucoes', 0)
+            taxa = (dados.get('vitorias', 0) + 1) / (execucoes + 2)
+            tempo_medio = dados.get('tempo_total', 0.0) / execucoes if execucoes else 0.0
+            return (-taxa, tempo_medio)
+
+        return sorted(algoritmos, key=_chave)
+
+    def sem_perdedores_cronicos(self, impressao, algoritmos):
+        """Remove os perdedores crônicos, mantendo sempre ao menos MIN_ALGORITMOS algoritmos."""
+        historico = self._load_stats().get(impressao, {}) if impressao else {}
+        mantidos = []
+        for algo in algoritmos:
+            dados = historico.get(algo.__name__, {})
+            execucoes = dados.get('execucoes', 0)
+            perdedor = execucoes >= self.MIN_EXECUCOES_DESCARTE and dados.get('vitorias', 0) / execucoes < self.TAXA_MINIMA_VITORIAS
+            if not perdedor:
+                mantidos.append(algo)
+        if len(mantidos) < self.MIN_ALGORITMOS:
+            mantidos += [algo for algo in algoritmos if algo not in mantidos][:self.MIN_ALGORITMOS - len(mantidos)]
+            mantidos.sort(key=algoritmos.index)
+        return mantidos
+
+    def registrar(self, impressao, tempos_por_algoritmo, vencedores):
+        """
+        Registra um job: 'tempos_por_algoritmo' mapeia o nome de cada algoritmo comparado ao
+        tempo total gasto por ele; 'vencedores' são os nomes dos algoritmos que chegaram à
+        solução escolhida (todos os empatados com ela).
+        """
+        if not impressao or not tempos_por_algoritmo:
+            return
+        # Ler, somar e gravar sob a mesma trava: nenhum registro concorrente se perde.
+        with self._bloqueio():
+            stats = self._load_stats()
+            historico = stats.setdefault(impressao, {})
+            for nome, tempo in tempos_por_algoritmo.items():
+                dados = historico.setdefault(nome, {'execucoes': 0, 'vitorias': 0, 'tempo_total': 0.0})
+                dados['execucoes'] += 1
+                dados['tempo_total'] += tempo
+                if nome in vencedores:
+                    dados['vitorias'] += 1
+            self._save_stats(stats)
+
+    def clear(self):
+        if os.path.exists(self.stats_path):
+            os.remove(self.stats_path)
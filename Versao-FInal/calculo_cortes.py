@@ -3,12 +3,30 @@ import logging
 from PyQt5.QtCore import QObject, pyqtSignal
 from rectpack.maxrects import MaxRectsBssf, MaxRectsBaf, MaxRectsBlsf, MaxRectsBl
 from rectpack.skyline import SkylineBl, SkylineBlWm, SkylineMwf, SkylineMwfl
+from rectpack.guillotine import (Guillotine, GuillotineBssfSas, GuillotineBssfLas, GuillotineBssfMaxas, GuillotineBafSas,
+                                 GuillotineBafLas, GuillotineBlsfSas, GuillotineBssfMinas)
 import math
 import os
+import json
+import numpy as np
+import time
+import queue
+import random
+import atexit
+import threading
+import multiprocessing
+from collections import namedtuple, Counter
+from nesting_cache import NestingCache
+from algorithm_stats import AlgorithmStats
+from remnant_inventory import RemnantInventory
+from nfp_engine import aninhar_formas, carregar_contorno, e_retangular, area_contorno, LIMITE_PECAS_NFP, LIMITE_COMPLEMENTOS_NFP, TEMPO_MAXIMO_NFP
 
 # --- INÍCIO: CONFIGURAÇÃO DE LOGGING PARA DEBUG ---
-logging.basicConfig(filename='debug_nesting.log', level=logging.DEBUG, 
-                    format='%(asctime)s - %(levelname)s - %(message)s', filemode='w')
+# Os processos de trabalho também importam este módulo; só o processo principal
+# configura (e trunca) o arquivo de log.
+if multiprocessing.current_process().name == 'MainProcess':
+    logging.basicConfig(filename='debug_nesting.log', level=logging.DEBUG, 
+                        format='%(asctime)s - %(levelname)s - %(message)s', filemode='w')
 # --- FIM: CONFIGURAÇÃO DE LOGGING ---
 
 # --- INÍCIO: CLASSE PARA EMITIR SINAIS DE STATUS ---
@@ -18,118 +36,358 @@ class StatusSignaler(QObject):
 status_signaler = StatusSignaler()
 # --- FIM: CLASSE PARA EMITIR SINAIS DE STATUS ---
 
-def _merge_scraps(scraps):
+# --- INÍCIO: CANCELAMENTO COOPERATIVO ---
+class NestingCancelado(Exception):
+    """Levantada quando o cálculo é cancelado pelo token de cancelamento."""
+    pass
+
+class CancelamentoToken:
     """
-    Função auxiliar para fundir retângulos de sobras adjacentes.
-    Esta versão é mais robusta e corrige falhas na lógica de fusão horizontal.
+    Token de cancelamento cooperativo: a interface chama 'cancelar()' e o cálculo consulta
+    'verificar()' entre algoritmos, contagens de chapas e tentativas de melhoria.
     """
-    if not scraps:
-        return []
+    def __init__(self):
+        self._evento = threading.Event()
+
+    def cancelar(self):
+        self._evento.set()
 
-    TOLERANCE = 1e-5 
+    @property
+    def cancelado(self):
+        return self._evento.is_set()
 
+    def verificar(self):
+        if self._evento.is_set():
+            raise NestingCancelado("Cálculo cancelado.")
+
+def _verificar_cancelamento(cancelamento):
+    if cancelamento is not None:
+        cancelamento.verificar()
+
+def _aguardar_resultado(fila, cancelamento, timeout=None):
+    """
+    Espera o próximo item de uma fila alimentada pelo pool, consultando o token a cada
+    50 ms. No cancelamento, as tarefas pendentes no pool são canceladas antes de levantar
+    NestingCancelado. Levanta queue.Empty se 'timeout' se esgotar.
+    """
+    if cancelamento is None:
+        return fila.get(timeout=timeout)
+    limite = None if timeout is None else time.perf_counter() + timeout
     while True:
-        merged_in_pass = False
-        i = 0
-        while i < len(scraps):
-            j = i + 1
-            while j < len(scraps):
-                r1 = scraps[i]
-                r2 = scraps[j]
-                
-                merged = False
-
-                # Tenta fusão vertical
-                if abs(r1['x'] - r2['x']) < TOLERANCE and abs(r1['largura'] - r2['largura']) < TOLERANCE:
-                    if abs((r1['y'] + r1['altura']) - r2['y']) < TOLERANCE:
-                        r1['altura'] += r2['altura']
-                        merged = True
-                    elif abs((r2['y'] + r2['altura']) - r1['y']) < TOLERANCE:
-                        r1['y'] = r2['y']
-                        r1['altura'] += r2['altura']
-                        merged = True
-
-                # Tenta fusão horizontal
-                elif abs(r1['y'] - r2['y']) < TOLERANCE and abs(r1['altura'] - r2['altura']) < TOLERANCE:
-                    if abs((r1['x'] + r1['largura']) - r2['x']) < TOLERANCE:
-                        r1['largura'] += r2['largura']
-                        merged = True
-                    elif abs((r2['x'] + r2['largura']) - r1['x']) < TOLERANCE:
-                        # r1 está à direita de r2, expande r1 para a esquerda
-                        r1['x'] = r2['x']
-                        r1['largura'] += r2['largura']
-                        merged = True
-
-                if merged:
-                    scraps.pop(j)
-                    merged_in_pass = True # Não incrementa 'j' para que o próximo item
-                    # (que agora está no índice 'j') seja verificado na próxima iteração do loop.
-                else:
-                    j += 1
-            i += 1
-        
-        if not merged_in_pass:
-            break
-            
-    return scraps
+        if cancelamento.cancelado:
+            _cancelar_tarefas_pendentes()
+            cancelamento.verificar()
+        espera = 0.05 if limite is None else min(0.05, max(0.0, limite - time.perf_counter()))
+        try:
+            return fila.get(timeout=espera)
+        except queue.Empty:
+            if limite is not None and time.perf_counter() >= limite:
+                raise
+# --- FIM: CANCELAMENTO COOPERATIVO ---
 
-def encontrar_sobras(chapa_largura, chapa_altura, pecas_alocadas, min_dim=50):
+# Versão do motor de nesting; faz parte da chave do cache e deve ser incrementada
+# sempre que uma mudança no cálculo alterar os planos gerados.
+VERSAO_MOTOR_NESTING = 14
+
+# Portfólio de algoritmos da busca. No modo guilhotina só entra a família Guillotine do rectpack,
+# cujos layouts sempre podem ser separados por cortes de ponta a ponta (serra de painel, guilhotina).
+ALGORITMOS_PORTFOLIO = (MaxRectsBssf, MaxRectsBaf, MaxRectsBlsf, SkylineBl, SkylineMwf, SkylineBlWm, SkylineMwfl)
+ALGORITMOS_GUILHOTINA = (GuillotineBssfSas, GuillotineBssfLas, GuillotineBssfMaxas, GuillotineBafSas, GuillotineBafLas,
+                         GuillotineBlsfSas, GuillotineBssfMinas)
+
+# --- INÍCIO: POOL DE PROCESSOS PARA O PORTFÓLIO DE ALGORITMOS ---
+# Abaixo deste número de peças o custo de enviar o trabalho aos processos supera o ganho.
+LIMIAR_PECAS_PARALELO = 60
+
+# Peça alocada por um pack, em coordenadas da área de nesting (origem embaixo). 'contorno' só
+# existe nas peças do nesting pela forma real: o polígono já girado, relativo ao canto do corpo.
+PecaAlocada = namedtuple('PecaAlocada', ['x', 'y', 'width', 'height', 'rid', 'contorno'], defaults=(None,))
+
+_pool_processos = None
+# O pool vive enquanto o programa roda: recriá-lo custa reimportar numpy, rectpack e o app em
+# cada processo. Cada lote de tarefas recebe um número sequencial; cancelar as tarefas pendentes
+# grava o último número emitido neste valor compartilhado, que as tarefas consultam (ver CancelamentoLote).
+_lote_cancelado = None
+_ultimo_lote = 0
+
+def _iniciar_processo_de_trabalho(lote_cancelado):
+    global _lote_cancelado
+    _lote_cancelado = lote_cancelado
+
+def _obter_pool():
     """
-    Encontra os maiores retângulos de sobra em uma chapa.
-    Este método usa um algoritmo de varredura (Sweep-line) para robustez,
-    seguido por uma etapa de fusão para consolidar os resultados.
+    Retorna o pool de processos compartilhado, criando-o sob demanda.
+    Dentro de um processo de trabalho retorna None para evitar pools aninhados.
     """
-    logging.debug("Iniciando 'encontrar_sobras' com algoritmo de varredura (Scanline).")
+    global _pool_processos, _lote_cancelado
+    if multiprocessing.current_process().name != 'MainProcess':
+        return None
+    if _pool_processos is None:
+        num_processos = os.cpu_count() or 1
+        if num_processos < 2:
+            return None
+        # 'spawn' é o único método disponível no Windows e evita herdar o estado do Qt no Linux.
+        contexto = multiprocessing.get_context('spawn')
+        _lote_cancelado = contexto.Value('q', 0, lock=False)
+        _pool_processos = contexto.Pool(processes=num_processos, initializer=_iniciar_processo_de_trabalho, initargs=(_lote_cancelado,))
+        logging.info(f"Pool de processos criado com {num_processos} processos.")
+        atexit.register(_encerrar_pool)
+    return _pool_processos
 
-    # 1. Coletar todas as coordenadas Y únicas (eventos da linha de varredura).
-    y_coords = {0, chapa_altura}
-    for p in pecas_alocadas:
-        y_coords.add(p['y'])
-        y_coords.add(p['y'] + p['altura'])
-    
-    sorted_y = sorted(list(y_coords))
-    sobras_brutas = []
+def _encerrar_pool():
+    """Encerra o pool ao sair do programa."""
+    global _pool_processos
+    if _pool_processos is not None:
+        _pool_processos.terminate()
+        _pool_processos.join()
+        _pool_processos = None
+
+class CancelamentoLote:
+    """
+    Token de cancelamento das tarefas de um lote enviado ao pool, com a mesma interface do
+    CancelamentoToken. Atravessa processos: só guarda o número do lote e consulta o valor
+    compartilhado criado com o pool.
+    """
+    def __init__(self, lote):
+        self.lote = lote
+
+    @property
+    def cancelado(self):
+        return _lote_cancelado is not None and _lote_cancelado.value >= self.lote
+
+    def verificar(self):
+        if self.cancelado:
+            raise NestingCancelado("Tarefa de um lote cancelado.")
 
-    # 2. Iterar sobre cada faixa horizontal (strip) criada pelas coordenadas Y.
-    for i in range(len(sorted_y) - 1):
-        y1, y2 = sorted_y[i], sorted_y[i+1]
-        altura_faixa = y2 - y1
+def _novo_lote():
+    """Token para as tarefas do próximo lote enviado ao pool."""
+    global _ultimo_lote
+    _ultimo_lote += 1
+    return CancelamentoLote(_ultimo_lote)
+
+def _cancelar_tarefas_pendentes():
+    """
+    Cancela todos os lotes já enviados ao pool sem encerrar os processos: as tarefas ainda na
+    fila terminam na hora e as que estão rodando param no próximo ponto de verificação. Os
+    resultados delas chegam às filas de lotes já abandonados e são ignorados.
+    """
+    if _lote_cancelado is not None:
+        _lote_cancelado.value = _ultimo_lote
 
-        if altura_faixa < 1e-5:
+def _opcoes_algoritmo(algo):
+    """
+    Parâmetros extras de uma chapa do rectpack. Na família Guillotine a fusão das seções livres
+    fica desligada: seções fundidas de ramos diferentes deixariam de ser cortáveis em guilhotina.
+    """
+    return {'merge': False} if issubclass(algo, Guillotine) else {}
+
+def _empacotar(algo, retangulos, bins_ativos):
+    """
+    Executa um único pack do rectpack. Roda tanto no processo principal quanto nos
+    processos de trabalho, por isso recebe e devolve apenas estruturas serializáveis.
+    Retorna (chapas, tempo) onde 'chapas' é uma lista de (bid, [PecaAlocada, ...]) ou
+    None se alguma peça ficou de fora.
+    """
+    inicio = time.perf_counter()
+    packer = rectpack.newPacker(rotation=True, pack_algo=algo)
+    for r in retangulos:
+        packer.add_rect(r[0], r[1], rid=r[2])
+
+    for bid in bins_ativos:
+        nesting_width = bid[0] - (2 * bid[2])
+        nesting_height = bid[1] - (2 * bid[2])
+        if nesting_width > 0 and nesting_height > 0:
+            packer.add_bin(nesting_width, nesting_height, bid=tuple(bid), **_opcoes_algoritmo(algo))
+
+    packer.pack()
+
+    chapas = None
+    if sum(len(b) for b in packer) == len(retangulos):
+        chapas = [(bin_node.bid, [PecaAlocada(r.x, r.y, r.width, r.height, r.rid) for r in bin_node])
+                  for bin_node in packer if bin_node]
+    return chapas, time.perf_counter() - inicio
+
+def _empacotar_em_processo(algo, retangulos, bins_ativos, cancelamento=None):
+    """Ponto de entrada dos processos de trabalho; devolve também o algoritmo usado."""
+    _verificar_cancelamento(cancelamento)
+    chapas, tempo = _empacotar(algo, retangulos, bins_ativos)
+    return algo, chapas, tempo
+# --- FIM: POOL DE PROCESSOS ---
+
+# --- INÍCIO: EMPACOTAMENTO EM FLUXO PARA JOBS MUITO GRANDES ---
+# O modo em fluxo é opcional: com memória limitada aos planos únicos e bem mais rápido, ele usa em média
+# 10 a 15% mais chapas que a busca com padrões repetidos nos jobs grandes.
+# Chapas mantidas abertas ao mesmo tempo no modo em fluxo.
+JANELA_CHAPAS_ABERTAS = 4
+# Intervalo mínimo (s) entre as entregas do plano parcial no modo em fluxo.
+INTERVALO_PARCIAIS_FLUXO = 2.0
+# Cada entrega parcial copia os planos únicos: a seguinte espera o número de chapas crescer
+# por este fator, e as cópias somam no total um múltiplo do tamanho do job, não o quadrado dele.
+FATOR_PARCIAIS_FLUXO = 1.25
+
+def _gerar_retangulos(tipos_peca, quantidades, por_area=False, escala=None):
+    """
+    Gera os retângulos (w, h, rid) do job sem montar a lista inteira. Os rids seguem a
+    numeração da TabelaPecas; com 'por_area' os tipos saem em ordem decrescente de área.
+    """
+    inicios = np.concatenate(([0], np.cumsum(quantidades, dtype=np.int64)))
+    ordem = range(len(tipos_peca))
+    if por_area:
+        ordem = sorted(ordem, key=lambda i: -tipos_peca[i]['largura_com_offset'] * tipos_peca[i]['altura_com_offset'])
+    for i in ordem:
+        w, h = tipos_peca[i]['largura_com_offset'], tipos_peca[i]['altura_com_offset']
+        if escala:
+            w, h = _inteiro_acima(w, escala), _inteiro_acima(h, escala)
+        for rid in range(int(inicios[i]), int(inicios[i + 1])):
+            yield (w, h, rid)
+
+def _empacotar_em_fluxo(retangulos, bins, algo=MaxRectsBssf, janela=JANELA_CHAPAS_ABERTAS):
+    """
+    Empacotador online com janela limitada. Consome 'retangulos' (um iterável, de preferência
+    em ordem decrescente de área) peça a peça, com no máximo 'janela' chapas abertas: cada
+    peça vai para a chapa aberta de melhor encaixe; se não couber em nenhuma, a chapa aberta
+    mais cheia é fechada e uma nova é aberta. Gera (bid, [PecaAlocada, ...]) à medida que as
+    chapas fecham, então a memória depende da janela e não do tamanho do job.
+    As chapas novas saem de 'bins' na ordem (as sobras do estoque, uma vez cada, e depois as
+    chapas inteiras): a primeira ainda não usada em que a peça cabe. Acabada a lista, a
+    última chapa se repete.
+    """
+    livres = list(range(len(bins)))
+
+    def _abrir(w, h, rid):
+        for posicao, i in enumerate(livres):
+            b_width, b_height, b_margin = bins[i][:3]
+            nova = algo(b_width - (2 * b_margin), b_height - (2 * b_margin), rot=True, **_opcoes_algoritmo(algo))
+            if nova.add_rect(w, h, rid):
+                # A última chapa da lista nunca se esgota.
+                if i != len(bins) - 1:
+                    del livres[posicao]
+                return tuple(bins[i]), nova
+        raise ValueError(f"Peça {w}x{h} não cabe em nenhuma das chapas disponíveis.")
+
+    def _fechar(aberta):
+        bid, chapa = aberta
+        return bid, [PecaAlocada(r.x, r.y, r.width, r.height, r.rid) for r in chapa]
+
+    abertas = []
+    for w, h, rid in retangulos:
+        encaixes = [(f, i) for i, (_, chapa) in enumerate(abertas) for f in (chapa.fitness(w, h),) if f is not None]
+        if encaixes:
+            abertas[min(encaixes)[1]][1].add_rect(w, h, rid)
             continue
+        if len(abertas) >= janela:
+            mais_cheia = max(abertas, key=lambda a: a[1].used_area())
+            abertas.remove(mais_cheia)
+            yield _fechar(mais_cheia)
+        abertas.append(_abrir(w, h, rid))
 
-        # Encontra todas as peças que se sobrepõem a esta faixa horizontal.
-        mid_y = y1 + altura_faixa / 2
-        pecas_na_faixa = [p for p in pecas_alocadas if p['y'] <= mid_y < (p['y'] + p['altura'])]
-        
-        # 3. Ordena as peças na faixa pelo eixo X para encontrar os vãos.
-        pecas_na_faixa.sort(key=lambda p: p['x'])
-
-        # 4. Encontra os espaços vazios (vãos) no eixo X.
-        ponteiro_x = 0
-        for p in pecas_na_faixa:
-            if p['x'] > ponteiro_x:
-                largura_sobra = p['x'] - ponteiro_x
-                if largura_sobra > 1e-5:
-                    sobras_brutas.append({
-                        'x': ponteiro_x, 'y': y1,
-                        'largura': largura_sobra, 'altura': altura_faixa
-                    })
-            ponteiro_x = max(ponteiro_x, p['x'] + p['largura'])
-        
-        # 5. Verifica se há um último vão após a última peça até a borda da chapa.
-        if ponteiro_x < chapa_largura:
-            largura_sobra = chapa_largura - ponteiro_x
-            if largura_sobra > 1e-5:
-                sobras_brutas.append({
-                    'x': ponteiro_x, 'y': y1,
-                    'largura': largura_sobra, 'altura': altura_faixa
-                })
+    for aberta in sorted(abertas, key=lambda a: -a[1].used_area()):
+        yield _fechar(aberta)
+# --- FIM: EMPACOTAMENTO EM FLUXO ---
+
+def _fundir_retangulos_livres(retangulos):
+    """
+    Funde retângulos livres adjacentes dados em índices inteiros da grade comprimida
+    (linha_ini, linha_fim, coluna_ini, coluna_fim). Como os índices são exatos, não há
+    tolerância numérica: alterna fusões verticais (mesmas colunas) e horizontais (mesmas
+    linhas) até não haver mais mudança.
+    """
+    while True:
+        quantidade_inicial = len(retangulos)
+        for vertical in (True, False):
+            grupos = {}
+            for r in retangulos:
+                grupos.setdefault((r[2], r[3]) if vertical else (r[0], r[1]), []).append(r)
+            ini, fim = (0, 1) if vertical else (2, 3)
+            fundidos = []
+            for lista in grupos.values():
+                lista.sort(key=lambda r: r[ini])
+                atual = list(lista[0])
+                for r in lista[1:]:
+                    if r[ini] == atual[fim]:
+                        atual[fim] = r[fim]
+                    else:
+                        fundidos.append(tuple(atual))
+                        atual = list(r)
+                fundidos.append(tuple(atual))
+            retangulos = fundidos
+        if len(retangulos) == quantidade_inicial:
+            return retangulos
+
+def _grade_de_ocupacao(chapa_largura, chapa_altura, retangulos):
+    """
+    Grade de ocupação de uma chapa sobre as coordenadas comprimidas das bordas dos
+    retângulos (x, y, largura, altura). Retorna (xs, ys, livre): as bordas das colunas e das
+    linhas da grade e a matriz booleana das células que nenhum retângulo cobre.
+    """
+    # 1. Coordenadas comprimidas: todas as bordas das peças, limitadas à chapa.
+    coords = np.asarray(retangulos).reshape(-1, 4)
+    inteiro = np.issubdtype(coords.dtype, np.integer)
+    x0, y0 = coords[:, 0], coords[:, 1]
+    x1, y1 = x0 + coords[:, 2], y0 + coords[:, 3]
+    x0, x1 = np.clip(x0, 0, chapa_largura), np.clip(x1, 0, chapa_largura)
+    y0, y1 = np.clip(y0, 0, chapa_altura), np.clip(y1, 0, chapa_altura)
+    if not inteiro:
+        # O arredondamento junta bordas que só diferem por erro de ponto flutuante; em
+        # inteiros (modo inteiro) as bordas já são exatas.
+        x0, x1, y0, y1 = (np.round(v.astype(float), 6) for v in (x0, x1, y0, y1))
+        chapa_largura, chapa_altura = round(chapa_largura, 6), round(chapa_altura, 6)
+    xs = np.unique(np.concatenate(([0, chapa_largura], x0, x1)))
+    ys = np.unique(np.concatenate(([0, chapa_altura], y0, y1)))
+
+    # 2. Grade de ocupação por soma de prefixos 2D: cada peça marca +1 no canto inferior
+    #    esquerdo e compensa nos outros cantos; a soma acumulada dá a cobertura de cada célula.
+    cobertura = np.zeros((len(ys), len(xs)), dtype=np.int32)
+    if len(coords):
+        i0, i1 = np.searchsorted(ys, y0), np.searchsorted(ys, y1)
+        j0, j1 = np.searchsorted(xs, x0), np.searchsorted(xs, x1)
+        np.add.at(cobertura, (i0, j0), 1)
+        np.add.at(cobertura, (i0, j1), -1)
+        np.add.at(cobertura, (i1, j0), -1)
+        np.add.at(cobertura, (i1, j1), 1)
+    livre = np.cumsum(np.cumsum(cobertura, axis=0), axis=1)[:-1, :-1] == 0
+    return xs, ys, livre
+
+def _area_uniao(chapa_largura, chapa_altura, retangulos):
+    """Área coberta pela união dos retângulos (x, y, largura, altura); sobreposições contam uma vez."""
+    if not len(retangulos):
+        return 0.0
+    xs, ys, livre = _grade_de_ocupacao(chapa_largura, chapa_altura, retangulos)
+    areas_celulas = np.outer(np.diff(ys), np.diff(xs))
+    return float(areas_celulas[~livre].sum())
+
+def encontrar_sobras(chapa_largura, chapa_altura, pecas_alocadas, min_dim=50, escala=None):
+    """
+    Encontra os maiores retângulos de sobra em uma chapa.
+    'pecas_alocadas' é um array Nx4 de (x, y, largura, altura) ou uma lista de dicionários
+    com essas chaves. Monta uma grade de ocupação (NumPy) sobre as coordenadas comprimidas das bordas das
+    peças, extrai os vãos livres de cada linha da grade de uma vez e funde os vãos
+    adjacentes em retângulos disjuntos.
+    Com 'escala' (modo inteiro), chapa e peças vêm em inteiros de 1/escala mm: a grade e a
+    fusão rodam sobre as bordas exatas e as sobras voltam em mm.
+    """
+    logging.debug(f"Iniciando 'encontrar_sobras' com grade de ocupação para {len(pecas_alocadas)} peças.")
 
-    # 6. Fundir os retângulos de sobra adjacentes para formar peças maiores.
-    sobras_fundidas = _merge_scraps(sobras_brutas)
+    if len(pecas_alocadas) and isinstance(pecas_alocadas[0], dict):
+        pecas_alocadas = [(p['x'], p['y'], p['largura'], p['altura']) for p in pecas_alocadas]
+    # 1-2. Coordenadas comprimidas e grade de ocupação.
+    xs, ys, livre = _grade_de_ocupacao(chapa_largura, chapa_altura, pecas_alocadas)
 
-    # 7. Filtrar pelo tamanho mínimo e classificar
+    # 3. Vãos livres de cada linha: inícios e fins das sequências de células livres.
+    bordas = np.diff(np.pad(livre, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    inicios, fins = np.argwhere(bordas == 1), np.argwhere(bordas == -1)
+    vaos = [(linha, linha + 1, c0, c1) for (linha, c0), (_, c1) in zip(inicios.tolist(), fins.tolist())]
+
+    # 4. Fundir os vãos adjacentes para formar peças maiores (só depois as medidas voltam para mm).
+    escala = escala or 1
+    sobras_fundidas = [
+        {'x': float(xs[c0]) / escala, 'y': float(ys[r0]) / escala,
+         'largura': float(xs[c1] - xs[c0]) / escala, 'altura': float(ys[r1] - ys[r0]) / escala}
+        for r0, r1, c0, c1 in _fundir_retangulos_livres(vaos)
+    ]
+    chapa_largura, chapa_altura = chapa_largura / escala, chapa_altura / escala
+
+    # 5. Filtrar pelo tamanho mínimo e classificar
     sobras_finais = []
     for s in sobras_fundidas:
         if s['largura'] >= min_dim and s['altura'] >= min_dim:
@@ -154,40 +412,1384 @@ def encontrar_sobras(chapa_largura, chapa_altura, pecas_alocadas, min_dim=50):
             s['potential_reuse_score'] = score
             sobras_finais.append(s)
 
-    logging.debug(f"Finalizado 'encontrar_sobras' (Scanline). Encontradas {len(sobras_finais)} sobras válidas.")
+    logging.debug(f"Finalizado 'encontrar_sobras'. Encontradas {len(sobras_finais)} sobras válidas.")
     return sobras_finais
 
-def orquestrar_planos_de_corte(chapa_largura, chapa_altura, pecas, offset, margin, espessura, peso_especifico_base=7.85, status_signal_emitter=None):
+def _area_real_peca(peca_info):
+    """Área real de uma peça conforme a forma (sem o offset)."""
+    forma = peca_info.get('forma')
+    if forma == 'circle':
+        return math.pi * (peca_info['diametro'] / 2)**2
+    if forma == 'right_triangle':
+        # A área de um triângulo é (base*altura)/2.
+        return peca_info['largura_sem_offset'] * peca_info['altura_sem_offset'] * 0.5
+    if forma in ['trapezoid', 'paired_trapezoid']:
+        # A área de um trapézio é ((B+b)*h)/2. Um par tem o dobro.
+        fator = 0.5 if forma == 'trapezoid' else 1.0
+        dims = peca_info['orig_dims']
+        return (dims['large_base'] + dims['small_base']) * dims['height'] * fator
+    if forma == 'common_line_block':
+        dims = peca_info['orig_dims']
+        return dims['largura'] * dims['altura'] * dims['colunas'] * dims['linhas']
+    if peca_info.get('contorno'):
+        return area_contorno(peca_info['contorno'])
+    # Para retângulos e DXFs sem contorno (usa bounding box como aproximação)
+    return peca_info['largura_sem_offset'] * peca_info['altura_sem_offset']
+
+class TabelaPecas:
+    """
+    Representação compacta das peças de um job: um dicionário de informações por tipo e o
+    rid inicial de cada tipo. Os rids são inteiros sequenciais, tipo a tipo, e 'tabela[rid]'
+    devolve o dicionário do tipo; nada é guardado por peça física.
+    """
+    __slots__ = ('tipos', 'inicios', 'areas_reais', 'dimensoes')
+
+    def __init__(self, tipos, quantidades):
+        self.tipos = tipos
+        self.inicios = np.concatenate(([0], np.cumsum(quantidades, dtype=np.int64)))
+        self.areas_reais = np.array([_area_real_peca(t) for t in tipos], dtype=float)
+        self.dimensoes = np.array([(t['largura_com_offset'], t['altura_com_offset']) for t in tipos], dtype=float).reshape(-1, 2)
+
+    def __len__(self):
+        return int(self.inicios[-1])
+
+    def __getitem__(self, rid):
+        return self.tipos[self._tipo(rid)]
+
+    def _tipo(self, rids):
+        """Índice do tipo de cada rid (escalar ou array), pela busca binária nos inícios."""
+        return np.searchsorted(self.inicios, rids, side='right') - 1
+
+    def _somar(self, areas_por_tipo, rids):
+        rids = np.fromiter(rids, dtype=np.int64)
+        return float(areas_por_tipo[self._tipo(rids)].sum()) if len(rids) else 0.0
+
+    def area_real(self, rids):
+        """Soma das áreas reais (conforme a forma) das peças 'rids'."""
+        return self._somar(self.areas_reais, rids)
+
+    def coordenadas(self, chapa, escala=None):
+        """
+        Array Nx4 (x, y, largura, altura) das peças alocadas de uma chapa, em mm. No modo
+        inteiro, posições voltam da escala e medidas voltam às exatas do tipo, na orientação
+        em que cada peça foi alocada.
+        """
+        # Sem escala o array mantém o tipo das posições da busca (inteiras no rectpack).
+        coords = np.array([r[:4] for r in chapa] or np.empty((0, 4))).reshape(-1, 4)
+        if not escala or not len(coords):
+            return coords
+        coords = coords.astype(float)
+        rids = np.fromiter((r.rid for r in chapa), dtype=np.int64, count=len(chapa))
+        dims = self.dimensoes[self._tipo(rids)]
+        girada = np.any(coords[:, 2:] != _inteiros_acima(dims, escala), axis=1)
+        dims[girada] = dims[girada, ::-1]
+        coords[:, :2] /= escala
+        coords[:, 2:] = dims
+        return coords
+
+def _limite_inferior_chapas(retangulos, bins):
+    """
+    Calcula um limite inferior para o número de chapas necessárias.
+    Combina o limite de área (área das peças contra a área útil acumulada das chapas,
+    na ordem em que serão usadas) com o limite dimensional (peças maiores que meia
+    chapa nos dois eixos não podem dividir a mesma chapa entre si).
+    """
+    areas_uteis, larguras_uteis, alturas_uteis = [], [], []
+    for b in bins:
+        nesting_width, nesting_height = b[0] - (2 * b[2]), b[1] - (2 * b[2])
+        if nesting_width > 0 and nesting_height > 0:
+            areas_uteis.append(nesting_width * nesting_height)
+            larguras_uteis.append(nesting_width)
+            alturas_uteis.append(nesting_height)
+
+    if not areas_uteis:
+        return len(bins) + 1
+
+    # 1. Limite de área: quantas chapas (na ordem da lista) são necessárias só para cobrir a área.
+    area_pecas = sum(r[0] * r[1] for r in retangulos)
+    limite_area, area_acumulada = 0, 0
+    for area in areas_uteis:
+        if area_acumulada >= area_pecas:
+            break
+        area_acumulada += area
+        limite_area += 1
+    if area_acumulada < area_pecas:
+        limite_area = len(bins) + 1
+
+    # 2. Limite dimensional: conta as peças "grandes" em qualquer orientação que caiba na maior chapa.
+    max_w, max_h = max(larguras_uteis), max(alturas_uteis)
+    pecas_grandes = 0
+    for r in retangulos:
+        orientacoes = [(w, h) for w, h in ((r[0], r[1]), (r[1], r[0])) if w <= max_w and h <= max_h]
+        if all(w > max_w / 2 and h > max_h / 2 for w, h in orientacoes):
+            pecas_grandes += 1
+
+    return max(1, limite_area, pecas_grandes)
+
+# --- INÍCIO: PADRÃO ANALÍTICO EM GRADE PARA JOBS HOMOGÊNEOS ---
+# Até este número de peças por chapa o padrão analítico também é comparado com um pack de uma chapa.
+LIMITE_PECAS_PADRAO_RECTPACK = 300
+
+def _quantas_cabem(comprimento, passo):
+    """Quantas peças de tamanho 'passo' cabem em 'comprimento' (com tolerância numérica)."""
+    if passo <= 0 or comprimento <= 0:
+        return 0
+    return int((comprimento + 1e-9) // passo)
+
+def _posicoes_grade(x0, y0, largura, altura, p, q):
+    """Posições (x, y, largura, altura) de uma grade de peças p x q dentro da região."""
+    nx, ny = _quantas_cabem(largura, p), _quantas_cabem(altura, q)
+    return [(x0 + i * p, y0 + j * q, p, q) for j in range(ny) for i in range(nx)]
+
+def _melhor_grade_pura(largura, altura, w, h):
+    """Retorna (quantidade, (p, q)) da melhor grade com uma única orientação."""
+    normal = _quantas_cabem(largura, w) * _quantas_cabem(altura, h)
+    girada = _quantas_cabem(largura, h) * _quantas_cabem(altura, w)
+    return (normal, (w, h)) if normal >= girada else (girada, (h, w))
+
+def _regioes_grade(largura, altura, w, h):
+    """
+    Calcula o padrão em blocos com mais peças w x h na área largura x altura.
+    Avalia as duas orientações e os padrões de dois estágios: um bloco de k colunas
+    (ou k linhas) em uma orientação, a faixa que sobra ao lado dele na orientação
+    girada e o restante da chapa com a melhor grade pura.
+    Retorna as regiões do padrão, cada uma (x0, y0, largura, altura, p, q) preenchida por
+    uma grade pura de peças p x q.
+    """
+    melhor_qtd, melhor_padrao = 0, None
+    for p, q in ((w, h), (h, w)):
+        nx, ny = _quantas_cabem(largura, p), _quantas_cabem(altura, q)
+        if nx == 0 or ny == 0:
+            continue
+        for k in range(1, nx + 1):
+            qtd = (k * ny + _quantas_cabem(k * p, q) * _quantas_cabem(altura - ny * q, p)
+                   + _melhor_grade_pura(largura - k * p, altura, w, h)[0])
+            if qtd > melhor_qtd:
+                melhor_qtd, melhor_padrao = qtd, ('colunas', p, q, k)
+        for k in range(1, ny + 1):
+            qtd = (k * nx + _quantas_cabem(largura - nx * p, q) * _quantas_cabem(k * q, p)
+                   + _melhor_grade_pura(largura, altura - k * q, w, h)[0])
+            if qtd > melhor_qtd:
+                melhor_qtd, melhor_padrao = qtd, ('linhas', p, q, k)
+
+    if melhor_padrao is None:
+        return []
+
+    tipo, p, q, k = melhor_padrao
+    nx, ny = _quantas_cabem(largura, p), _quantas_cabem(altura, q)
+    if tipo == 'colunas':
+        larg_bloco = k * p
+        _, (pr, qr) = _melhor_grade_pura(largura - larg_bloco, altura, w, h)
+        return [(0, 0, larg_bloco, ny * q, p, q), (0, ny * q, larg_bloco, altura - ny * q, q, p),
+                (larg_bloco, 0, largura - larg_bloco, altura, pr, qr)]
+    alt_bloco = k * q
+    _, (pr, qr) = _melhor_grade_pura(largura, altura - alt_bloco, w, h)
+    return [(0, 0, nx * p, alt_bloco, p, q), (nx * p, 0, largura - nx * p, alt_bloco, q, p),
+            (0, alt_bloco, largura, altura - alt_bloco, pr, qr)]
+
+def _padrao_grade(largura, altura, w, h):
+    """Posições (x, y, largura, altura) do padrão em blocos de '_regioes_grade'."""
+    return [pos for regiao in _regioes_grade(largura, altura, w, h) for pos in _posicoes_grade(*regiao)]
+
+def _padrao_uma_chapa(amostra, largura, altura, algoritmos=None, cancelamento=None, contador=None):
+    """
+    Empacota em uma única chapa o máximo (em área) da amostra de retângulos (w, h, rid),
+    testando todo o portfólio de algoritmos (ou 'algoritmos'). Retorna a lista [(x, y, w, h, rid), ...] do melhor.
+    Cada pack executado é somado em contador['packs'] (um Counter), quando informado.
+    """
+    melhor, melhor_area = [], 0
+    for algo in algoritmos or ALGORITMOS_PORTFOLIO:
+        _verificar_cancelamento(cancelamento)
+        if contador is not None:
+            contador['packs'] += 1
+        packer = rectpack.newPacker(rotation=True, pack_algo=algo, bin_algo=rectpack.PackingBin.BFF)
+        for r in amostra:
+            packer.add_rect(*r)
+        packer.add_bin(largura, altura, **_opcoes_algoritmo(algo))
+        packer.pack()
+        if packer:
+            area = sum(r.width * r.height for r in packer[0])
+            if area > melhor_area:
+                melhor, melhor_area = [(r.x, r.y, r.width, r.height, r.rid) for r in packer[0]], area
+    return melhor
+
+def _solucao_grade_homogenea(pecas_processadas, retangulos, bins, algoritmos=None, cancelamento=None, contador=None):
+    """
+    Atalho para jobs com um único tipo de retângulo: as chapas cheias repetem um padrão
+    calculado analiticamente e só a chapa final (a "cauda") passa pelo rectpack.
+    Retorna as chapas no mesmo formato de '_empacotar', ou None se o job não se qualifica.
+    """
+    if len(pecas_processadas) != 1 or pecas_processadas[0].get('forma', 'rectangle') != 'rectangle' or not retangulos:
+        return None
+    if len(set(tuple(b[:3]) for b in bins)) != 1:
+        return None
+
+    bid = tuple(bins[0][:3])
+    b_width, b_height, b_margin = bid
+    w, h = retangulos[0][0], retangulos[0][1]
+    posicoes = _padrao_grade(b_width - (2 * b_margin), b_height - (2 * b_margin), w, h)
+
+    # Quando poucas peças cabem por chapa, um pack de uma única chapa é barato e às vezes
+    # encontra arranjos de três estágios que os padrões em blocos não cobrem.
+    limite_por_chapa = _quantas_cabem((b_width - (2 * b_margin)) * (b_height - (2 * b_margin)), w * h)
+    if len(posicoes) < min(limite_por_chapa, len(retangulos)) and limite_por_chapa <= LIMITE_PECAS_PADRAO_RECTPACK:
+        amostra = [(w, h, i) for i in range(min(limite_por_chapa, len(retangulos)))]
+        alocadas = _padrao_uma_chapa(amostra, b_width - (2 * b_margin), b_height - (2 * b_margin), algoritmos, cancelamento, contador)
+        if len(alocadas) > len(posicoes):
+            posicoes = [(x, y, p, q) for x, y, p, q, _ in alocadas]
+
+    if not posicoes:
+        return None
+
+    num_cheias, resto = divmod(len(retangulos), len(posicoes))
+    if num_cheias + (1 if resto else 0) > len(bins):
+        return None
+
+    chapas = []
+    for i in range(num_cheias):
+        lote = retangulos[i * len(posicoes):(i + 1) * len(posicoes)]
+        chapas.append((bid, [PecaAlocada(x, y, p, q, r[2]) for (x, y, p, q), r in zip(posicoes, lote)]))
+
+    if resto:
+        cauda = retangulos[num_cheias * len(posicoes):]
+        chapas_cauda, _ = _empacotar((algoritmos or ALGORITMOS_PORTFOLIO)[0], cauda, [bid])
+        if contador is not None:
+            contador['packs'] += 1
+        if chapas_cauda is None or len(chapas_cauda) != 1:
+            # O rectpack não fechou a cauda em uma chapa: usa o início do próprio padrão.
+            posicoes_cauda = sorted(posicoes, key=lambda pos: (pos[1], pos[0]))[:resto]
+            chapas_cauda = [(bid, [PecaAlocada(x, y, p, q, r[2]) for (x, y, p, q), r in zip(posicoes_cauda, cauda)])]
+        chapas.extend(chapas_cauda)
+
+    return chapas
+# --- FIM: PADRÃO ANALÍTICO EM GRADE ---
+
+# --- INÍCIO: GERAÇÃO DE PADRÕES PARA JOBS DE ALTA QUANTIDADE ---
+# A partir deste número de peças o job é resolvido por padrões de chapa repetidos.
+LIMIAR_PECAS_PADROES = 500
+# O resíduo que volta para a busca completa fica abaixo destes dois limites.
+LIMIAR_PECAS_RESIDUO = 200
+CHAPAS_RESIDUO = 2
+FOLGA_AMOSTRA_PADRAO = 2.0
+APROVEITAMENTO_MINIMO_PADRAO = 0.93
+
+def _solucao_por_padroes(retangulos, bins, cancelamento=None, algoritmos=None, contador=None):
+    """
+    Procedimento sequencial de geração de padrões (no espírito da geração de colunas do
+    problema de corte de estoque): a cada passo empacota uma chapa com uma amostra da demanda
+    restante de cada tipo, repete esse padrão o máximo de vezes que a demanda permite e abate
+    as peças usadas. O custo depende do número de tipos distintos, não da quantidade total.
+    Retorna (chapas_fixas, retangulos_restantes) com o resíduo pequeno para a busca completa,
+    ou None se o job não se qualifica. Com chapas de formatos diferentes, os padrões usam só as
+    chapas iniciais do primeiro formato e o resíduo segue para as demais.
+    """
+    if len(retangulos) < LIMIAR_PECAS_PADROES or not bins:
+        return None
+
+    bid = tuple(bins[0][:3])
+    num_prefixo = next((i for i, b in enumerate(bins) if tuple(b[:3]) != bid), len(bins))
+    b_width, b_height, b_margin = bid
+    nesting_width, nesting_height = b_width - (2 * b_margin), b_height - (2 * b_margin)
+    if nesting_width <= 0 or nesting_height <= 0:
+        return None
+    area_util = nesting_width * nesting_height
+
+    # Demanda por tipo (dimensões); cada tipo guarda a pilha de peças ainda não alocadas.
+    demanda = {}
+    for r in retangulos:
+        demanda.setdefault((r[0], r[1]), []).append(r)
+    tipos = sorted(demanda, key=lambda t: t[0] * t[1], reverse=True)
+
+    chapas_fixas = []
+    while True:
+        _verificar_cancelamento(cancelamento)
+        pecas_restantes = sum(len(demanda[t]) for t in tipos)
+        area_restante = sum(t[0] * t[1] * len(demanda[t]) for t in tipos)
+        if pecas_restantes <= LIMIAR_PECAS_RESIDUO and area_restante <= CHAPAS_RESIDUO * area_util:
+            break
+        if len(chapas_fixas) >= num_prefixo:
+            break
+
+        # Amostra proporcional à demanda restante, com folga para o empacotador escolher:
+        # padrões com a mesma proporção da demanda se repetem mais vezes.
+        chapas_estimadas = area_restante / area_util
+        amostra = []
+        for t in tipos:
+            n = min(len(demanda[t]), _quantas_cabem(area_util, t[0] * t[1]),
+                    math.ceil(FOLGA_AMOSTRA_PADRAO * len(demanda[t]) / max(1.0, chapas_estimadas)))
+            amostra.extend((t[0], t[1], t) for _ in range(n))
+
+        padrao = _padrao_uma_chapa(amostra, nesting_width, nesting_height, algoritmos, cancelamento, contador)
+        # Um padrão fraco repetido várias vezes custa mais chapas que deixar essas peças para a busca.
+        if not padrao or sum(w * h for _, _, w, h, _ in padrao) < APROVEITAMENTO_MINIMO_PADRAO * area_util:
+            break
+
+        uso = {}
+        for *_, t in padrao:
+            uso[t] = uso.get(t, 0) + 1
+        repeticoes = min(min(len(demanda[t]) // n for t, n in uso.items()), num_prefixo - len(chapas_fixas))
+
+        for _ in range(repeticoes):
+            chapas_fixas.append((bid, [PecaAlocada(x, y, w, h, demanda[t].pop()[2]) for x, y, w, h, t in padrao]))
+        logging.debug(f"Padrão com {len(padrao)} peça(s) de {len(uso)} tipo(s) repetido {repeticoes} vez(es).")
+
+    if not chapas_fixas:
+        return None
+    return chapas_fixas, [r for t in tipos for r in demanda[t]]
+# --- FIM: GERAÇÃO DE PADRÕES ---
+
+# --- INÍCIO: RETICULADO ANALÍTICO PARA JOBS SÓ DE CÍRCULOS ---
+def _reticulado_circulos(largura, altura, passo):
+    """
+    Calcula o reticulado com mais círculos de 'passo' (diâmetro + offset) na área largura x altura.
+    Compara a grade quadrada com os reticulados hexagonais (fileiras alternadas deslocadas de
+    meio passo) com as fileiras ao longo de x ou de y. Retorna as posições (x, y, passo, passo)
+    das caixas envolventes; no hexagonal as caixas se sobrepõem, mas os círculos não.
+    """
+    if passo <= 0 or largura < passo - 1e-9 or altura < passo - 1e-9:
+        return []
+
+    def _hexagonal(comprimento, profundidade):
+        # Centros de fileiras vizinhas ficam a exatamente 'passo' de distância.
+        dy = passo * math.sqrt(3) / 2
+        num_fileiras = int((profundidade - passo + 1e-9) // dy) + 1
+        posicoes = []
+        for j in range(num_fileiras):
+            deslocamento = passo / 2 if j % 2 else 0
+            for i in range(_quantas_cabem(comprimento - deslocamento, passo)):
+                posicoes.append((deslocamento + i * passo, j * dy))
+        return posicoes
+
+    candidatos = [
+        [(x, y) for x, y, _, _ in _posicoes_grade(0, 0, largura, altura, passo, passo)],
+        _hexagonal(largura, altura),
+        [(x, y) for y, x in _hexagonal(altura, largura)]
+    ]
+    melhor = max(candidatos, key=len)
+    return [(x, y, passo, passo) for x, y in melhor]
+
+def _solucao_circulos(retangulos, tabela_pecas, bins):
+    """
+    Atalho para jobs só de círculos com chapas iguais: cada grupo de diâmetro preenche chapas
+    cheias com o seu reticulado. Se só um grupo deixa sobra, ela ocupa o início do reticulado
+    em uma última chapa; sobras de grupos diferentes voltam para a busca com o rectpack.
+    Retorna (chapas_fixas, retangulos_restantes), ou None se o job não se qualifica.
+    """
+    if not retangulos or any(tabela_pecas[r[2]].get('forma') != 'circle' for r in retangulos):
+        return None
+    if len(set(tuple(b[:3]) for b in bins)) != 1:
+        return None
+
+    bid = tuple(bins[0][:3])
+    b_width, b_height, b_margin = bid
+    grupos = {}
+    for r in retangulos:
+        grupos.setdefault((r[0], r[1]), []).append(r)
+
+    chapas_fixas, sobras = [], []
+    for (w, h), lista in sorted(grupos.items(), reverse=True):
+        posicoes = _reticulado_circulos(b_width - (2 * b_margin), b_height - (2 * b_margin), max(w, h))
+        if not posicoes:
+            return None
+        num_cheias, resto = divmod(len(lista), len(posicoes))
+        for i in range(num_cheias):
+            lote = lista[i * len(posicoes):(i + 1) * len(posicoes)]
+            chapas_fixas.append((bid, [PecaAlocada(x, y, p, q, r[2]) for (x, y, p, q), r in zip(posicoes, lote)]))
+        if resto:
+            sobras.append((posicoes, lista[num_cheias * len(posicoes):]))
+
+    if len(sobras) == 1:
+        posicoes, cauda = sobras[0]
+        posicoes_cauda = sorted(posicoes, key=lambda pos: (pos[1], pos[0]))[:len(cauda)]
+        chapas_fixas.append((bid, [PecaAlocada(x, y, p, q, r[2]) for (x, y, p, q), r in zip(posicoes_cauda, cauda)]))
+        sobras = []
+
+    if len(chapas_fixas) > len(bins):
+        return None
+    return chapas_fixas, [r for _, cauda in sobras for r in cauda]
+# --- FIM: RETICULADO ANALÍTICO PARA CÍRCULOS ---
+
+# --- INÍCIO: ETAPA DE MELHORIA MULTI-INÍCIO ---
+# Orçamento da etapa de melhoria: o que acabar primeiro entre tempo e número de tentativas.
+# O tempo cresce com o número de peças (o custo de cada tentativa também), entre o mínimo e o máximo.
+TEMPO_MAXIMO_MELHORIA = 5.0
+TEMPO_MINIMO_MELHORIA = 1.5
+TEMPO_MELHORIA_POR_PECA = 0.02
+TENTATIVAS_MELHORIA = 120
+# Na remoção de uma chapa, as outras podem passar da ocupação da chapa mais cheia do plano em
+# até esta fração do que falta para 100%; acima disso as tentativas quase nunca fecham.
+FOLGA_OCUPACAO_MELHORIA = 0.35
+ALGORITMOS_MELHORIA = (MaxRectsBssf, MaxRectsBaf, MaxRectsBlsf, SkylineMwfl, SkylineBlWm)
+ALGORITMOS_MELHORIA_GUILHOTINA = (GuillotineBssfSas, GuillotineBafSas, GuillotineBssfMaxas, GuillotineBlsfSas)
+
+def _tentativas_de_melhoria(retangulos, bins_ativos, rids_prioritarios, semente, max_tentativas, duracao, cancelamento=None,
+                            algoritmos=ALGORITMOS_MELHORIA):
+    """
+    Tenta alocar todas as peças em 'bins_ativos' (uma chapa a menos que a melhor solução)
+    com reinícios aleatórios: ordem por área com ruído, as peças da chapa removida
+    ('rids_prioritarios') primeiro em metade das tentativas, giros sorteados e um algoritmo
+    sorteado de 'algoritmos'. Roda tanto no processo principal quanto nos de trabalho.
+    Retorna (chapas, tentativas), com chapas=None se nenhuma tentativa fechou.
+    """
+    rng = random.Random(semente)
+    inicio = time.perf_counter()
+    largura_max = max(b[0] - (2 * b[2]) for b in bins_ativos)
+    altura_max = max(b[1] - (2 * b[2]) for b in bins_ativos)
+    tentativas = 0
+    while tentativas < max_tentativas and time.perf_counter() - inicio < duracao:
+        _verificar_cancelamento(cancelamento)
+        tentativas += 1
+        ruido = rng.uniform(0.05, 0.6)
+        priorizar = tentativas % 2 == 1
+        ordem = sorted(retangulos, key=lambda r: (priorizar and r[2] in rids_prioritarios,
+                                                   r[0] * r[1] * (1 + rng.uniform(0, ruido))), reverse=True)
+        rotacao = rng.random() < 0.5
+        algo = rng.choice(algoritmos)
+        packer = rectpack.newPacker(rotation=rotacao, pack_algo=algo, sort_algo=rectpack.SORT_NONE)
+        for w, h, rid in ordem:
+            # Sem rotação livre, cada peça entra na orientação sorteada (ou na única que cabe).
+            cabe_normal, cabe_girada = w <= largura_max and h <= altura_max, h <= largura_max and w <= altura_max
+            if not rotacao and cabe_girada and (not cabe_normal or rng.random() < 0.5):
+                w, h = h, w
+            packer.add_rect(w, h, rid=rid)
+        for bid in bins_ativos:
+            packer.add_bin(bid[0] - (2 * bid[2]), bid[1] - (2 * bid[2]), bid=tuple(bid), **_opcoes_algoritmo(algo))
+        packer.pack()
+        if sum(len(b) for b in packer) == len(retangulos):
+            chapas = [(bin_node.bid, [PecaAlocada(r.x, r.y, r.width, r.height, r.rid) for r in bin_node])
+                      for bin_node in packer if bin_node]
+            return chapas, tentativas
+    return None, tentativas
+
+def _tempo_melhoria(num_pecas):
+    """Tempo máximo (s) da etapa de melhoria, proporcional ao tamanho do job."""
+    return min(TEMPO_MAXIMO_MELHORIA, max(TEMPO_MINIMO_MELHORIA, TEMPO_MELHORIA_POR_PECA * num_pecas))
+
+def _remocao_plausivel(chapas, removida):
+    """
+    Teste rápido antes de tentar uma chapa a menos: as peças da chapa 'removida' precisam caber
+    na área livre das outras chapas, contando cada uma cheia só até a ocupação da chapa mais
+    cheia do plano (a maior que a busca já mostrou alcançar com estas peças) mais a folga
+    FOLGA_OCUPACAO_MELHORIA. Quando nem assim a área fecha, as tentativas aleatórias
+    dificilmente fecham e a etapa para na hora.
+    """
+    ocupacoes = []
+    for bid, chapa in chapas:
+        area_util = (bid[0] - (2 * bid[2])) * (bid[1] - (2 * bid[2]))
+        ocupacoes.append((area_util, sum(r.width * r.height for r in chapa)))
+    ocupacao_maxima = max(ocupada / area_util for area_util, ocupada in ocupacoes if area_util > 0)
+    ocupacao_maxima += FOLGA_OCUPACAO_MELHORIA * max(0.0, 1.0 - ocupacao_maxima)
+    area_livre = sum(max(0.0, ocupacao_maxima * area_util - ocupada)
+                     for (area_util, ocupada), (bid, chapa) in zip(ocupacoes, chapas) if chapa is not removida[1])
+    return sum(r.width * r.height for r in removida[1]) <= area_livre + 1e-9
+# --- FIM: ETAPA DE MELHORIA MULTI-INÍCIO ---
+
+# --- INÍCIO: ANÁLISE DE VIABILIDADE ANTES DA BUSCA ---
+class PecasInviaveisError(Exception):
+    """Peças que não cabem em nenhuma chapa disponível (ou área total maior que a das chapas)."""
+    def __init__(self, relatorio):
+        self.relatorio = relatorio
+        linhas = []
+        for item in relatorio['inviaveis']:
+            linhas.append(f"- {item['nome_arquivo'] or 'Sem nome'} ({item['forma']} {item['largura']:.0f}x{item['altura']:.0f}, {item['quantidade']} un.): "
+                          f"excede a área útil em {item['excesso_largura']:.0f}mm na largura e {item['excesso_altura']:.0f}mm na altura.")
+        if relatorio['area_excedente'] > 0:
+            linhas.append(f"- A área total das peças excede a área útil de todas as chapas disponíveis em {relatorio['area_excedente'] / 1_000_000:.2f} m².")
+        super().__init__("Peças que não cabem nas chapas disponíveis:\n" + "\n".join(linhas))
+
+def analisar_viabilidade(pecas, bins, escala=None):
+    """
+    Verifica, antes de qualquer pack, se cada tipo de peça cabe em alguma chapa (nas duas
+    orientações) e se a área total cabe na área útil de todas as chapas.
+    Com 'escala' (modo inteiro), compara as medidas já arredondadas como a busca vai vê-las.
+    Retorna {'inviaveis': [...], 'area_excedente': float}; cada item de 'inviaveis' traz o
+    índice da peça em 'pecas', o nome do arquivo e quanto ela excede na melhor chapa/orientação.
+    """
+    chapas = set(tuple(b[:3]) for b in bins)
+    if escala:
+        chapas = [tuple(v / escala for v in _escalar_bid(b, escala)) for b in chapas]
+    areas_uteis = [(b[0] - (2 * b[2]), b[1] - (2 * b[2])) for b in chapas]
+    areas_uteis = [(w, h) for w, h in areas_uteis if w > 0 and h > 0]
+
+    def _medidas(p):
+        if escala:
+            return _inteiro_acima(p['largura'], escala) / escala, _inteiro_acima(p['altura'], escala) / escala
+        return p['largura'], p['altura']
+
+    inviaveis, area_viavel = [], 0
+    for indice, p in enumerate(pecas):
+        largura, altura = _medidas(p)
+        excessos = [(max(0, pw - w), max(0, ph - h)) for w, h in areas_uteis
+                    for pw, ph in ((largura, altura), (altura, largura))]
+        menor_excesso = min(excessos, key=sum) if excessos else (p['largura'], p['altura'])
+        if sum(menor_excesso) > 0:
+            inviaveis.append({
+                'indice': indice, 'nome_arquivo': p.get('nome_arquivo'), 'forma': p.get('forma', 'rectangle'),
+                'largura': p['largura'], 'altura': p['altura'], 'quantidade': int(p['quantidade']),
+                'excesso_largura': menor_excesso[0], 'excesso_altura': menor_excesso[1]
+            })
+        else:
+            area_viavel += p['largura'] * p['altura'] * p['quantidade']
+
+    area_chapas = sum((b[0] - (2 * b[2])) * (b[1] - (2 * b[2])) for b in bins if b[0] > 2 * b[2] and b[1] > 2 * b[2])
+    return {'inviaveis': inviaveis, 'area_excedente': max(0, area_viavel - area_chapas)}
+# --- FIM: ANÁLISE DE VIABILIDADE ---
+
+# --- INÍCIO: GEOMETRIA EM PONTO FIXO (MODO INTEIRO) ---
+# Escala sugerida para o modo inteiro: 100 = centésimos de milímetro.
+ESCALA_INTEIRA_PADRAO = 100
+
+def _inteiro_acima(valor, escala):
+    # O arredondamento prévio evita que 12.3 * 100 = 1230.0000000000002 vire 1231.
+    return math.ceil(round(valor * escala, 6))
+
+def _inteiros_acima(valores, escala):
+    """Versão vetorizada de '_inteiro_acima' para um array NumPy."""
+    return np.ceil(np.round(valores * escala, 6))
+
+def _escalar_bid(bid, escala):
+    """
+    Chapa em unidades inteiras: a margem e a área útil arredondam para cima, pela mesma regra
+    das peças. Toda peça que cabe em mm cabe em inteiros; o que a área útil ganha no
+    arredondamento (menos de 1/escala mm) é a tolerância, tirada da margem. O id de uma
+    sobra do estoque (ver '_bins_de_sobras') passa adiante sem mudança.
+    """
+    margem = _inteiro_acima(bid[2], escala)
+    return (_inteiro_acima(bid[0] - (2 * bid[2]), escala) + (2 * margem),
+            _inteiro_acima(bid[1] - (2 * bid[2]), escala) + (2 * margem), margem) + tuple(bid[3:])
+
+def _escalar_retangulos(retangulos, escala):
+    """Peças em unidades inteiras, arredondadas para cima: nenhuma peça encolhe."""
+    return [(_inteiro_acima(w, escala), _inteiro_acima(h, escala), rid) for w, h, rid in retangulos]
+
+# --- FIM: GEOMETRIA EM PONTO FIXO ---
+
+# --- INÍCIO: RE-NESTING INCREMENTAL A PARTIR DO RESULTADO ANTERIOR ---
+# Acima desta fração de chapas afetadas pela edição, refazer o job inteiro sai melhor.
+FRACAO_MAXIMA_CHAPAS_REFEITAS = 0.5
+
+def _assinatura_tipo(peca_info):
+    """
+    Identifica um tipo de peça entre execuções: mesma geometria, furos, forma, contorno real
+    e projeto, mesma assinatura. O kerf dos blocos de linha comum vem em 'orig_dims'.
+    """
+    contorno = [(round(float(x), 3), round(float(y), 3)) for x, y in peca_info['contorno'] or ()]
+    return json.dumps([
+        peca_info['forma'], round(float(peca_info['largura_com_offset']), 3), round(float(peca_info['altura_com_offset']), 3),
+        round(float(peca_info['diametro'] or 0), 3), peca_info['orig_dims'], peca_info['dxf_path'], peca_info['furos'],
+        peca_info.get('project_number'), contorno
+    ], sort_keys=True, default=float)
+
+def _chapas_do_resultado(resultado, offset):
+    """
+    Reconstrói as chapas de um resultado no formato de '_empacotar', com a assinatura do tipo
+    no lugar do rid. Retorna None para resultados sem margem/assinatura (versões anteriores do motor).
+    """
+    chapas = []
+    for plano in resultado.get('planos_unicos') or []:
+        margin = plano.get('margin')
+        if margin is None or any('assinatura' not in p for p in plano['plano']):
+            return None
+        bid = (plano['chapa_largura'], plano['chapa_altura'], margin)
+        if plano.get('sobra_id') is not None:
+            bid += (plano['sobra_id'],)
+        pecas_plano, blocos = [], {}
+        for p in plano['plano']:
+            if p.get('bloco') is None:
+                pecas_plano.append(p)
+            else:
+                blocos.setdefault(p['bloco'], []).append(p)
+        # As peças de um bloco de linha comum voltam a ser um retângulo só, como na busca.
+        for membros in blocos.values():
+            x0, y0 = min(m['x'] for m in membros), min(m['y'] for m in membros)
+            x1, y1 = max(m['x'] + m['largura'] for m in membros), max(m['y'] + m['altura'] for m in membros)
+            pecas_plano.append({'x': x0, 'y': y0, 'largura': round(x1 - x0, 6), 'altura': round(y1 - y0, 6), 'assinatura': membros[0]['assinatura']})
+        pecas_alocadas = []
+        for p in pecas_plano:
+            # Desfaz a conversão de '_materializar_solucao' (offset e origem no topo).
+            w, h = p['largura'] + offset, p['altura'] + offset
+            x = round(p['x'] - margin - (offset / 2), 6)
+            y = round(plano['chapa_altura'] - margin - h + (offset / 2) - p['y'], 6)
+            contorno = tuple((cx, p['altura'] - cy) for cx, cy in p['contorno']) if p.get('contorno') else None
+            pecas_alocadas.append(PecaAlocada(x, y, w, h, p['assinatura'], contorno))
+        chapas.extend([(bid, pecas_alocadas)] * plano['repeticoes'])
+    return chapas
+
+def _reaproveitar_chapas(resultado_anterior, retangulos, tabela_pecas, bins, offset, escala=None, opcoes_busca=None):
+    """
+    Compara a demanda por tipo de peça do resultado anterior com a do job atual. As chapas
+    anteriores sem nenhum tipo removido ou com quantidade reduzida são mantidas como estão;
+    as peças das demais chapas e as unidades acrescentadas voltam para a busca.
+    Retorna (chapas_fixas, retangulos_restantes, estatisticas), ou None quando o resultado
+    anterior não serve (outra chapa, outras 'opcoes_busca', formato antigo ou chapas afetadas demais).
+    No modo inteiro ('escala'), as chapas anteriores são convertidas para as unidades da busca.
+    """
+    # Chapas montadas com outra forma real, guilhotina, linha comum ou kerf não valem para este job.
+    estatisticas_anteriores = resultado_anterior.get('estatisticas_busca') or {}
+    if any(estatisticas_anteriores.get(k) != v for k, v in (opcoes_busca or {}).items()):
+        return None
+    chapas_anteriores = _chapas_do_resultado(resultado_anterior, offset)
+    if not chapas_anteriores:
+        return None
+    if escala:
+        chapas_anteriores = [(_escalar_bid(bid, escala), [PecaAlocada(round(p.x * escala), round(p.y * escala), _inteiro_acima(p.width, escala),
+                                                                      _inteiro_acima(p.height, escala), p.rid, p.contorno) for p in chapa])
+                             for bid, chapa in chapas_anteriores]
+    bids = set(tuple(b) for b in bins)
+    if len(bids) != 1 or any(bid not in bids for bid, _ in chapas_anteriores):
+        return None
+
+    retangulos_por_tipo = {}
+    for r in retangulos:
+        retangulos_por_tipo.setdefault(tabela_pecas[r[2]]['assinatura'], []).append(r)
+    demanda_anterior = Counter(p.rid for _, chapa in chapas_anteriores for p in chapa)
+    reduzidos = {a for a, q in demanda_anterior.items() if q > len(retangulos_por_tipo.get(a, ()))}
+
+    mantidas = [(bid, chapa) for bid, chapa in chapas_anteriores if not any(p.rid in reduzidos for p in chapa)]
+    if len(mantidas) > 1:
+        # A chapa mantida mais vazia também volta para a busca, junto com o espaço liberado.
+        mantidas.remove(min(mantidas, key=lambda c: sum(p.width * p.height for p in c[1])))
+    refeitas = len(chapas_anteriores) - len(mantidas)
+    if not mantidas or refeitas > FRACAO_MAXIMA_CHAPAS_REFEITAS * len(chapas_anteriores):
+        return None
+
+    # As peças das chapas mantidas recebem os rids do job atual, tipo a tipo.
+    disponiveis = {a: [r[2] for r in rs] for a, rs in retangulos_por_tipo.items()}
+    chapas_fixas = []
+    for bid, chapa in mantidas:
+        chapas_fixas.append((bid, [PecaAlocada(p.x, p.y, p.width, p.height, disponiveis[p.rid].pop(), p.contorno) for p in chapa]))
+    usados = {r.rid for _, chapa in chapas_fixas for r in chapa}
+    retangulos_restantes = [r for r in retangulos if r[2] not in usados]
+
+    estatisticas = {'chapas_mantidas': len(mantidas), 'chapas_refeitas': refeitas, 'pecas_realocadas': len(retangulos_restantes)}
+    return chapas_fixas, retangulos_restantes, estatisticas
+# --- FIM: RE-NESTING INCREMENTAL ---
+
+# --- INÍCIO: NESTING PELA FORMA REAL (NO-FIT POLYGONS) ---
+def _solucao_forma_real(retangulos, tabela_pecas, bins, offset, escala=None, bid_em_mm=None, cancelamento=None, prazo=None, contador=None):
+    """
+    Aloca as peças DXF de contorno não retangular pelo nesting com no-fit polygons (ver
+    nfp_engine) e usa os vãos dessas chapas para os maiores retângulos (até
+    LIMITE_COMPLEMENTOS_NFP), pelo bounding box; o que não couber segue para a busca nas
+    chapas seguintes. O nesting para em 'prazo' (time.perf_counter()).
+    Retorna (chapas_fixas, retangulos_restantes), ou None se o job não tem peças de forma, se
+    tem mais de LIMITE_PECAS_NFP, se o prazo acabou antes de todas serem alocadas ou se o
+    rectpack, só com os bounding boxes, já fecha o job com menos chapas.
+    No modo inteiro ('escala'), as chapas e as posições voltam nas unidades da busca.
+    """
+    de_forma = [r for r in retangulos if tabela_pecas[r[2]].get('contorno')]
+    if not de_forma:
+        return None
+    if len(de_forma) > LIMITE_PECAS_NFP:
+        logging.info(f"Forma real: {len(de_forma)} peça(s) de forma, acima do limite de {LIMITE_PECAS_NFP}; job segue pelo bounding box.")
+        return None
+    bins_mm = [bid_em_mm[tuple(b)] if escala else tuple(b) for b in bins]
+
+    # As unidades de um tipo compartilham o contorno (o nesting reconhece o tipo por ele).
+    contornos = {}
+    def _peca(r):
+        info = tabela_pecas[r[2]]
+        if id(info) not in contornos:
+            w, h = info['largura_sem_offset'], info['altura_sem_offset']
+            contornos[id(info)] = info.get('contorno') or [(0.0, 0.0), (w, 0.0), (w, h), (0.0, h)]
+        return {'rid': r[2], 'contorno': contornos[id(info)], 'largura': info['largura_sem_offset'], 'altura': info['altura_sem_offset']}
+
+    complementos = [r for r in retangulos if not tabela_pecas[r[2]].get('contorno')]
+    oferecidos = sorted(complementos, key=lambda r: -r[0] * r[1])[:LIMITE_COMPLEMENTOS_NFP]
+    chapas, nao_alocados = aninhar_formas([_peca(r) for r in de_forma], bins_mm, offset, verificar=lambda: _verificar_cancelamento(cancelamento),
+                                          complementos=[_peca(r) for r in oferecidos], prazo=prazo)
+    rids_de_forma = {r[2] for r in de_forma}
+    if not chapas or rids_de_forma.intersection(nao_alocados):
+        return None
+    if len(chapas) > 1:
+        if contador is not None:
+            contador['packs'] += 1
+        if _empacotar(MaxRectsBssf, retangulos, [tuple(b) for b in bins[:len(chapas) - 1]])[0] is not None:
+            logging.info(f"Forma real descartada: o rectpack fecha o job em menos de {len(chapas)} chapa(s).")
+            return None
+
+    chapas_fixas = []
+    for bid, chapa in zip(bins, chapas):
+        pecas_alocadas = []
+        for rid, x, y, forma in chapa:
+            info = tabela_pecas[rid]
+            w, h = info['largura_com_offset'], info['altura_com_offset']
+            if forma.rotacao % 180:
+                w, h = h, w
+            x, y = x - offset / 2, y - offset / 2
+            # Os retângulos de complemento não levam contorno: no plano eles continuam iguais aos do rectpack.
+            contorno = tuple((round(float(cx), 4), round(float(cy), 4)) for cx, cy in forma.contorno) if info.get('contorno') else None
+            if escala:
+                x, y, w, h = round(x * escala), round(y * escala), _inteiro_acima(w, escala), _inteiro_acima(h, escala)
+            pecas_alocadas.append(PecaAlocada(x, y, w, h, rid, contorno))
+        chapas_fixas.append((tuple(bid), pecas_alocadas))
+    usados = {p.rid for _, chapa in chapas_fixas for p in chapa}
+    return chapas_fixas, [r for r in complementos if r[2] not in usados]
+
+def _area_com_offset_contorno(contorno, offset):
+    """Área do contorno mais a faixa de meio offset em volta dele (a parte que cabe a esta peça)."""
+    perimetro = sum(math.dist(a, b) for a, b in zip(contorno, contorno[1:] + contorno[:1]))
+    return area_contorno(contorno) + perimetro * offset / 2 + math.pi * (offset / 2) ** 2
+# --- FIM: NESTING PELA FORMA REAL ---
+
+# --- INÍCIO: CORTES EM GUILHOTINA ---
+def _arvore_de_cortes(retangulos, largura, altura, tolerancia=1e-6):
+    """
+    Sequência de cortes de ponta a ponta que separa as peças de uma chapa, em coordenadas da
+    área de nesting (origem embaixo). 'retangulos' são (x, y, w, h) com o offset incluído: as
+    bordas de peças vizinhas coincidem no meio do espaço entre elas, que é por onde o corte passa.
+    Cada região é dividida de uma vez em todas as posições livres de uma direção (um estágio),
+    alternando a direção entre estágios, e as faixas resultantes são processadas em ordem.
+    Retorna a lista ordenada de cortes {'ordem', 'nivel', 'pai', 'orientacao', 'x0', 'y0', 'x1',
+    'y1'}, em que 'pai' é a ordem do corte que soltou a região (None na chapa inteira), ou None
+    se o layout não pode ser cortado em guilhotina.
+    """
+    coords = np.asarray([r[:4] for r in retangulos], dtype=float).reshape(-1, 4)
+    inicio, fim = coords[:, :2], coords[:, :2] + coords[:, 2:]
+    cortes = []
+    # Pilha de regiões: (índices das peças, (x0, y0, x1, y1), nível, corte pai, direção do estágio anterior).
+    pilha = [(np.arange(len(coords)), (0.0, 0.0, float(largura), float(altura)), 1, None, None)]
+    while pilha:
+        indices, regiao, nivel, pai, direcao_anterior = pilha.pop()
+        if not len(indices):
+            continue
+        livres = {}
+        for eixo, direcao in ((0, 'vertical'), (1, 'horizontal')):
+            a, b = inicio[indices, eixo], fim[indices, eixo]
+            posicoes = np.unique(np.concatenate([a, b]))
+            posicoes = posicoes[(posicoes > regiao[eixo] + tolerancia) & (posicoes < regiao[eixo + 2] - tolerancia)]
+            # Só valem as posições que não atravessam nenhuma peça da região.
+            atravessa = ((a[None, :] < posicoes[:, None] - tolerancia) & (b[None, :] > posicoes[:, None] + tolerancia)).any(axis=1)
+            livres[direcao] = posicoes[~atravessa]
+        if not len(livres['vertical']) and not len(livres['horizontal']):
+            if len(indices) > 1:
+                return None
+            continue # Peça sozinha ocupando a região inteira: já está solta.
+
+        if direcao_anterior is None:
+            direcao = max(livres, key=lambda d: (len(livres[d]), d == 'vertical'))
+        else:
+            direcao = 'horizontal' if direcao_anterior == 'vertical' else 'vertical'
+            if not len(livres[direcao]):
+                direcao = direcao_anterior
+        eixo = 0 if direcao == 'vertical' else 1
+        posicoes = livres[direcao]
+        x0, y0, x1, y1 = regiao
+        ordens = []
+        for c in posicoes:
+            ordens.append(len(cortes) + 1)
+            segmento = (c, y0, c, y1) if eixo == 0 else (x0, c, x1, c)
+            cortes.append({'ordem': ordens[-1], 'nivel': nivel, 'pai': pai, 'orientacao': direcao,
+                           'x0': float(segmento[0]), 'y0': float(segmento[1]), 'x1': float(segmento[2]), 'y1': float(segmento[3])})
+
+        # Faixa k fica entre os cortes k-1 e k e se solta com o corte k (a última, com o último).
+        bordas = [regiao[eixo]] + posicoes.tolist() + [regiao[eixo + 2]]
+        faixa_da_peca = np.searchsorted(posicoes, (inicio[indices, eixo] + fim[indices, eixo]) / 2)
+        faixas = []
+        for k in range(len(bordas) - 1):
+            sub_regiao = (bordas[k], y0, bordas[k + 1], y1) if eixo == 0 else (x0, bordas[k], x1, bordas[k + 1])
+            faixas.append((indices[faixa_da_peca == k], sub_regiao, nivel + 1, ordens[min(k, len(ordens) - 1)], direcao))
+        pilha.extend(reversed(faixas))
+    return cortes
+
+def _guilhotinavel(bid, chapa):
+    """True se as peças alocadas na chapa podem ser separadas só com cortes de ponta a ponta."""
+    return _arvore_de_cortes([r[:4] for r in chapa], bid[0] - (2 * bid[2]), bid[1] - (2 * bid[2])) is not None
+# --- FIM: CORTES EM GUILHOTINA ---
+
+# --- INÍCIO: CORTE EM LINHA COMUM ---
+# Retângulos iguais lado a lado dividem a aresta de corte: dentro de um bloco as peças ficam
+# separadas só pelo kerf (largura do corte) e o offset fica em volta do bloco inteiro.
+KERF_PADRAO = 2.0
+
+def _quantas_com_kerf(comprimento, medida, kerf):
+    """Quantas peças de 'medida' cabem em 'comprimento' separadas só pelo kerf."""
+    return max(0, int((comprimento + kerf + 1e-9) // (medida + kerf)))
+
+def _bloco_corte_comum(peca, colunas, linhas, quantidade, offset, kerf):
+    w, h = peca['largura'] - offset, peca['altura'] - offset
+    return {'forma': 'common_line_block', 'largura': colunas * w + (colunas - 1) * kerf + offset,
+            'altura': linhas * h + (linhas - 1) * kerf + offset, 'quantidade': quantidade, 'furos': peca.get('furos', []),
+            'orig_dims': {'largura': w, 'altura': h, 'colunas': colunas, 'linhas': linhas, 'kerf': kerf},
+            'project_number': peca.get('project_number')}
+
+def _grades_da_chapa(largura_util, altura_util, peca, offset, kerf):
+    """
+    Grades (colunas, linhas) dos blocos que enchem uma chapa de área útil largura_util x
+    altura_util com a peça. Parte das regiões do padrão sem linha comum ('_regioes_grade'),
+    então a chapa leva pelo menos as peças que levaria sem os blocos e as faixas que a grade
+    pura deixaria vazias ganham os seus próprios blocos. Fica com a grade pura de um bloco só
+    quando ela leva mais peças.
+    """
+    w, h = peca['largura'] - offset, peca['altura'] - offset
+    grades = []
+    for _, _, largura, altura, p, _ in _regioes_grade(largura_util, altura_util, peca['largura'], peca['altura']):
+        # Na região girada a grade sai deitada; o rectpack gira o bloco inteiro para caber.
+        ao_longo_w, ao_longo_h = (largura, altura) if p == peca['largura'] else (altura, largura)
+        grade = (_quantas_com_kerf(ao_longo_w - offset, w, kerf), _quantas_com_kerf(ao_longo_h - offset, h, kerf))
+        if grade[0] * grade[1] > 0:
+            grades.append(grade)
+    pura = max([(_quantas_com_kerf(largura_util - offset, w, kerf), _quantas_com_kerf(altura_util - offset, h, kerf)),
+                (_quantas_com_kerf(altura_util - offset, w, kerf), _quantas_com_kerf(largura_util - offset, h, kerf))],
+               key=lambda grade: grade[0] * grade[1])
+    if pura[0] * pura[1] >= sum(c * l for c, l in grades):
+        grades = [pura]
+    return sorted(grades, key=lambda grade: -grade[0] * grade[1])
+
+def _blocos_corte_comum(retangulos, offset, kerf, bins):
+    """
+    Agrupa os retângulos iguais (medidas, furos e projeto) em blocos de linha comum. Cada chapa
+    cheia leva os blocos de '_grades_da_chapa' na maior área útil entre as chapas; o resto do
+    tipo enche as mesmas grades em ordem, com linhas completas e uma linha parcial. Tipos em que
+    não cabem duas peças no bloco, e as grades de uma peça só, seguem como retângulos avulsos.
+    """
+    maior = max(bins, key=lambda b: (b[0] - 2 * b[2]) * (b[1] - 2 * b[2]))
+    largura_util, altura_util = maior[0] - 2 * maior[2], maior[1] - 2 * maior[2]
+
+    tipos = {}
+    for p in retangulos:
+        chave = (p['largura'], p['altura'], json.dumps(p.get('furos', []), sort_keys=True, default=float), p.get('project_number'))
+        tipos.setdefault(chave, []).append(p)
+
+    pecas_processadas = []
+    for lista in tipos.values():
+        peca, quantidade = lista[0], sum(p['quantidade'] for p in lista)
+        w, h = peca['largura'] - offset, peca['altura'] - offset
+        if w <= 0 or h <= 0 or quantidade < 2:
+            pecas_processadas.extend(lista)
+            continue
+        grades = _grades_da_chapa(largura_util, altura_util, peca, offset, kerf)
+        por_chapa = sum(colunas * linhas for colunas, linhas in grades)
+        if not grades or grades[0][0] * grades[0][1] < 2:
+            pecas_processadas.extend(lista)
+            continue
+        cheios, resto = divmod(quantidade, por_chapa)
+        quantidades = Counter()
+        if cheios:
+            for grade in grades:
+                quantidades[grade] += cheios
+        # A chapa final enche as mesmas grades em ordem: todas cabem juntas em uma chapa.
+        for colunas, linhas in grades:
+            usadas = min(resto, colunas * linhas)
+            if usadas >= colunas:
+                quantidades[(colunas, usadas // colunas)] += 1
+            if usadas % colunas:
+                quantidades[(usadas % colunas, 1)] += 1
+            resto -= usadas
+        for (colunas, linhas), qtd in quantidades.items():
+            if colunas * linhas >= 2:
+                pecas_processadas.append(_bloco_corte_comum(peca, colunas, linhas, qtd, offset, kerf))
+            else:
+                pecas_processadas.append(dict(peca, quantidade=qtd))
+    return pecas_processadas
+
+def _membros_do_bloco(r, peca_info, offset):
+    """
+    Posições das peças de um bloco de linha comum alocado em 'r' (coordenadas da busca, sem o
+    offset), com os furos na orientação em que o bloco foi alocado.
+    """
+    dims = peca_info['orig_dims']
+    colunas, linhas, w, h, kerf = dims['colunas'], dims['linhas'], dims['largura'], dims['altura'], dims['kerf']
+    furos = peca_info['furos']
+    # Bloco quadrado: girado ou não, a grade sem girar ocupa o mesmo lugar.
+    if r.width != peca_info['largura_com_offset']:
+        colunas, linhas, w, h = linhas, colunas, h, w
+        furos = [{'diam': furo['diam'], 'x': furo['y'], 'y': (h + offset) - furo['x']} for furo in furos]
+    return [(r.x + (offset / 2) + i * (w + kerf), r.y + (offset / 2) + j * (h + kerf), w, h, furos)
+            for j in range(linhas) for i in range(colunas)]
+
+def _comprimento_linha_comum(peca_info):
+    """Comprimento de corte economizado por um bloco: cada aresta compartilhada é cortada uma vez só."""
+    dims = peca_info['orig_dims']
+    colunas, linhas = dims['colunas'], dims['linhas']
+    return (colunas - 1) * linhas * dims['altura'] + (linhas - 1) * colunas * dims['largura']
+# --- FIM: CORTE EM LINHA COMUM ---
+
+# --- INÍCIO: CATÁLOGO DE CHAPAS COM FORMATOS MISTOS ---
+def _chapas_para_formato(largura, altura, margin, pecas):
+    """Quantas chapas de um formato são oferecidas à busca para o job."""
+    # 200 chapas bastam para a maioria dos jobs; jobs muito grandes recebem o dobro do limite de área.
+    area_util = (largura - (2 * margin)) * (altura - (2 * margin))
+    area_pecas = sum(p['largura'] * p['altura'] * p['quantidade'] for p in pecas)
+    return max(200, 2 * math.ceil(area_pecas / area_util)) if area_util > 0 else 200
+
+def _nome_formato(largura, altura):
+    return f"{largura:g}x{altura:g}"
+
+def _custo_resultado(resultado, catalogo, espessura, peso_especifico_base):
+    """
+    Retorna (custo_total, chapas_por_formato) de um resultado: o peso das chapas de cada formato
+    vezes o 'custo_kg' dele. Formatos sem 'custo_kg' custam o próprio peso. Os planos feitos
+    em sobras do estoque (com 'sobra_id') já foram pagos e não entram no custo nem na contagem.
+    """
+    custo_kg = {(f['largura'], f['altura']): f.get('custo_kg') for f in catalogo}
+    custo_total, chapas_por_formato = 0.0, {}
+    for plano in resultado['planos_unicos']:
+        if plano.get('sobra_id') is not None:
+            continue
+        largura, altura = plano['chapa_largura'], plano['chapa_altura']
+        nome = _nome_formato(largura, altura)
+        chapas_por_formato[nome] = chapas_por_formato.get(nome, 0) + plano['repeticoes']
+        peso = (largura * altura / 1_000_000) * espessura * peso_especifico_base * plano['repeticoes']
+        custo_total += peso * (custo_kg.get((largura, altura)) or 1.0)
+    return custo_total, chapas_por_formato
+
+def _avaliar_mistura(nome, bins, pecas, offset, espessura, opcoes):
+    """
+    Ponto de entrada (também nos processos de trabalho) para calcular o job com uma mistura de
+    formatos. PecasInviaveisError não atravessa processos: o relatório dela volta no retorno.
+    Retorna (nome, resultado, relatorio_inviaveis, tempo).
+    """
+    inicio = time.perf_counter()
+    try:
+        resultado = calcular_plano_de_corte_em_bins(pecas, offset, espessura, bins, **opcoes)
+    except PecasInviaveisError as e:
+        return nome, None, e.relatorio, time.perf_counter() - inicio
+    return nome, resultado, None, time.perf_counter() - inicio
+
+def _otimizar_catalogo(catalogo, pecas, offset, margin, espessura, opcoes, status_signal_emitter=None, cancelamento=None, bins_prioritarios=()):
+    """
+    Escolhe a mistura de formatos mais barata do catálogo. Cada mistura é uma lista ordenada de
+    chapas (a busca consome as chapas nessa ordem), avaliada em duas rodadas paralelas:
+    1. cada formato sozinho;
+    2. para cada formato que precisou de mais de uma chapa, as mesmas chapas menos uma e a
+       "cauda" em cada formato menor, que costuma sair mais barata que a última chapa grande.
+    Vence a mistura que deixa menos peças de fora e, depois, a de menor custo (ver
+    '_custo_resultado'). O relatório de todas as misturas fica em resultado['estoque'].
+    'bins_prioritarios' (as sobras do estoque) vêm antes das chapas em todas as misturas.
+    """
+    bins_prioritarios = list(bins_prioritarios)
+    avaliadas, relatorio_inviaveis = [], None
+    melhor, chave_melhor = None, None
+
+    def _avaliar_rodada(misturas):
+        pool = _obter_pool() if len(misturas) > 1 else None
+        if pool is None:
+            saidas = []
+            for nome, bins in misturas:
+                _verificar_cancelamento(cancelamento)
+                if status_signal_emitter: status_signal_emitter.emit(f"Avaliando chapas {nome}...")
+                saidas.append(_avaliar_mistura(nome, bins, pecas, offset, espessura, dict(opcoes, cancelamento=cancelamento)))
+            return saidas
+
+        if status_signal_emitter: status_signal_emitter.emit(f"Avaliando {len(misturas)} misturas de chapas em paralelo...")
+        fila_resultados = queue.Queue()
+        lote = _novo_lote()
+        for nome, bins in misturas:
+            pool.apply_async(_avaliar_mistura, (nome, bins, pecas, offset, espessura, dict(opcoes, cancelamento=lote)),
+                             callback=fila_resultados.put, error_callback=fila_resultados.put)
+        saidas = []
+        for _ in misturas:
+            item = _aguardar_resultado(fila_resultados, cancelamento)
+            if isinstance(item, BaseException):
+                raise item
+            saidas.append(item)
+        return saidas
+
+    def _registrar(saidas):
+        nonlocal melhor, chave_melhor, relatorio_inviaveis
+        for nome, resultado, relatorio, tempo in saidas:
+            if resultado is None:
+                relatorio_inviaveis = relatorio_inviaveis or relatorio
+                avaliadas.append({'nome': nome, 'custo': None, 'total_chapas': None, 'aproveitamento': None,
+                                  'chapas_por_formato': {}, 'tempo': tempo, 'inviavel': True})
+                logging.info(f"Mistura de chapas {nome}: inviável ({tempo:.2f}s).")
+                continue
+            custo, chapas_por_formato = _custo_resultado(resultado, catalogo, espessura, opcoes['peso_especifico_base'])
+            avaliadas.append({'nome': nome, 'custo': custo, 'total_chapas': resultado['total_chapas'],
+                              'aproveitamento': resultado['aproveitamento_geral'],
+                              'chapas_por_formato': chapas_por_formato, 'tempo': tempo, 'inviavel': False})
+            logging.info(f"Mistura de chapas {nome}: custo {custo:.2f}, {resultado['total_chapas']} chapa(s), {tempo:.2f}s.")
+            pecas_de_fora = sum(p['quantidade'] for p in resultado['pecas_inviaveis'])
+            chave = (pecas_de_fora, round(custo, 6), resultado['total_chapas'])
+            if melhor is None or chave < chave_melhor:
+                melhor, chave_melhor = (nome, resultado, custo, chapas_por_formato), chave
+
+    formatos = [(f['largura'], f['altura'], margin) for f in catalogo]
+    _registrar(_avaliar_rodada([(_nome_formato(*bid[:2]), bins_prioritarios + [bid] * _chapas_para_formato(*bid, pecas)) for bid in formatos]))
+
+    misturas = []
+    for item in list(avaliadas):
+        # As sobras do estoque não contam como chapas do formato e podem ter absorvido o job.
+        num_chapas_formato = 0 if item['inviavel'] else item['chapas_por_formato'].get(item['nome'], 0)
+        if num_chapas_formato < 2:
+            continue
+        corpo = next(bid for bid in formatos if _nome_formato(*bid[:2]) == item['nome'])
+        num_corpo = num_chapas_formato - 1
+        for cauda in formatos:
+            if cauda[0] * cauda[1] < corpo[0] * corpo[1]:
+                nome = f"{num_corpo}x {item['nome']} + {_nome_formato(*cauda[:2])}"
+                misturas.append((nome, bins_prioritarios + [corpo] * num_corpo + [cauda] * _chapas_para_formato(*cauda, pecas)))
+    if misturas:
+        _registrar(_avaliar_rodada(misturas))
+
+    if melhor is None:
+        raise PecasInviaveisError(relatorio_inviaveis)
+
+    nome, resultado, custo, chapas_por_formato = melhor
+    resultado['estoque'] = {
+        'mistura_escolhida': nome,
+        'custo_total': custo,
+        'chapas_por_formato': chapas_por_formato,
+        'misturas_avaliadas': avaliadas
+    }
+    logging.info(f"Mistura de chapas escolhida: {nome} (custo {custo:.2f}) entre {len(avaliadas)} avaliada(s).")
+    return resultado
+# --- FIM: CATÁLOGO DE CHAPAS COM FORMATOS MISTOS ---
+
+# --- INÍCIO: SOBRAS DO ESTOQUE COMO CHAPAS PRIORITÁRIAS ---
+# Quantas sobras do estoque, no máximo, são oferecidas a um job (das maiores para as menores).
+LIMITE_SOBRAS_POR_JOB = 30
+
+def _sobras_para_job(inventario, espessura, pecas):
+    """
+    Consulta no estoque as sobras da espessura em que cabe ao menos uma peça do job. A consulta
+    usa o índice com os menores limites entre as peças; o filtro exato (peça a peça, nas duas
+    orientações) roda só sobre as candidatas que o índice devolveu.
+    """
+    if not pecas:
+        return []
+    dims = [(max(p['largura'], p['altura']), min(p['largura'], p['altura'])) for p in pecas]
+    candidatas = inventario.buscar(espessura, menor_minimo=min(d[1] for d in dims), maior_minimo=min(d[0] for d in dims))
+    sobras = [s for s in candidatas if any(maior <= s['largura'] and menor <= s['altura'] for maior, menor in dims)]
+    return sobras[:LIMITE_SOBRAS_POR_JOB]
+
+def _bins_de_sobras(sobras):
+    # A borda de uma sobra já é uma linha de corte: ela entra como chapa sem margem, marcada
+    # com o id do estoque (o plano feito nela traz o mesmo id em 'sobra_id').
+    return [(s['largura'], s['altura'], 0, s['id']) for s in sobras]
+
+def _sobras_usadas(resultado, sobras):
+    """Sobras do estoque usadas pelo resultado, pelo 'sobra_id' dos planos."""
+    por_id = {s['id']: s for s in sobras}
+    usadas = []
+    for plano in resultado.get('planos_unicos') or []:
+        s = por_id.get(plano.get('sobra_id'))
+        if s is not None:
+            usadas.append({'id': s['id'], 'largura': s['largura'], 'altura': s['altura']})
+    return usadas
+
+def _solucao_sobras(retangulos, sobras, algoritmos=None, cancelamento=None, contador=None):
+    """
+    Enche as sobras do estoque uma a uma, na ordem, cada uma com o máximo em área das peças
+    que ainda restam (ver '_padrao_uma_chapa'). A amostra de cada sobra leva, por tipo, só as
+    peças que cabem nela e no máximo quantas a área comporta. Assim os atalhos e a busca
+    recebem só as chapas inteiras, todas do mesmo formato no job comum.
+    Retorna (chapas_fixas, retangulos_restantes).
+    """
+    chapas_fixas, restantes = [], list(retangulos)
+    for bid in sobras:
+        if not restantes:
+            break
+        largura, altura = bid[0] - (2 * bid[2]), bid[1] - (2 * bid[2])
+        por_tipo = {}
+        for r in restantes:
+            if (r[0] <= largura and r[1] <= altura) or (r[1] <= largura and r[0] <= altura):
+                por_tipo.setdefault((r[0], r[1]), []).append(r)
+        amostra = [r for (w, h), lista in sorted(por_tipo.items(), key=lambda t: -t[0][0] * t[0][1])
+                   for r in lista[:_quantas_cabem(largura * altura, w * h)]][:LIMITE_PECAS_PADRAO_RECTPACK]
+        alocadas = _padrao_uma_chapa(amostra, largura, altura, algoritmos, cancelamento, contador) if amostra else []
+        if not alocadas:
+            continue
+        chapas_fixas.append((tuple(bid), [PecaAlocada(x, y, w, h, rid) for x, y, w, h, rid in alocadas]))
+        usados = {rid for *_, rid in alocadas}
+        restantes = [r for r in restantes if r[2] not in usados]
+    return chapas_fixas, restantes
+# --- FIM: SOBRAS DO ESTOQUE ---
+
+# --- INÍCIO: NESTING EM LOTE DE VÁRIOS PROJETOS ---
+def _area_ocupada(peca):
+    """Área de uma peça de um plano, usada para ratear as chapas entre os projetos."""
+    if peca.get('forma') == 'circle':
+        return math.pi * (peca['diametro'] / 2)**2
+    return peca['largura'] * peca['altura']
+
+def dividir_resultado_por_projeto(resultado, espessura, peso_especifico_base=7.85):
+    """
+    Separa por projeto um resultado calculado com peças de vários projetos (nesting em lote).
+    Cada chapa é rateada entre os projetos na proporção da área que as peças de cada um ocupam
+    nela. Retorna {project_number: {'pecas', 'resumo_pecas', 'chapas_rateadas', 'area_chapas',
+    'peso_chapas', 'planos'}}; cada item de 'planos' traz o número do plano, quantas peças do
+    projeto ele tem por chapa e quantas vezes o plano se repete.
+    """
+    projetos = {}
+    for indice, plano in enumerate(resultado.get('planos_unicos') or []):
+        area_por_projeto, pecas_por_projeto = {}, {}
+        for peca in plano['plano']:
+            projeto = str(peca['project_number']) if peca.get('project_number') is not None else 'Sem projeto'
+            area_por_projeto[projeto] = area_por_projeto.get(projeto, 0) + _area_ocupada(peca)
+            pecas_por_projeto.setdefault(projeto, Counter())[peca['tipo_key']] += 1
+        area_plano = sum(area_por_projeto.values())
+        area_chapa = plano['chapa_largura'] * plano['chapa_altura']
+        for projeto, area in area_por_projeto.items():
+            dados = projetos.setdefault(projeto, {'pecas': 0, 'resumo_pecas': Counter(), 'chapas_rateadas': 0.0,
+                                                  'area_chapas': 0.0, 'peso_chapas': 0.0, 'planos': []})
+            fracao = area / area_plano if area_plano > 0 else 0
+            contagem = pecas_por_projeto[projeto]
+            dados['pecas'] += sum(contagem.values()) * plano['repeticoes']
+            for tipo, qtd in contagem.items():
+                dados['resumo_pecas'][tipo] += qtd * plano['repeticoes']
+            dados['chapas_rateadas'] += fracao * plano['repeticoes']
+            dados['area_chapas'] += fracao * area_chapa * plano['repeticoes']
+            dados['planos'].append({'plano': indice + 1, 'pecas_por_chapa': sum(contagem.values()), 'repeticoes': plano['repeticoes']})
+
+    for dados in projetos.values():
+        dados['peso_chapas'] = (dados['area_chapas'] / 1_000_000) * (espessura or 0) * peso_especifico_base
+        dados['resumo_pecas'] = [{'tipo': t, 'qtd': q} for t, q in dados['resumo_pecas'].items()]
+    return projetos
+# --- FIM: NESTING EM LOTE ---
+
+def orquestrar_planos_de_corte(chapa_largura, chapa_altura, pecas, offset, margin, espessura, peso_especifico_base=7.85, status_signal_emitter=None, usar_cache=True, aninhar_viaveis=False,
+                               tempo_limite=None, resultado_parcial_callback=None, cancelamento=None, resultado_anterior=None,
+                               usar_historico_algoritmos=True, escala_inteira=None, modo_fluxo=False, catalogo_chapas=None,
+                               usar_estoque_sobras=False, forma_real=True, guilhotina=False, corte_comum=False, kerf=KERF_PADRAO):
     """
     Função mestre que orquestra o processo de nesting.
+    Resultados já calculados para o mesmo job são devolvidos direto do cache em disco.
+    Com 'aninhar_viaveis', peças que não cabem na chapa são deixadas de fora em vez de
+    interromper o cálculo com PecasInviaveisError. 'tempo_limite' e 'resultado_parcial_callback'
+    ativam o modo com prazo (ver 'calcular_plano_de_corte_em_bins'). Um CancelamentoToken em
+    'cancelamento' interrompe o cálculo com NestingCancelado.
+    'resultado_anterior' é o resultado da execução anterior para esta espessura: se o job não
+    mudou ele é devolvido como está; se mudou pouco, só as chapas afetadas são refeitas.
+    Com 'usar_historico_algoritmos', a ordem dos algoritmos vem do histórico local de
+    vitórias em jobs parecidos (ver AlgorithmStats). 'escala_inteira' (ex.: ESCALA_INTEIRA_PADRAO)
+    faz a busca trabalhar em unidades inteiras de 1/escala_inteira mm. 'modo_fluxo' troca a busca
+    pelo empacotamento em fluxo com memória limitada, para jobs muito grandes.
+    'catalogo_chapas' é uma lista de formatos em estoque ({'largura', 'altura', 'custo_kg'}); quando
+    informado, substitui a chapa única e o job é calculado com a mistura de formatos mais barata
+    (ver '_otimizar_catalogo'). Nesse modo o re-nesting incremental não é usado.
+    Com 'usar_estoque_sobras', as sobras da espessura guardadas no RemnantInventory em que cabe
+    alguma peça entram como as primeiras chapas; as usadas vêm em resultado['sobras_usadas'] e
+    só são baixadas do estoque quando o nesting é confirmado (RemnantInventory.registrar_nesting).
+    'forma_real' encaixa as peças DXF recortadas pelo contorno (no-fit polygons) em vez do bounding box.
+    'guilhotina' restringe os planos a layouts cortáveis de ponta a ponta e traz a sequência de
+    cortes de cada plano em plano['cortes'] (a forma real fica desligada nesse modo).
+    'corte_comum' encaixa os retângulos iguais em blocos com a aresta de corte compartilhada,
+    separados só por 'kerf' mm; o corte economizado vem em plano['corte_comum'].
     """
     logging.info(f"--- INICIANDO ORQUESTRAÇÃO DE NESTING (ESTRATÉGIA OTIMIZADA) PARA ESPESSURA {espessura}mm ---")
 
+    # --- INÍCIO: CONSULTA AO CACHE DE RESULTADOS ---
+    cache = None
+    sobras_estoque = _sobras_para_job(RemnantInventory(), espessura, pecas) if usar_estoque_sobras else []
+    chave_cache = NestingCache.make_key(chapa_largura, chapa_altura, offset, margin, espessura, pecas, VERSAO_MOTOR_NESTING,
+                                        peso_especifico_base=peso_especifico_base, aninhar_viaveis=aninhar_viaveis,
+                                        escala_inteira=escala_inteira, modo_fluxo=modo_fluxo, catalogo_chapas=catalogo_chapas,
+                                        sobras_estoque=[s['id'] for s in sobras_estoque], forma_real=forma_real,
+                                        guilhotina=guilhotina, corte_comum=corte_comum, kerf=kerf if corte_comum else None)
+    if (resultado_anterior is not None and resultado_anterior.get('chave_job') == chave_cache
+            and not resultado_anterior['estatisticas_busca'].get('parcial')):
+        logging.info(f"Espessura {espessura}mm sem alterações desde o cálculo anterior; plano mantido.")
+        if status_signal_emitter: status_signal_emitter.emit("Espessura sem alterações: plano anterior mantido.")
+        return resultado_anterior
+    if usar_cache:
+        cache = NestingCache()
+        resultado_em_cache = cache.get(chave_cache)
+        if resultado_em_cache is not None:
+            logging.info(f"Resultado encontrado no cache para espessura {espessura}mm (chave {chave_cache[:12]}).")
+            if status_signal_emitter: status_signal_emitter.emit("Resultado recuperado do cache.")
+            return resultado_em_cache
+    # --- FIM: CONSULTA AO CACHE ---
+
     pecas_ordenadas = sorted(pecas, key=lambda p: p['largura'] * p['altura'], reverse=True)
     logging.info(f"Ordenando {len(pecas_ordenadas)} tipos de peças por área para otimização.")
 
-    bins_disponiveis = [(chapa_largura, chapa_altura, margin)] * 200
+    historico_algoritmos = AlgorithmStats() if usar_historico_algoritmos else None
+    if catalogo_chapas:
+        opcoes = {
+            'peso_especifico_base': peso_especifico_base, 'aninhar_viaveis': aninhar_viaveis, 'tempo_limite': tempo_limite,
+            'historico_algoritmos': historico_algoritmos, 'escala_inteira': escala_inteira, 'modo_fluxo': modo_fluxo,
+            'forma_real': forma_real, 'guilhotina': guilhotina, 'corte_comum': corte_comum, 'kerf': kerf
+        }
+        resultado_otimizado = _otimizar_catalogo(catalogo_chapas, pecas_ordenadas, offset, margin, espessura, opcoes,
+                                                 status_signal_emitter, cancelamento, _bins_de_sobras(sobras_estoque))
+    else:
+        bins_disponiveis = _bins_de_sobras(sobras_estoque) + [(chapa_largura, chapa_altura, margin)] * _chapas_para_formato(chapa_largura, chapa_altura, margin, pecas)
+        if sobras_estoque:
+            logging.info(f"{len(sobras_estoque)} sobra(s) do estoque oferecida(s) antes das chapas inteiras.")
+        if status_signal_emitter: status_signal_emitter.emit("Otimizando alocação de todas as peças...")
+        resultado_otimizado = calcular_plano_de_corte_em_bins(
+            pecas_ordenadas,
+            offset,
+            espessura,
+            bins_disponiveis,
+            peso_especifico_base,
+            status_signal_emitter,
+            aninhar_viaveis=aninhar_viaveis,
+            tempo_limite=tempo_limite,
+            resultado_parcial_callback=resultado_parcial_callback,
+            cancelamento=cancelamento,
+            resultado_anterior=resultado_anterior,
+            historico_algoritmos=historico_algoritmos,
+            escala_inteira=escala_inteira,
+            modo_fluxo=modo_fluxo,
+            forma_real=forma_real,
+            guilhotina=guilhotina,
+            corte_comum=corte_comum,
+            kerf=kerf
+        )
 
-    if status_signal_emitter: status_signal_emitter.emit("Otimizando alocação de todas as peças...")
-    resultado_otimizado = calcular_plano_de_corte_em_bins(
-        pecas_ordenadas, 
-        offset, 
-        espessura, 
-        bins_disponiveis, 
-        peso_especifico_base, 
-        status_signal_emitter
-    )
+    if resultado_otimizado is not None:
+        resultado_otimizado['chave_job'] = chave_cache
+        resultado_otimizado['sobras_usadas'] = _sobras_usadas(resultado_otimizado, sobras_estoque)
+        # Nesting em lote: o resultado também sai separado por projeto.
+        if len({p.get('project_number') for p in pecas}) > 1:
+            resultado_otimizado['projetos'] = dividir_resultado_por_projeto(resultado_otimizado, espessura, peso_especifico_base)
+    # Uma busca cortada pelo prazo não é guardada: o mesmo job sem prazo pode achar um plano melhor.
+    # O mesmo vale para o re-nesting incremental, que mantém chapas do plano anterior.
+    if (cache is not None and resultado_otimizado is not None and not resultado_otimizado['estatisticas_busca'].get('interrompida_por_tempo')
+            and not resultado_otimizado['estatisticas_busca'].get('incremental')):
+        cache.put(chave_cache, resultado_otimizado)
 
     logging.info(f"--- ORQUESTRAÇÃO OTIMIZADA FINALIZADA ---")
     return resultado_otimizado
 
+# --- INÍCIO: NESTING DE VÁRIAS ESPESSURAS EM PARALELO ---
+def _orquestrar_em_processo(parametros, fila_parciais=None, cancelamento=None):
+    """
+    Ponto de entrada dos processos de trabalho para o cálculo de uma espessura inteira.
+    Os resultados parciais (modo com prazo) voltam ao processo principal por 'fila_parciais'.
+    """
+    callback = None
+    if fila_parciais is not None:
+        callback = lambda resultado: fila_parciais.put((parametros['espessura'], resultado))
+    try:
+        return parametros['espessura'], orquestrar_planos_de_corte(**parametros, resultado_parcial_callback=callback, cancelamento=cancelamento), None
+    except NestingCancelado:
+        raise
+    except Exception as e:
+        logging.error(f"Erro no cálculo da espessura {parametros['espessura']}mm: {e}", exc_info=True)
+        return parametros['espessura'], None, str(e)
+
+def orquestrar_espessuras_em_paralelo(tarefas, resultado_callback, erro_callback, status_signal_emitter=None, parcial_callback=None, cancelamento=None):
+    """
+    Calcula várias espessuras, cada uma em um processo de trabalho próprio.
 
-def calcular_plano_de_corte_em_bins(pecas, offset, espessura, bins, peso_especifico_base=7.85, status_signal_emitter=None):
+    :param tarefas: Lista de dicionários com os argumentos de 'orquestrar_planos_de_corte' (um por espessura).
+    :param resultado_callback: Chamado como (espessura, resultado) assim que cada espessura termina, em qualquer ordem.
+    :param erro_callback: Chamado como (espessura, mensagem) se o cálculo de uma espessura falhar.
+    :param parcial_callback: Opcional; chamado como (espessura, resultado) a cada melhora de uma
+        espessura ainda em cálculo (modo com prazo), sempre antes do resultado final dela.
+    :param cancelamento: CancelamentoToken opcional; ao ser acionado, os processos de trabalho
+        são encerrados e NestingCancelado é levantada.
+    """
+    pool = _obter_pool() if len(tarefas) > 1 else None
+
+    if pool is None:
+        # Uma única espessura (ou máquina de um núcleo): calcula aqui mesmo, mantendo o
+        # status detalhado e o portfólio paralelo dentro de 'calcular_plano_de_corte_em_bins'.
+        for parametros in tarefas:
+            callback = None
+            if parcial_callback is not None:
+                callback = lambda resultado, espessura=parametros['espessura']: parcial_callback(espessura, resultado)
+            try:
+                resultado = orquestrar_planos_de_corte(**parametros, status_signal_emitter=status_signal_emitter,
+                                                       resultado_parcial_callback=callback, cancelamento=cancelamento)
+            except NestingCancelado:
+                raise
+            except Exception as e:
+                logging.error(f"Erro no cálculo da espessura {parametros['espessura']}mm: {e}", exc_info=True)
+                erro_callback(parametros['espessura'], str(e))
+                continue
+            resultado_callback(parametros['espessura'], resultado)
+        return
+
+    logging.info(f"Distribuindo {len(tarefas)} espessuras entre os processos de trabalho.")
+    if status_signal_emitter: status_signal_emitter.emit(f"Calculando {len(tarefas)} espessuras em paralelo...")
+    fila_resultados = queue.Queue()
+    # A fila dos parciais precisa atravessar processos: usa um Manager só quando há quem os receba.
+    gerenciador = multiprocessing.get_context('spawn').Manager() if parcial_callback is not None else None
+    fila_parciais = gerenciador.Queue() if gerenciador is not None else None
+    lote = _novo_lote()
+    for parametros in tarefas:
+        pool.apply_async(_orquestrar_em_processo, (parametros, fila_parciais, lote), callback=fila_resultados.put, error_callback=fila_resultados.put)
+
+    concluidas_espessuras = set()
+
+    def _repassar_parciais():
+        while fila_parciais is not None:
+            try:
+                espessura, resultado = fila_parciais.get_nowait()
+            except queue.Empty:
+                return
+            if espessura not in concluidas_espessuras:
+                parcial_callback(espessura, resultado)
+
+    try:
+        concluidas = 0
+        while concluidas < len(tarefas):
+            try:
+                item = _aguardar_resultado(fila_resultados, cancelamento, timeout=0.2 if fila_parciais is not None else None)
+            except queue.Empty:
+                _repassar_parciais()
+                continue
+            # Um processo só devolve o final depois de publicar seus parciais: repassa-os antes.
+            _repassar_parciais()
+            if isinstance(item, BaseException):
+                raise item
+            concluidas += 1
+            espessura, resultado, erro = item
+            concluidas_espessuras.add(espessura)
+            if status_signal_emitter: status_signal_emitter.emit(f"Espessura {espessura}mm concluída ({concluidas}/{len(tarefas)}).")
+            if erro is not None:
+                erro_callback(espessura, erro)
+            else:
+                resultado_callback(espessura, resultado)
+    finally:
+        if gerenciador is not None:
+            gerenciador.shutdown()
+# --- FIM: NESTING DE VÁRIAS ESPESSURAS EM PARALELO ---
+
+
+def calcular_plano_de_corte_em_bins(pecas, offset, espessura, bins, peso_especifico_base=7.85, status_signal_emitter=None, aninhar_viaveis=False,
+                                    tempo_limite=None, resultado_parcial_callback=None, cancelamento=None, resultado_anterior=None,
+                                    historico_algoritmos=None, escala_inteira=None, modo_fluxo=False, forma_real=True,
+                                    guilhotina=False, corte_comum=False, kerf=KERF_PADRAO):
     """
     Calcula o plano de corte, incluindo uma análise detalhada de pesos e sucatas.
+    Levanta PecasInviaveisError se alguma peça não couber nas chapas, a menos que
+    'aninhar_viaveis' seja True (nesse caso só as peças que cabem são alocadas).
+
+    :param tempo_limite: Prazo da busca em segundos (None = sem limite). Ao atingi-lo, a busca
+        entrega a melhor solução encontrada até ali.
+    :param resultado_parcial_callback: Chamado com um resultado completo cada vez que a busca
+        encontra uma solução melhor que a anterior.
+    :param cancelamento: CancelamentoToken opcional, consultado entre algoritmos, contagens
+        de chapas e tentativas; quando acionado levanta NestingCancelado.
+    :param resultado_anterior: Resultado anterior do mesmo job; as chapas não afetadas pela
+        diferença de peças são mantidas e só o restante passa pela busca.
+    :param historico_algoritmos: AlgorithmStats opcional. Os algoritmos que mais vencem em jobs
+        parecidos são testados primeiro; com 'tempo_limite', os perdedores crônicos ficam de fora.
+        Ao final, o vencedor e os tempos de cada algoritmo são registrados no histórico.
+    :param escala_inteira: Se informado, peças e chapas viram inteiros em 1/escala_inteira mm
+        (peças e área útil das chapas arredondadas para cima, com a diferença tirada da margem;
+        ver '_escalar_bid') e toda a busca roda em inteiros, assim como a fusão das sobras; os
+        planos voltam para mm, com as medidas exatas das peças, só na materialização.
+    :param modo_fluxo: Empacota em fluxo com uma janela limitada de chapas abertas, em vez da
+        busca completa, com memória constante para jobs muito grandes.
+    :param forma_real: Peças DXF de contorno não retangular são encaixadas pela forma real
+        (no-fit polygons, ver '_solucao_forma_real') antes da busca; as demais, e todas no
+        modo em fluxo, seguem pelo bounding box.
+    :param guilhotina: Só layouts cortáveis com cortes de ponta a ponta (serra de painel,
+        guilhotina): a busca usa a família Guillotine do rectpack, os atalhos só valem se as
+        chapas deles passarem na árvore de cortes e cada plano traz a sequência em 'cortes'.
+    :param corte_comum: Retângulos iguais são encaixados em blocos de linha comum, separados só
+        por 'kerf' mm em vez do offset (ver '_blocos_corte_comum'). Cada plano traz as peças
+        do bloco com a chave 'bloco' e o corte economizado em 'corte_comum'.
     """
     logging.info(f"Iniciando cálculo de corte para {len(pecas)} tipos de peças em {len(bins)} bins disponíveis.")
 
+    # Pré-análise: falha na hora em vez de testar centenas de packs que nunca vão fechar.
+    viabilidade = analisar_viabilidade(pecas, bins, escala_inteira)
+    if viabilidade['inviaveis'] or viabilidade['area_excedente'] > 0:
+        logging.warning(f"Pré-análise: {len(viabilidade['inviaveis'])} tipo(s) de peça não cabem; área excedente {viabilidade['area_excedente']:.0f}mm².")
+        indices_inviaveis = {item['indice'] for item in viabilidade['inviaveis']}
+        if not aninhar_viaveis or viabilidade['area_excedente'] > 0 or len(indices_inviaveis) == len(pecas):
+            raise PecasInviaveisError(viabilidade)
+        pecas = [p for i, p in enumerate(pecas) if i not in indices_inviaveis]
+        if status_signal_emitter: status_signal_emitter.emit(f"{len(indices_inviaveis)} tipo(s) de peça não cabem na chapa e foram deixados de fora.")
+
     def _calc_peso(area_mm2):
         if espessura is None or espessura <= 0:
             return 0
@@ -200,20 +1802,21 @@ def calcular_plano_de_corte_em_bins(pecas, offset, espessura, bins, peso_especif
     outras_pecas = [p for p in pecas if p.get('forma') not in ['right_triangle', 'trapezoid']]
 
     from collections import defaultdict
+    # No nesting em lote, peças de projetos diferentes não se misturam no mesmo tipo.
     mapa_triangulos = defaultdict(list)
     for t in triangulos:
-        mapa_triangulos[(t['largura'], t['altura'])].append(t)
+        mapa_triangulos[(t['largura'], t['altura'], t.get('project_number'))].append(t)
 
     for dim, lista_triangulos in mapa_triangulos.items():
         total_qtd = sum(t['quantidade'] for t in lista_triangulos)
         # --- CORREÇÃO: Remove a lógica de pareamento de triângulos. ---
         # Tratar cada triângulo como um retângulo individual (seu bounding box)
         # permite que o algoritmo de nesting os posicione livremente, o que é mais robusto.
-        pecas_processadas.append({'forma': 'right_triangle', 'largura': dim[0], 'altura': dim[1], 'quantidade': total_qtd})
+        pecas_processadas.append({'forma': 'right_triangle', 'largura': dim[0], 'altura': dim[1], 'quantidade': total_qtd, 'project_number': dim[2]})
 
     mapa_trapezios = defaultdict(list)
     for t in trapezios:
-        mapa_trapezios[(t['largura'], t['altura'], t.get('small_base', 0))].append(t)
+        mapa_trapezios[(t['largura'], t['altura'], t.get('small_base', 0), t.get('project_number'))].append(t)
 
     for dim, lista_trapezios in mapa_trapezios.items():
         total_qtd = sum(t['quantidade'] for t in lista_trapezios)
@@ -221,16 +1824,31 @@ def calcular_plano_de_corte_em_bins(pecas, offset, espessura, bins, peso_especif
         if num_pares > 0:
             pecas_processadas.append({
                 'forma': 'paired_trapezoid', 'largura': dim[0] + dim[2], 'altura': dim[1], 'quantidade': num_pares,
-                'orig_dims': {'large_base': dim[0], 'small_base': dim[2], 'height': dim[1]}
+                'orig_dims': {'large_base': dim[0], 'small_base': dim[2], 'height': dim[1]}, 'project_number': dim[3]
             })
         if num_sozinhos > 0:
-            pecas_processadas.append(lista_trapezios[0])
+            # O trapézio sem par leva só a unidade que sobrou e as medidas usadas no cálculo de área.
+            pecas_processadas.append(dict(lista_trapezios[0], quantidade=num_sozinhos,
+                                          orig_dims={'large_base': dim[0], 'small_base': dim[2], 'height': dim[1]}))
+
+    # Corte em linha comum: retângulos iguais viram blocos com a aresta compartilhada.
+    # 'limite_sem_blocos' guarda o limite inferior de chapas do mesmo job sem os blocos.
+    limite_sem_blocos = None
+    if corte_comum:
+        retangulos_iguais = [p for p in outras_pecas if p.get('forma', 'rectangle') == 'rectangle']
+        outras_pecas = [p for p in outras_pecas if p.get('forma', 'rectangle') != 'rectangle']
+        blocos = _blocos_corte_comum(retangulos_iguais, offset, kerf, bins)
+        if any(b['forma'] == 'common_line_block' for b in blocos):
+            limite_sem_blocos = _limite_inferior_chapas(
+                [(p['largura'], p['altura']) for p in pecas_processadas + retangulos_iguais + outras_pecas for _ in range(int(p['quantidade']))], bins)
+        pecas_processadas.extend(blocos)
+    bins_em_mm = bins
 
     pecas_processadas.extend(outras_pecas)
     
-    peca_unica_id = 1
+    # Tabela compacta: um dicionário por tipo e, por peça física, só o índice do tipo.
     retangulos_para_alocar = []
-    id_peca_map = {}
+    tipos_peca, quantidades = [], []
 
     for peca_proc in pecas_processadas:
         largura_com_offset = peca_proc['largura']
@@ -238,209 +1856,749 @@ def calcular_plano_de_corte_em_bins(pecas, offset, espessura, bins, peso_especif
         largura_sem_offset = largura_com_offset - offset if largura_com_offset > offset else largura_com_offset
         altura_sem_offset = altura_com_offset - offset if altura_com_offset > offset else altura_com_offset
         
-        for _ in range(peca_proc['quantidade']):
-            rid = str(peca_unica_id)
-            retangulos_para_alocar.append((largura_com_offset, altura_com_offset, rid))
-            
-            id_peca_map[rid] = {
-                'largura_com_offset': largura_com_offset, 'altura_com_offset': altura_com_offset,
-                'largura_sem_offset': largura_sem_offset, 'altura_sem_offset': altura_sem_offset,
-                'furos': peca_proc.get('furos', []),
-                'forma': peca_proc.get('forma', 'rectangle'),
-                'diametro': peca_proc.get('diametro', 0),
-                'orig_dims': peca_proc.get('orig_dims'),
-                'dxf_path': peca_proc.get('dxf_path')
-            }
-            peca_unica_id += 1
+        # Todas as unidades de um mesmo tipo compartilham o mesmo dicionário de informações.
+        peca_info = {
+            'largura_com_offset': largura_com_offset, 'altura_com_offset': altura_com_offset,
+            'largura_sem_offset': largura_sem_offset, 'altura_sem_offset': altura_sem_offset,
+            'furos': peca_proc.get('furos', []),
+            'forma': peca_proc.get('forma', 'rectangle'),
+            'diametro': peca_proc.get('diametro', 0),
+            'orig_dims': peca_proc.get('orig_dims'),
+            'dxf_path': peca_proc.get('dxf_path'),
+            'project_number': peca_proc.get('project_number'),
+            'contorno': None
+        }
+        if forma_real and not modo_fluxo and peca_info['forma'] == 'dxf_shape':
+            contorno = carregar_contorno(peca_info['dxf_path'])
+            # Contornos retangulares continuam no caminho rápido do rectpack.
+            if contorno and not e_retangular(contorno):
+                peca_info['contorno'] = contorno
+        peca_info['assinatura'] = _assinatura_tipo(peca_info)
+        tipos_peca.append(peca_info)
+        quantidades.append(peca_proc['quantidade'])
+    tabela_pecas = TabelaPecas(tipos_peca, quantidades)
+
+    # No modo em fluxo os retângulos não são montados em lista: o gerador alimenta o empacotador.
+    if not modo_fluxo:
+        retangulos_para_alocar = list(_gerar_retangulos(tipos_peca, quantidades))
+
+    # Opções que mudam o layout das chapas; ficam nas estatísticas e decidem o re-nesting incremental.
+    # (O modo inteiro não entra: as chapas anteriores são convertidas para as unidades da busca.)
+    opcoes_busca = {'forma_real': forma_real, 'guilhotina': guilhotina, 'corte_comum': corte_comum, 'kerf': kerf if corte_comum else None}
+
+    # Modo inteiro: daqui até a materialização, medidas em unidades de 1/escala_inteira mm.
+    bid_em_mm = {}
+    if escala_inteira:
+        bid_em_mm = {_escalar_bid(b, escala_inteira): tuple(b) for b in bins}
+        retangulos_para_alocar = _escalar_retangulos(retangulos_para_alocar, escala_inteira)
+        bins = [_escalar_bid(b, escala_inteira) for b in bins]
+    fator_area = 1.0 / escala_inteira ** 2 if escala_inteira else 1.0
+
+    # Jobs só de círculos: as chapas cheias de cada diâmetro saem do reticulado analítico e
+    # apenas as sobras misturadas seguem para a busca, nas chapas que restarem.
+    inicio_busca = time.perf_counter()
+    algoritmos_padrao = ALGORITMOS_GUILHOTINA if guilhotina else None
+    # Packs dos atalhos (padrões de uma chapa, caudas e conferências); entram em 'packs_executados'.
+    packs_atalhos = Counter()
+    # Sobras do estoque: vêm no início da lista e são enchidas antes de tudo, uma a uma. Os atalhos
+    # e a busca ficam só com as chapas inteiras. No modo em fluxo o empacotador já as abre na ordem.
+    num_sobras = next((i for i, b in enumerate(bins) if len(b) < 4), len(bins))
+    chapas_sobras = []
+    if 0 < num_sobras < len(bins) and not modo_fluxo:
+        chapas_sobras, retangulos_para_alocar = _solucao_sobras(retangulos_para_alocar, bins[:num_sobras], algoritmos_padrao, cancelamento, packs_atalhos)
+        bins = bins[num_sobras:]
+        logging.info(f"Sobras do estoque: {len(chapas_sobras)} de {num_sobras} usada(s), {len(retangulos_para_alocar)} peça(s) para as chapas inteiras.")
+    retangulos_sem_atalho, bins_sem_atalho = retangulos_para_alocar, bins
+    chapas_fixas, origem_chapas_fixas, estatisticas_incremental = [], None, None
+    # Re-nesting incremental: as chapas anteriores que a edição não tocou ficam como estão.
+    solucao_incremental = None
+    if resultado_anterior and not modo_fluxo:
+        solucao_incremental = _reaproveitar_chapas(resultado_anterior, retangulos_para_alocar, tabela_pecas, bins, offset, escala_inteira, opcoes_busca)
+    # Forma real: as peças DXF recortadas vão para as primeiras chapas, encaixadas por NFP.
+    chapas_forma_real = []
+    if forma_real and solucao_incremental is None and not modo_fluxo and not guilhotina:
+        # Com prazo, o nesting por NFP fica com no máximo metade dele; a busca precisa do resto.
+        prazo_nfp = inicio_busca + (min(TEMPO_MAXIMO_NFP, tempo_limite / 2) if tempo_limite else TEMPO_MAXIMO_NFP)
+        solucao_forma_real = _solucao_forma_real(retangulos_para_alocar, tabela_pecas, bins, offset, escala_inteira, bid_em_mm, cancelamento, prazo_nfp, packs_atalhos)
+        if solucao_forma_real is not None:
+            chapas_forma_real, retangulos_para_alocar = solucao_forma_real
+            bins = bins[len(chapas_forma_real):]
+            logging.info(f"Forma real: {len(chapas_forma_real)} chapa(s) encaixada(s) por NFP, {len(retangulos_para_alocar)} peça(s) para a busca.")
+            if status_signal_emitter: status_signal_emitter.emit(f"Peças DXF encaixadas pela forma real em {len(chapas_forma_real)} chapa(s).")
+    solucao_circulos = None if solucao_incremental is not None else _solucao_circulos(retangulos_para_alocar, tabela_pecas, bins)
+    if solucao_incremental is not None:
+        chapas_fixas, retangulos_para_alocar, estatisticas_incremental = solucao_incremental
+        bins = bins[len(chapas_fixas):]
+        origem_chapas_fixas = 'Incremental'
+        logging.info(f"Re-nesting incremental: {estatisticas_incremental['chapas_mantidas']} chapa(s) mantida(s), "
+                     f"{estatisticas_incremental['chapas_refeitas']} refeita(s), {len(retangulos_para_alocar)} peça(s) para a busca.")
+        if status_signal_emitter: status_signal_emitter.emit(f"Re-nesting incremental: {estatisticas_incremental['chapas_mantidas']} chapa(s) mantida(s).")
+    elif solucao_circulos is not None:
+        chapas_fixas, retangulos_para_alocar = solucao_circulos
+        bins = bins[len(chapas_fixas):]
+        origem_chapas_fixas = 'ReticuladoCircular'
+        logging.info(f"Job de círculos: {len(chapas_fixas)} chapa(s) do reticulado analítico, {len(retangulos_para_alocar)} peça(s) para a busca.")
+    elif len(pecas_processadas) > 1 and not modo_fluxo:
+        # Jobs de alta quantidade com vários tipos: padrões repetidos e só o resíduo vai para a busca.
+        solucao_padroes = _solucao_por_padroes(retangulos_para_alocar, bins, cancelamento, algoritmos_padrao, packs_atalhos)
+        if solucao_padroes is not None:
+            chapas_fixas, retangulos_para_alocar = solucao_padroes
+            bins = bins[len(chapas_fixas):]
+            origem_chapas_fixas = 'PadroesRepetidos'
+            logging.info(f"Job de alta quantidade: {len(chapas_fixas)} chapa(s) por padrões repetidos, {len(retangulos_para_alocar)} peça(s) para a busca.")
+    if chapas_forma_real:
+        chapas_fixas = chapas_forma_real + chapas_fixas
+        origem_chapas_fixas = origem_chapas_fixas or 'FormaReal'
+    if guilhotina and not all(_guilhotinavel(bid, chapa) for bid, chapa in chapas_fixas):
+        # O reticulado hexagonal de círculos e chapas antigas fora do modo guilhotina não se cortam assim.
+        logging.info(f"Modo guilhotina: as chapas do atalho '{origem_chapas_fixas}' não são cortáveis em guilhotina; job inteiro para a busca.")
+        chapas_fixas, origem_chapas_fixas, estatisticas_incremental = [], None, None
+        retangulos_para_alocar, bins = retangulos_sem_atalho, bins_sem_atalho
+    if chapas_sobras:
+        chapas_fixas = chapas_sobras + chapas_fixas
+        origem_chapas_fixas = origem_chapas_fixas or 'SobrasEstoque'
 
-    # ESTRATÉGIA DE BUSCA OTIMIZADA
-    todos_algoritmos = [MaxRectsBssf, MaxRectsBaf, MaxRectsBlsf, SkylineBl, SkylineMwf, SkylineBlWm, SkylineMwfl]
+    # --- INÍCIO: BUSCA DO NÚMERO MÍNIMO DE CHAPAS GUIADA POR LIMITE INFERIOR ---
+    todos_algoritmos = list(ALGORITMOS_GUILHOTINA if guilhotina else ALGORITMOS_PORTFOLIO)
+    # Os empates são decididos pela ordem fixa do portfólio, nunca pela ordem aprendida: senão o
+    # primeiro da ordem aprendida venceria todos os empates e o histórico se reforçaria sozinho.
+    ordem_fixa = list(todos_algoritmos)
+    impressao_job = None
+    if historico_algoritmos is not None and retangulos_para_alocar:
+        # Ordem aprendida: os algoritmos que mais vencem em jobs parecidos vão primeiro.
+        impressao_job = historico_algoritmos.impressao_digital(retangulos_para_alocar, bins, espessura)
+        todos_algoritmos = historico_algoritmos.ordenar(impressao_job, todos_algoritmos)
+        if tempo_limite:
+            todos_algoritmos = historico_algoritmos.sem_perdedores_cronicos(impressao_job, todos_algoritmos)
+        logging.info(f"Ordem dos algoritmos para o job '{impressao_job}': {[a.__name__ for a in todos_algoritmos]}.")
+    tempos_algoritmos = {} # nome do algoritmo -> tempo total de pack neste job
     melhor_resultado_final = None
     num_pecas = len(retangulos_para_alocar)
+    contador_packs = packs_atalhos['packs']
+    prazo = inicio_busca + tempo_limite if tempo_limite else None
+    busca_interrompida = False
 
-    for num_bins_to_try in range(1, len(bins) + 1):
-        if status_signal_emitter: status_signal_emitter.emit(f"Tentando alocar em {num_bins_to_try} chapa(s)...")
-        logging.info(f"--- TENTATIVA COM {num_bins_to_try} CHAPAS ---")
+    def _executar_portfolio(algoritmos, num_bins_to_try, parar, executados):
+        """
+        Executa os algoritmos com 'num_bins_to_try' chapas, em paralelo quando o job é grande.
+        Para cada solução completa chama 'parar(algo, chapas)'; se retornar True, os demais
+        algoritmos são cancelados. Os algoritmos que chegaram ao fim são adicionados a 'executados'.
+        """
+        nonlocal contador_packs
+        bins_ativos = [tuple(b) for b in bins[:num_bins_to_try]]
+        pool = _obter_pool() if num_pecas >= LIMIAR_PECAS_PARALELO and len(algoritmos) > 1 else None
 
-        solucoes_validas_nesta_iteracao = []
+        if pool is None:
+            for algo in algoritmos:
+                _verificar_cancelamento(cancelamento)
+                if _tempo_esgotado():
+                    return
+                contador_packs += 1
+                chapas, tempo = _empacotar(algo, retangulos_para_alocar, bins_ativos)
+                executados.add(algo)
+                tempos_algoritmos[algo.__name__] = tempos_algoritmos.get(algo.__name__, 0.0) + tempo
+                logging.debug(f"Algoritmo '{algo.__name__}' executado em {tempo:.3f}s.")
+                if chapas is not None and parar(algo, chapas):
+                    return
+            return
 
-        for algo in todos_algoritmos:
-            packer = rectpack.newPacker(rotation=True, pack_algo=algo)
-            for r in retangulos_para_alocar:
-                packer.add_rect(r[0], r[1], rid=r[2])
+        fila_resultados = queue.Queue()
+        lote = _novo_lote()
+        for algo in algoritmos:
+            pool.apply_async(_empacotar_em_processo, (algo, retangulos_para_alocar, bins_ativos, lote),
+                             callback=fila_resultados.put, error_callback=fila_resultados.put)
+        restantes = len(algoritmos)
+        while restantes:
+            try:
+                # Com prazo e uma solução em mãos, espera os algoritmos só até o prazo.
+                espera = max(0.0, prazo - time.perf_counter()) if prazo is not None and solucoes_validas else None
+                resultado = _aguardar_resultado(fila_resultados, cancelamento, timeout=espera)
+            except queue.Empty:
+                _tempo_esgotado()
+                break
+            restantes -= 1
+            contador_packs += 1
+            if isinstance(resultado, BaseException):
+                raise resultado
+            algo, chapas, tempo = resultado
+            executados.add(algo)
+            tempos_algoritmos[algo.__name__] = tempos_algoritmos.get(algo.__name__, 0.0) + tempo
+            logging.debug(f"Algoritmo '{algo.__name__}' executado em {tempo:.3f}s (processo paralelo).")
+            if chapas is not None and parar(algo, chapas):
+                break
 
-            for i in range(num_bins_to_try):
-                b_width, b_height, b_margin = bins[i]
-                nesting_width = b_width - (2 * b_margin)
-                nesting_height = b_height - (2 * b_margin)
-                if nesting_width > 0 and nesting_height > 0:
-                    packer.add_bin(nesting_width, nesting_height, bid=(b_width, b_height, b_margin))
-            
-            packer.pack()
-
-            num_alocadas = sum(len(b) for b in packer)
-            if num_alocadas == num_pecas:
-                logging.info(f"SUCESSO! Algoritmo '{algo.__name__}' conseguiu alocar todas as peças em {num_bins_to_try} chapas.")
-                
-                planos_agrupados = {}
-                area_total_utilizada_com_offset = 0
-
-                for bin_node in packer:
-                    if not bin_node: continue # Pula bins vazios
-                    chapa_largura, chapa_altura, margin = bin_node.bid
-                    nesting_width, nesting_height = chapa_largura - (2 * margin), chapa_altura - (2 * margin)
-                    chapa_alocada = [r for r in bin_node if hasattr(r, 'x')]
-                    assinatura = (chapa_largura, chapa_altura) + tuple(sorted([(r.x, r.y, r.width, r.height) for r in chapa_alocada]))
-
-                    if assinatura not in planos_agrupados:
-                        plano_de_corte, pecas_contagem = [], {}
-                        for r in chapa_alocada:
-                            peca_info = id_peca_map[r.rid]
-                            forma = peca_info.get('forma', 'rectangle')
-                            if forma == 'rectangle': tipo_key = f"R {peca_info['largura_sem_offset']:.0f}x{peca_info['altura_sem_offset']:.0f}"
-                            elif forma == 'circle': tipo_key = f"C Ø{peca_info['diametro']:.0f}"
-                            elif forma == 'paired_trapezoid': # A lógica de trapézio pode ser mantida por enquanto
-                                dims = peca_info['orig_dims']
-                                tipo_key = f"2Z {dims['large_base']-offset:.0f}/{dims['small_base']-offset:.0f}x{dims['height']-offset:.0f}"
-                            elif forma == 'dxf_shape': tipo_key = f"DXF: {os.path.basename(peca_info['dxf_path'])}"
-                            else: tipo_key = f"{forma[0].upper()} {peca_info['largura_sem_offset']:.0f}x{peca_info['altura_sem_offset']:.0f}"
-                            pecas_contagem[tipo_key] = pecas_contagem.get(tipo_key, 0) + 1
-
-                            furos_trans = []
-                            if r.width != peca_info['largura_com_offset']:
-                                for furo in peca_info['furos']: furos_trans.append({'diam': furo['diam'], 'x': furo['y'], 'y': peca_info['largura_com_offset'] - furo['x']})
-                            else: furos_trans = peca_info['furos']
-
-                            plano_de_corte.append({
-                                "x": margin + r.x + (offset / 2),
-                                "y": (chapa_altura - margin) - (r.y + r.height) + (offset / 2), # Invertido para origem no topo
-                                "largura": r.width - offset, "altura": r.height - offset,
-                                "tipo_key": tipo_key, "furos": furos_trans, "forma": forma, "rid": r.rid, "diametro": peca_info['diametro'],
-                                "orig_dims": peca_info.get('orig_dims'), "dxf_path": peca_info['dxf_path']
-                            })
-                        
-                        resumo_pecas = [{"tipo": t, "qtd": q} for t, q in pecas_contagem.items()]
-                        pecas_para_geometria = [{'x': r.x, 'y': r.y, 'largura': r.width, 'altura': r.height} for r in chapa_alocada]
-                        sobras_na_area_nesting = encontrar_sobras(nesting_width, nesting_height, pecas_para_geometria)
-                        for s in sobras_na_area_nesting: s['x'] += margin; s['y'] += margin
-
-                        planos_agrupados[assinatura] = {
-                            "plano": plano_de_corte, "repeticoes": 1, "resumo_pecas": resumo_pecas, "sobras": sobras_na_area_nesting,
-                            "chapa_largura": chapa_largura, "chapa_altura": chapa_altura
-                        }
-                    else:
-                        planos_agrupados[assinatura]["repeticoes"] += 1
-                    
-                    area_total_utilizada_com_offset += sum(r.width * r.height for r in chapa_alocada)
-                
-                # Calcula o aproveitamento para esta solução específica (para este algoritmo).
-                area_total_chapas = sum(p['chapa_largura'] * p['chapa_altura'] * p['repeticoes'] for p in planos_agrupados.values())
-                
-                # Para calcular a área real, precisamos iterar sobre todas as peças em todos os planos únicos
-                area_real_pecas = 0
-                # --- INÍCIO: LÓGICA ESPECIAL PARA CÍRCULOS ---
-                area_bounding_box_pecas = 0
-                is_only_circles = all(id_peca_map[r['rid']].get('forma') == 'circle' for plano in planos_agrupados.values() for r in plano['plano'])
-
-                for plano in planos_agrupados.values():
-                    for r in plano['plano']:
-                        peca_info = id_peca_map[r['rid']]
-                        # --- OTIMIZAÇÃO: Cálculo de área real por forma ---
-                        if peca_info.get('forma') == 'circle':
-                            area_real_pecas += (math.pi * (peca_info['diametro'] / 2)**2) * plano['repeticoes']
-                        elif peca_info.get('forma') == 'right_triangle':
-                            # A área de um triângulo é (base*altura)/2.
-                            area_real_pecas += (peca_info['largura_sem_offset'] * peca_info['altura_sem_offset'] * 0.5) * plano['repeticoes']
-                        elif peca_info.get('forma') in ['trapezoid', 'paired_trapezoid']:
-                            # A área de um trapézio é ((B+b)*h)/2. Um par tem o dobro.
-                            fator = 0.5 if peca_info.get('forma') == 'trapezoid' else 1.0
-                            dims = peca_info['orig_dims']
-                            area_real_pecas += ((dims['large_base'] + dims['small_base']) * dims['height'] * fator) * plano['repeticoes']
-                        else:
-                            # Para retângulos e DXFs (usa bounding box como aproximação)
-                            area_real_pecas += (peca_info['largura_sem_offset'] * peca_info['altura_sem_offset']) * plano['repeticoes']
-                        # --- FIM DA OTIMIZAÇÃO ---
-                        
-                        # Calcula a área do bounding box para a lógica de sucata
-                        area_bounding_box_pecas += (peca_info['largura_sem_offset'] * peca_info['altura_sem_offset']) * plano['repeticoes']
-                
-                # Define qual área de peça usar para o cálculo da sucata
-                area_pecas_para_sucata = area_bounding_box_pecas if is_only_circles else area_real_pecas
-                # --- FIM: LÓGICA ESPECIAL PARA CÍRCULOS ---
-
-                aproveitamento_geral = (area_real_pecas / area_total_chapas) * 100 if area_total_chapas > 0 else 0
-
-                # Armazena a solução válida junto com seu aproveitamento.
-                solucoes_validas_nesta_iteracao.append({
-                    'aproveitamento': aproveitamento_geral,
-                    'planos_agrupados': planos_agrupados,
-                    'area_total_chapas': area_total_chapas,
-                    'area_real_pecas': area_real_pecas,
-                    'area_total_utilizada_com_offset': area_total_utilizada_com_offset
+        if restantes:
+            # O pool continua vivo para a próxima contagem: só as tarefas deste lote são canceladas.
+            logging.info(f"Parada antecipada: cancelando {restantes} algoritmo(s) ainda em execução.")
+            _cancelar_tarefas_pendentes()
+
+    # Todas as soluções válidas alocam as mesmas peças: a área real delas é calculada uma vez só.
+    area_real_todas_pecas = tabela_pecas.area_real(range(len(tabela_pecas)))
+    area_chapas_fixas = sum(bid[0] * bid[1] for bid, _ in chapas_fixas) * fator_area
+    tempos = {'avaliacao': 0.0, 'materializacao': 0.0}
+
+    def _avaliar_solucao(chapas, nome_algoritmo, ordem_algoritmo=0):
+        """
+        Pontuação barata de um pack bem-sucedido: só a contagem de chapas e o aproveitamento.
+        O agrupamento dos planos e as sobras ficam para '_materializar_solucao', chamada
+        apenas para a solução vencedora. 'chapas_usadas' conta só as chapas da busca.
+        """
+        inicio = time.perf_counter()
+        area_total_chapas = area_chapas_fixas + sum(bid[0] * bid[1] for bid, _ in chapas) * fator_area
+        solucao = {
+            'algoritmo': nome_algoritmo,
+            'ordem_algoritmo': ordem_algoritmo,
+            'chapas_usadas': len(chapas),
+            'aproveitamento': (area_real_todas_pecas / area_total_chapas) * 100 if area_total_chapas > 0 else 0,
+            'chapas': chapas
+        }
+        tempos['avaliacao'] += time.perf_counter() - inicio
+        return solucao
+
+    def _maior_sobra(solucao):
+        """
+        Desempate entre soluções com as mesmas chapas na mesma contagem (o aproveitamento é o
+        mesmo): a área da maior sobra na chapa menos ocupada, o retalho que volta ao estoque.
+        """
+        if not solucao['chapas']:
+            return 0.0
+        bid, chapa = min(solucao['chapas'], key=lambda c: sum(r.width * r.height for r in c[1]))
+        coords = np.array([r[:4] for r in chapa] or np.empty((0, 4))).reshape(-1, 4)
+        sobras = encontrar_sobras(bid[0] - (2 * bid[2]), bid[1] - (2 * bid[2]), coords, escala=escala_inteira)
+        return max((s['largura'] * s['altura'] for s in sobras), default=0.0)
+
+    def _materializar_chapa(acumulado, bid, chapa_alocada):
+        """
+        Agrupa uma chapa em 'acumulado' (planos agrupados e área utilizada): cria o plano de
+        corte e as sobras na primeira ocorrência e só conta as repetições nas seguintes.
+        Retorna o plano agrupado correspondente.
+        """
+        planos_agrupados = acumulado['planos_agrupados']
+        # No modo inteiro a assinatura fica nas unidades da busca e a deduplicação é exata.
+        # Cada sobra do estoque é uma chapa só: o id dela entra na assinatura.
+        assinatura = (bid[0], bid[1], bid[3:]) + tuple(sorted([(r.x, r.y, r.width, r.height, r.contorno or ()) for r in chapa_alocada]))
+        bid_busca = bid
+        if escala_inteira:
+            bid = bid_em_mm[bid]
+        chapa_largura, chapa_altura, margin = bid[:3]
+        nesting_width, nesting_height = chapa_largura - (2 * margin), chapa_altura - (2 * margin)
+
+        if assinatura not in planos_agrupados:
+            # Coordenadas em mm como um array Nx4: sobras e áreas saem direto dele, e os
+            # dicionários por peça só são montados aqui, uma vez por plano único.
+            coords = tabela_pecas.coordenadas(chapa_alocada, escala_inteira)
+            plano_de_corte, pecas_contagem = [], {}
+            blocos, comprimento_comum = 0, 0.0
+            for r, (px, py, pw, ph) in zip(chapa_alocada, coords.tolist()):
+                peca_info = tabela_pecas[r.rid]
+                forma = peca_info.get('forma', 'rectangle')
+                if forma == 'common_line_block':
+                    # As peças do bloco entram no plano uma a uma, como retângulos, marcadas com o bloco.
+                    dims = peca_info['orig_dims']
+                    tipo_key = f"R {dims['largura']:.0f}x{dims['altura']:.0f}"
+                    for mx, my, mw, mh, furos_membro in _membros_do_bloco(PecaAlocada(px, py, pw, ph, r.rid), peca_info, offset):
+                        plano_de_corte.append({
+                            "x": margin + mx, "y": (chapa_altura - margin) - (my + mh), "largura": mw, "altura": mh,
+                            "tipo_key": tipo_key, "furos": furos_membro, "forma": 'rectangle', "rid": r.rid, "diametro": 0,
+                            "orig_dims": None, "dxf_path": None, "assinatura": peca_info['assinatura'],
+                            "project_number": peca_info['project_number'], "contorno": None, "bloco": blocos
+                        })
+                    pecas_contagem[tipo_key] = pecas_contagem.get(tipo_key, 0) + dims['colunas'] * dims['linhas']
+                    blocos += 1
+                    comprimento_comum += _comprimento_linha_comum(peca_info)
+                    continue
+                if forma == 'rectangle': tipo_key = f"R {peca_info['largura_sem_offset']:.0f}x{peca_info['altura_sem_offset']:.0f}"
+                elif forma == 'circle': tipo_key = f"C Ø{peca_info['diametro']:.0f}"
+                elif forma == 'paired_trapezoid': # A lógica de trapézio pode ser mantida por enquanto
+                    dims = peca_info['orig_dims']
+                    tipo_key = f"2Z {dims['large_base']-offset:.0f}/{dims['small_base']-offset:.0f}x{dims['height']-offset:.0f}"
+                elif forma == 'dxf_shape': tipo_key = f"DXF: {os.path.basename(peca_info['dxf_path'])}"
+                else: tipo_key = f"{forma[0].upper()} {peca_info['largura_sem_offset']:.0f}x{peca_info['altura_sem_offset']:.0f}"
+                pecas_contagem[tipo_key] = pecas_contagem.get(tipo_key, 0) + 1
+
+                furos_trans = []
+                if pw != peca_info['largura_com_offset']:
+                    for furo in peca_info['furos']: furos_trans.append({'diam': furo['diam'], 'x': furo['y'], 'y': peca_info['largura_com_offset'] - furo['x']})
+                else: furos_trans = peca_info['furos']
+
+                plano_de_corte.append({
+                    "x": margin + px + (offset / 2),
+                    "y": (chapa_altura - margin) - (py + ph) + (offset / 2), # Invertido para origem no topo
+                    "largura": pw - offset, "altura": ph - offset,
+                    "tipo_key": tipo_key, "furos": furos_trans, "forma": forma, "rid": r.rid, "diametro": peca_info['diametro'],
+                    "orig_dims": peca_info.get('orig_dims'), "dxf_path": peca_info['dxf_path'],
+                    "assinatura": peca_info['assinatura'], "project_number": peca_info['project_number'],
+                    # Forma real: polígono relativo ao canto superior esquerdo da peça (origem no topo).
+                    "contorno": [(cx, ph - offset - cy) for cx, cy in r.contorno] if r.contorno else None
                 })
 
-        if solucoes_validas_nesta_iteracao:
-            logging.info(f"Encontrado o número mínimo de chapas: {num_bins_to_try}. Selecionando a melhor solução.")
-            melhor_solucao_iteracao = max(solucoes_validas_nesta_iteracao, key=lambda x: x['aproveitamento'])
-            
-            planos_unicos = list(melhor_solucao_iteracao['planos_agrupados'].values())
-            total_chapas = sum(p['repeticoes'] for p in planos_unicos)
-
-            # CÁLCULO DETALHADO DE SUCATA E PESOS
-            total_area_sobra_aproveitavel, total_area_sobra_sucata = 0, 0
-            sobras_aproveitaveis_detalhado, sucatas_dimensionadas_detalhado = [], []
-            for plano in planos_unicos:
-                for sobra in plano.get('sobras', []):
-                    area_sobra = sobra['largura'] * sobra['altura']
-                    item = {'largura': sobra['largura'], 'altura': sobra['altura'], 'peso': _calc_peso(area_sobra), 'quantidade': plano['repeticoes']}
-                    if sobra['tipo_sobra'] == 'aproveitavel':
-                        total_area_sobra_aproveitavel += area_sobra * plano['repeticoes']
-                        sobras_aproveitaveis_detalhado.append(item)
-                    else:
-                        total_area_sobra_sucata += area_sobra * plano['repeticoes']
-                        sucatas_dimensionadas_detalhado.append(item)
-
-            area_offset_total = melhor_solucao_iteracao['area_total_utilizada_com_offset'] - melhor_solucao_iteracao['area_real_pecas']
-            # --- CORREÇÃO: Ajusta o cálculo do offset para o caso especial de círculos ---
-            area_offset_total = melhor_solucao_iteracao['area_total_utilizada_com_offset'] - area_pecas_para_sucata
-            area_demais_sucatas = melhor_solucao_iteracao['area_total_chapas'] - melhor_solucao_iteracao['area_real_pecas'] - total_area_sobra_aproveitavel - total_area_sobra_sucata - area_offset_total
-            # --- OTIMIZAÇÃO: Garante que a área de perda de processo nunca seja negativa ---
-            area_demais_sucatas = max(0, area_demais_sucatas)
-            # --- FIM DA OTIMIZAÇÃO ---
-
-            sucata_detalhada = {
-                "peso_offset": _calc_peso(area_offset_total),
-                "sobras_aproveitaveis": sobras_aproveitaveis_detalhado,
-                "sucatas_dimensionadas": sucatas_dimensionadas_detalhado,
-                "peso_demais_sucatas": _calc_peso(area_demais_sucatas)
-            }
+            resumo_pecas = [{"tipo": t, "qtd": q} for t, q in pecas_contagem.items()]
+            if escala_inteira:
+                # Sobras sobre as posições inteiras da busca, na área útil em mm convertida para baixo.
+                util_inteira = [math.floor(round(v * escala_inteira, 6)) for v in (nesting_width, nesting_height)]
+                posicoes_busca = np.array([r[:4] for r in chapa_alocada] or np.empty((0, 4), dtype=np.int64)).reshape(-1, 4)
+                sobras_na_area_nesting = encontrar_sobras(*util_inteira, posicoes_busca, escala=escala_inteira)
+            else:
+                sobras_na_area_nesting = encontrar_sobras(nesting_width, nesting_height, coords)
+            for s in sobras_na_area_nesting: s['x'] += margin; s['y'] += margin
+
+            # Modo guilhotina: a árvore sai das posições da busca (exatas no modo inteiro) e vai para a chapa, origem no topo.
+            cortes = None
+            if guilhotina:
+                cortes = _arvore_de_cortes([r[:4] for r in chapa_alocada], bid_busca[0] - (2 * bid_busca[2]), bid_busca[1] - (2 * bid_busca[2]))
+                if cortes is None:
+                    logging.warning(f"Modo guilhotina: plano {chapa_largura}x{chapa_altura} sem sequência de cortes em guilhotina.")
+                escala_cortes = escala_inteira or 1
+                for c in cortes or []:
+                    c['x0'], c['x1'] = margin + c['x0'] / escala_cortes, margin + c['x1'] / escala_cortes
+                    c['y0'], c['y1'] = (chapa_altura - margin) - c['y0'] / escala_cortes, (chapa_altura - margin) - c['y1'] / escala_cortes
 
-            melhor_resultado_final = {
-                "planos_unicos": planos_unicos,
-                "total_chapas": total_chapas,
-                "aproveitamento_geral": f"{melhor_solucao_iteracao['aproveitamento']:.2f}%",
-                "color_map": {},
-                "area_total_chapas": melhor_solucao_iteracao['area_total_chapas'],
-                "area_utilizada_real": melhor_solucao_iteracao['area_real_pecas'],
-                "total_area_sobra_aproveitavel": total_area_sobra_aproveitavel,
-                "total_area_sobra_sucata": total_area_sobra_sucata,
-                "sucata_detalhada": sucata_detalhada
+            planos_agrupados[assinatura] = {
+                "plano": plano_de_corte, "repeticoes": 1, "resumo_pecas": resumo_pecas, "sobras": sobras_na_area_nesting,
+                "chapa_largura": chapa_largura, "chapa_altura": chapa_altura, "margin": margin, "cortes": cortes,
+                "sobra_id": bid[3] if len(bid) > 3 else None,
+                "corte_comum": {"blocos": blocos, "comprimento_economizado": comprimento_comum} if blocos else None
             }
+            # Peças de forma real encaixadas têm os bounding boxes sobrepostos: conta a área da peça
+            # mais a faixa de offset em volta do contorno, em vez do bounding box. Os círculos do
+            # reticulado hexagonal também se sobrepõem nas caixas: vale a união delas (a área do reticulado).
+            com_contorno = np.fromiter((r.contorno is not None for r in chapa_alocada), dtype=bool, count=len(chapa_alocada))
+            caixas = coords[~com_contorno]
+            caixas_sem_offset = np.column_stack((caixas[:, :2] + offset / 2, np.maximum(caixas[:, 2:] - offset, 0)))
+            acumulado['areas_planos'][assinatura] = (
+                _area_uniao(nesting_width, nesting_height, caixas)
+                + sum(_area_com_offset_contorno(r.contorno, offset) for r in chapa_alocada if r.contorno is not None),
+                _area_uniao(nesting_width, nesting_height, caixas_sem_offset)
+            )
+        else:
+            planos_agrupados[assinatura]["repeticoes"] += 1
 
-            peso_total_chapas = _calc_peso(melhor_resultado_final['area_total_chapas'])
-            peso_sobras_aproveitaveis = _calc_peso(melhor_resultado_final['total_area_sobra_aproveitavel'])
-            peso_sobras_sucata = _calc_peso(melhor_resultado_final['total_area_sobra_sucata'])
-            peso_offset = sucata_detalhada.get('peso_offset', 0)
-            peso_demais_sucatas = sucata_detalhada.get('peso_demais_sucatas', 0)
-            peso_perda_total_sucata = peso_sobras_sucata + peso_offset + peso_demais_sucatas
-            percentual_sobras_aproveitaveis = (peso_sobras_aproveitaveis / peso_total_chapas) * 100 if peso_total_chapas > 0 else 0
-            percentual_perda_total_sucata = (peso_perda_total_sucata / peso_total_chapas) * 100 if peso_total_chapas > 0 else 0
-
-            melhor_resultado_final['peso_perda_total_sucata'] = peso_perda_total_sucata
-            melhor_resultado_final['percentual_sobras_aproveitaveis'] = percentual_sobras_aproveitaveis
-            melhor_resultado_final['percentual_perda_total_sucata'] = percentual_perda_total_sucata
-            
-            break # Encontramos a melhor solução, podemos sair do loop principal.
+        area_com_offset, area_caixas = acumulado['areas_planos'][assinatura]
+        acumulado['area_total_utilizada_com_offset'] += area_com_offset
+        acumulado['area_caixas_sem_offset'] += area_caixas
+        return planos_agrupados[assinatura]
+
+    def _fechar_materializacao(solucao, acumulado):
+        """Calcula as áreas e o aproveitamento de uma solução a partir dos planos acumulados."""
+        planos_agrupados = acumulado['planos_agrupados']
+        area_total_utilizada_com_offset = acumulado['area_total_utilizada_com_offset']
+
+        # Calcula o aproveitamento para esta solução específica (para este algoritmo).
+        area_total_chapas = sum(p['chapa_largura'] * p['chapa_altura'] * p['repeticoes'] for p in planos_agrupados.values())
+
+        # Áreas somadas na tabela de tipos, plano único a plano único.
+        area_real_pecas = 0
+        # --- INÍCIO: LÓGICA ESPECIAL PARA CÍRCULOS ---
+        is_only_circles = all(r['forma'] == 'circle' for plano in planos_agrupados.values() for r in plano['plano'])
+
+        for plano in planos_agrupados.values():
+            # As peças de um bloco de linha comum dividem o rid do bloco: cada rid conta uma vez.
+            rids = list(dict.fromkeys(r['rid'] for r in plano['plano']))
+            area_real_pecas += tabela_pecas.area_real(rids) * plano['repeticoes']
+        # Área dos bounding boxes para a lógica de sucata (união das caixas, como a área utilizada)
+        area_bounding_box_pecas = acumulado['area_caixas_sem_offset']
+
+        # Define qual área de peça usar para o cálculo da sucata
+        area_pecas_para_sucata = area_bounding_box_pecas if is_only_circles else area_real_pecas
+        # --- FIM: LÓGICA ESPECIAL PARA CÍRCULOS ---
+
+        aproveitamento_geral = (area_real_pecas / area_total_chapas) * 100 if area_total_chapas > 0 else 0
+
+        return dict(solucao,
+            aproveitamento=aproveitamento_geral,
+            planos_agrupados=planos_agrupados,
+            area_total_chapas=area_total_chapas,
+            area_real_pecas=area_real_pecas,
+            area_pecas_para_sucata=area_pecas_para_sucata,
+            area_total_utilizada_com_offset=area_total_utilizada_com_offset
+        )
+
+    def _materializar_solucao(solucao):
+        """
+        Agrupa os planos da solução escolhida (junto com as chapas fixas do reticulado de
+        círculos, dos padrões repetidos ou do plano anterior), encontra as sobras e calcula as áreas.
+        """
+        acumulado = {'planos_agrupados': {}, 'areas_planos': {}, 'area_total_utilizada_com_offset': 0, 'area_caixas_sem_offset': 0}
+        for bid, chapa_alocada in chapas_fixas + list(solucao['chapas']):
+            _materializar_chapa(acumulado, bid, chapa_alocada)
+        return _fechar_materializacao(solucao, acumulado)
+
+    def _montar_resultado(solucao, parcial=False):
+        """
+        Materializa uma solução pontuada e monta o dicionário de resultado completo
+        (planos, sobras, pesos e estatísticas). Usada para a vencedora e, no modo com
+        prazo, para cada solução parcial que melhora a anterior.
+        """
+        # Só a solução escolhida é materializada (planos agrupados, sobras, áreas e pesos).
+        # O modo em fluxo já entrega a solução materializada chapa a chapa.
+        if 'planos_agrupados' not in solucao:
+            solucao = _materializar_solucao(solucao)
+        planos_unicos = list(solucao['planos_agrupados'].values())
+        total_chapas = sum(p['repeticoes'] for p in planos_unicos)
+
+        # CÁLCULO DETALHADO DE SUCATA E PESOS
+        total_area_sobra_aproveitavel, total_area_sobra_sucata = 0, 0
+        sobras_aproveitaveis_detalhado, sucatas_dimensionadas_detalhado = [], []
+        for plano in planos_unicos:
+            for sobra in plano.get('sobras', []):
+                area_sobra = sobra['largura'] * sobra['altura']
+                item = {'largura': sobra['largura'], 'altura': sobra['altura'], 'peso': _calc_peso(area_sobra), 'quantidade': plano['repeticoes']}
+                if sobra['tipo_sobra'] == 'aproveitavel':
+                    total_area_sobra_aproveitavel += area_sobra * plano['repeticoes']
+                    sobras_aproveitaveis_detalhado.append(item)
+                else:
+                    total_area_sobra_sucata += area_sobra * plano['repeticoes']
+                    sucatas_dimensionadas_detalhado.append(item)
+
+        # --- CORREÇÃO: Ajusta o cálculo do offset para o caso especial de círculos ---
+        area_offset_total = solucao['area_total_utilizada_com_offset'] - solucao['area_pecas_para_sucata']
+        area_demais_sucatas = solucao['area_total_chapas'] - solucao['area_real_pecas'] - total_area_sobra_aproveitavel - total_area_sobra_sucata - area_offset_total
+        # --- OTIMIZAÇÃO: Garante que a área de perda de processo nunca seja negativa ---
+        area_demais_sucatas = max(0, area_demais_sucatas)
+        # --- FIM DA OTIMIZAÇÃO ---
+
+        sucata_detalhada = {
+            "peso_offset": _calc_peso(area_offset_total),
+            "sobras_aproveitaveis": sobras_aproveitaveis_detalhado,
+            "sucatas_dimensionadas": sucatas_dimensionadas_detalhado,
+            "peso_demais_sucatas": _calc_peso(area_demais_sucatas)
+        }
+
+        resultado = {
+            "planos_unicos": planos_unicos,
+            "total_chapas": total_chapas,
+            "aproveitamento_geral": f"{solucao['aproveitamento']:.2f}%",
+            "color_map": {},
+            "area_total_chapas": solucao['area_total_chapas'],
+            "area_utilizada_real": solucao['area_real_pecas'],
+            "total_area_sobra_aproveitavel": total_area_sobra_aproveitavel,
+            "total_area_sobra_sucata": total_area_sobra_sucata,
+            "sucata_detalhada": sucata_detalhada,
+            "estatisticas_busca": {
+                # Chapas fixas dos atalhos mais o limite do resíduo que foi para a busca.
+                "limite_inferior": len(chapas_fixas) + limite_inferior,
+                "chapas_fixas": len(chapas_fixas),
+                "packs_executados": contador_packs,
+                "algoritmo_vencedor": solucao['algoritmo'],
+                "tempos": dict(tempos),
+                "interrompida_por_tempo": busca_interrompida,
+                "melhoria": dict(melhoria),
+                "parcial": parcial,
+                "incremental": estatisticas_incremental,
+                "escala_inteira": escala_inteira,
+                "modo_fluxo": modo_fluxo,
+                **opcoes_busca
+            },
+            "pecas_inviaveis": viabilidade['inviaveis']
+        }
+
+        peso_total_chapas = _calc_peso(resultado['area_total_chapas'])
+        peso_sobras_aproveitaveis = _calc_peso(resultado['total_area_sobra_aproveitavel'])
+        peso_sobras_sucata = _calc_peso(resultado['total_area_sobra_sucata'])
+        peso_offset = sucata_detalhada.get('peso_offset', 0)
+        peso_demais_sucatas = sucata_detalhada.get('peso_demais_sucatas', 0)
+        peso_perda_total_sucata = peso_sobras_sucata + peso_offset + peso_demais_sucatas
+        percentual_sobras_aproveitaveis = (peso_sobras_aproveitaveis / peso_total_chapas) * 100 if peso_total_chapas > 0 else 0
+        percentual_perda_total_sucata = (peso_perda_total_sucata / peso_total_chapas) * 100 if peso_total_chapas > 0 else 0
+
+        resultado['peso_perda_total_sucata'] = peso_perda_total_sucata
+        resultado['percentual_sobras_aproveitaveis'] = percentual_sobras_aproveitaveis
+        resultado['percentual_perda_total_sucata'] = percentual_perda_total_sucata
+        return resultado
+
+    solucoes_validas = []
+    algoritmos_testados = {} # num_bins -> algoritmos já executados com essa quantidade de chapas
+    melhor_parcial = None
+
+    def _tempo_esgotado():
+        """
+        True quando o prazo do modo com tempo limite passou e já existe uma solução para
+        entregar (sem nenhuma solução a busca continua até achar a primeira).
+        """
+        nonlocal busca_interrompida
+        if prazo is not None and solucoes_validas and time.perf_counter() >= prazo:
+            busca_interrompida = True
+        return busca_interrompida
+
+    def _publicar_se_melhor(solucao):
+        """Entrega pelo callback a solução parcial sempre que ela melhora a melhor até agora."""
+        nonlocal melhor_parcial
+        if resultado_parcial_callback is None:
+            return
+        chave = (-solucao['chapas_usadas'], solucao['aproveitamento'])
+        if melhor_parcial is not None and chave <= melhor_parcial:
+            return
+        melhor_parcial = chave
+        resultado_parcial_callback(_montar_resultado(solucao, parcial=True))
+
+    def _testar_contagem(num_bins_to_try, todos=False):
+        """
+        Tenta alocar as peças em 'num_bins_to_try' chapas. Para provar viabilidade basta
+        o primeiro algoritmo que tiver sucesso; com 'todos=True' executa o portfólio completo.
+        Retorna o menor número de chapas efetivamente usadas, ou None se nenhum algoritmo conseguiu.
+        """
+        _verificar_cancelamento(cancelamento)
+        if status_signal_emitter: status_signal_emitter.emit(f"Tentando alocar em {num_bins_to_try} chapa(s)...")
+        logging.info(f"--- TENTATIVA COM {num_bins_to_try} CHAPAS ---")
+        testados = algoritmos_testados.setdefault(num_bins_to_try, set())
+        chapas_usadas = [s['chapas_usadas'] for s in solucoes_validas if s['chapas_usadas'] <= num_bins_to_try]
+        if chapas_usadas and not todos:
+            return min(chapas_usadas)
+
+        pendentes = [algo for algo in todos_algoritmos if algo not in testados]
+
+        def _registrar_solucao(algo, chapas):
+            _verificar_cancelamento(cancelamento)
+            logging.info(f"SUCESSO! Algoritmo '{algo.__name__}' conseguiu alocar todas as peças em {num_bins_to_try} chapas.")
+            solucao = _avaliar_solucao(chapas, algo.__name__, ordem_fixa.index(algo))
+            solucoes_validas.append(solucao)
+            chapas_usadas.append(solucao['chapas_usadas'])
+            _publicar_se_melhor(solucao)
+            # Para provar viabilidade basta uma solução. No portfólio completo, atingir o limite
+            # inferior já garante o melhor aproveitamento possível para aquela contagem.
+            return not todos or solucao['chapas_usadas'] <= limite_inferior
+
+        if pendentes:
+            _executar_portfolio(pendentes, num_bins_to_try, _registrar_solucao, testados)
+
+        return min(chapas_usadas) if chapas_usadas else None
+
+    melhoria = {'tentativas': 0, 'chapas_removidas': 0}
+    algoritmos_melhoria = ALGORITMOS_MELHORIA_GUILHOTINA if guilhotina else ALGORITMOS_MELHORIA
+
+    def _melhorar_solucao(solucao):
+        """
+        Etapa de melhoria sobre a melhor solução do portfólio: enquanto ela estiver acima do
+        limite inferior, remove a chapa menos ocupada e tenta realocar todas as peças em uma
+        chapa a menos com reinícios aleatórios, distribuídos entre os processos quando o job
+        é grande. Limitada por TENTATIVAS_MELHORIA, por um tempo que cresce com o job (ver
+        '_tempo_melhoria') e pelo prazo da busca; a etapa para antes de tentar quando a remoção
+        não é plausível (ver '_remocao_plausivel').
+        """
+        nonlocal contador_packs
+        fim_melhoria = time.perf_counter() + _tempo_melhoria(num_pecas)
+        if prazo is not None:
+            fim_melhoria = min(fim_melhoria, prazo)
+
+        while solucao['chapas_usadas'] > limite_inferior and melhoria['tentativas'] < TENTATIVAS_MELHORIA:
+            duracao = fim_melhoria - time.perf_counter()
+            if duracao <= 0:
+                break
+            _verificar_cancelamento(cancelamento)
+            alvo = solucao['chapas_usadas'] - 1
+            chapa_menos_ocupada = min(solucao['chapas'], key=lambda c: sum(r.width * r.height for r in c[1]))
+            if not _remocao_plausivel(solucao['chapas'], chapa_menos_ocupada):
+                logging.info(f"Etapa de melhoria: as peças da chapa menos ocupada não cabem na área livre das outras; {alvo} chapa(s) não será tentado.")
+                break
+            if status_signal_emitter: status_signal_emitter.emit(f"Melhorando o plano: tentando {alvo} chapa(s)...")
+            prioritarios = {r.rid for r in chapa_menos_ocupada[1]}
+            bins_ativos = [tuple(b) for b in bins[:alvo]]
+            tentativas_restantes = TENTATIVAS_MELHORIA - melhoria['tentativas']
+
+            chapas, tentativas = None, 0
+            pool = _obter_pool() if num_pecas >= LIMIAR_PECAS_PARALELO else None
+            if pool is None:
+                chapas, tentativas = _tentativas_de_melhoria(retangulos_para_alocar, bins_ativos, prioritarios, alvo, tentativas_restantes, duracao, cancelamento,
+                                                             algoritmos_melhoria)
+            else:
+                # Cada processo recebe uma semente própria; a primeira que fechar cancela as outras.
+                num_tarefas = os.cpu_count() or 1
+                fila_resultados = queue.Queue()
+                lote = _novo_lote()
+                for i in range(num_tarefas):
+                    pool.apply_async(_tentativas_de_melhoria,
+                                     (retangulos_para_alocar, bins_ativos, prioritarios, alvo * 1000 + i, max(1, tentativas_restantes // num_tarefas), duracao,
+                                      lote, algoritmos_melhoria),
+                                     callback=fila_resultados.put, error_callback=fila_resultados.put)
+                restantes = num_tarefas
+                while restantes:
+                    item = _aguardar_resultado(fila_resultados, cancelamento)
+                    restantes -= 1
+                    if isinstance(item, BaseException):
+                        raise item
+                    chapas_tarefa, tentativas_tarefa = item
+                    tentativas += tentativas_tarefa
+                    if chapas_tarefa is not None:
+                        chapas = chapas_tarefa
+                        break
+                if restantes:
+                    _cancelar_tarefas_pendentes()
+
+            contador_packs += tentativas
+            melhoria['tentativas'] += tentativas
+            if chapas is None:
+                logging.info(f"Etapa de melhoria: nenhuma das {tentativas} tentativa(s) fechou em {alvo} chapa(s).")
+                break
+            logging.info(f"Etapa de melhoria: solução com {len(chapas)} chapa(s) após {tentativas} tentativa(s).")
+            melhoria['chapas_removidas'] += solucao['chapas_usadas'] - len(chapas)
+            solucao = _avaliar_solucao(chapas, f"{solucao['algoritmo'].split('+')[0]}+Melhoria", solucao['ordem_algoritmo'])
+            _publicar_se_melhor(solucao)
+        return solucao
+
+    if modo_fluxo:
+        # Sem a lista de retângulos, vale só o limite de área, sobre as chapas na ordem em que o
+        # empacotador as abre (a última se repete depois do fim da lista).
+        area_pecas = sum(t['largura_com_offset'] * t['altura_com_offset'] * q for t, q in zip(tipos_peca, quantidades))
+        limite_inferior, area_acumulada, area_util = 0, 0.0, 0.0
+        for b in bins:
+            if area_acumulada >= area_pecas:
+                break
+            area_util = max(0, b[0] - (2 * b[2])) * max(0, b[1] - (2 * b[2])) * fator_area
+            area_acumulada += area_util
+            limite_inferior += 1
+        if area_acumulada < area_pecas and area_util > 0:
+            limite_inferior += math.ceil((area_pecas - area_acumulada) / area_util)
+    else:
+        limite_inferior = _limite_inferior_chapas(retangulos_para_alocar, bins) if retangulos_para_alocar else 0
+    max_bins = len(bins)
+    logging.info(f"Limite inferior calculado: {limite_inferior} chapa(s) (máximo disponível: {max_bins}).")
+
+    def _executar_em_fluxo():
+        """
+        Modo em fluxo: as peças saem do gerador em ordem decrescente de área e cada chapa
+        fechada pelo empacotador é materializada na hora, sem guardar as peças alocadas.
+        O plano até ali vai para 'resultado_parcial_callback' no máximo a cada
+        INTERVALO_PARCIAIS_FLUXO segundos e depois de as chapas crescerem por FATOR_PARCIAIS_FLUXO.
+        Só os planos únicos ficam guardados (o resultado lista todos eles): a memória cresce com
+        os layouts distintos, não com as peças nem com as repetições.
+        """
+        nonlocal contador_packs
+        acumulado = {'planos_agrupados': {}, 'areas_planos': {}, 'area_total_utilizada_com_offset': 0, 'area_caixas_sem_offset': 0}
+        solucao = {'algoritmo': 'FluxoJanela', 'ordem_algoritmo': 0, 'chapas_usadas': 0, 'aproveitamento': 0, 'chapas': []}
+        retangulos = _gerar_retangulos(tipos_peca, quantidades, por_area=True, escala=escala_inteira)
+        ultima_entrega, chapas_na_entrega = time.perf_counter(), 0
+        contador_packs += 1
+        for bid, chapa_alocada in _empacotar_em_fluxo(retangulos, bins, algo=GuillotineBssfSas if guilhotina else MaxRectsBssf):
+            _verificar_cancelamento(cancelamento)
+            _materializar_chapa(acumulado, bid, chapa_alocada)
+            solucao['chapas_usadas'] += 1
+            if status_signal_emitter and solucao['chapas_usadas'] % 10 == 0:
+                status_signal_emitter.emit(f"Modo em fluxo: {solucao['chapas_usadas']} chapa(s) concluída(s)...")
+            if (resultado_parcial_callback is not None and solucao['chapas_usadas'] >= chapas_na_entrega * FATOR_PARCIAIS_FLUXO
+                    and time.perf_counter() - ultima_entrega >= INTERVALO_PARCIAIS_FLUXO):
+                # Cópia rasa dos planos: as repetições continuam sendo contadas depois da entrega.
+                copia = dict(acumulado, planos_agrupados={k: dict(v) for k, v in acumulado['planos_agrupados'].items()})
+                resultado_parcial_callback(_montar_resultado(_fechar_materializacao(solucao, copia), parcial=True))
+                ultima_entrega, chapas_na_entrega = time.perf_counter(), solucao['chapas_usadas']
+        return _fechar_materializacao(solucao, acumulado)
+
+    melhor_solucao_iteracao = None
+    vencedores_historico, comparados_historico = None, set()
+    if modo_fluxo:
+        logging.info(f"Modo em fluxo para {len(tabela_pecas)} peça(s), janela de {JANELA_CHAPAS_ABERTAS} chapa(s) abertas.")
+        melhor_solucao_iteracao = _executar_em_fluxo()
+    elif chapas_fixas and not retangulos_para_alocar:
+        melhor_solucao_iteracao = _avaliar_solucao([], origem_chapas_fixas)
+
+    # --- INÍCIO: ATALHO ANALÍTICO PARA JOBS DE UM ÚNICO RETÂNGULO ---
+    packs_grade = Counter()
+    chapas_grade = _solucao_grade_homogenea(pecas_processadas, retangulos_para_alocar, bins, algoritmos_padrao, cancelamento, packs_grade)
+    contador_packs += packs_grade['packs']
+    if guilhotina and chapas_grade is not None and not all(_guilhotinavel(bid, chapa) for bid, chapa in chapas_grade):
+        chapas_grade = None
+    if chapas_grade is not None and melhor_solucao_iteracao is None:
+        logging.info(f"Job homogêneo: padrão em grade calculado analiticamente para {len(chapas_grade)} chapa(s).")
+        melhor_solucao_iteracao = _avaliar_solucao(chapas_grade, 'GradeAnalitica')
+    # --- FIM: ATALHO ANALÍTICO ---
+
+    if melhor_solucao_iteracao is None:
+        # Fase 1 (galope): parte do limite inferior e dobra o passo até encontrar uma contagem viável.
+        menor_viavel = None
+        maior_inviavel = limite_inferior - 1
+        num_bins_to_try, passo = limite_inferior, 1
+        while num_bins_to_try <= max_bins:
+            chapas_usadas = _testar_contagem(num_bins_to_try)
+            if chapas_usadas is not None:
+                menor_viavel = chapas_usadas
+                break
+            maior_inviavel = num_bins_to_try
+            if num_bins_to_try == max_bins:
+                break
+            num_bins_to_try = min(num_bins_to_try + passo, max_bins)
+            passo *= 2
+
+        if menor_viavel is not None:
+            # Fase 2 (bisseção): refina entre a maior contagem inviável e a menor viável conhecida.
+            inicio, fim = maior_inviavel + 1, menor_viavel
+            while inicio < fim and not _tempo_esgotado():
+                meio = (inicio + fim) // 2
+                chapas_usadas = _testar_contagem(meio)
+                if chapas_usadas is not None:
+                    fim = chapas_usadas
+                else:
+                    inicio = meio + 1
+
+            # Fase 3: executa o portfólio completo na contagem mínima para escolher o melhor aproveitamento
+            # (com chapas iguais ele empata e decide a maior sobra).
+            if not _tempo_esgotado():
+                _testar_contagem(fim, todos=True)
+            else:
+                logging.info("Tempo limite atingido: entregando a melhor solução encontrada até agora.")
+            menor_contagem = min(s['chapas_usadas'] for s in solucoes_validas)
+            solucoes_na_contagem_minima = [s for s in solucoes_validas if s['chapas_usadas'] == menor_contagem]
+
+            logging.info(f"Encontrado o número mínimo de chapas: {menor_contagem}. Selecionando a melhor solução.")
+            melhor_aproveitamento = max(s['aproveitamento'] for s in solucoes_na_contagem_minima)
+            empatadas = [s for s in solucoes_na_contagem_minima if s['aproveitamento'] >= melhor_aproveitamento - 1e-9]
+            # Empate no aproveitamento vale a maior sobra e depois a ordem original do portfólio,
+            # independente de qual processo terminou antes.
+            melhor_solucao_iteracao = max(empatadas, key=lambda x: (_maior_sobra(x) if len(empatadas) > 1 else 0.0, -x['ordem_algoritmo']))
+            # Histórico: todos os empatados no aproveitamento vencem, e só contam como execução os
+            # algoritmos que rodaram com chapas suficientes para chegar à contagem mínima.
+            vencedores_historico = {s['algoritmo'] for s in empatadas}
+            comparados_historico = {algo.__name__ for n, algos in algoritmos_testados.items() if n >= menor_contagem for algo in algos}
+
+            # Etapa de melhoria: só vale a pena quando o portfólio ficou acima do limite inferior.
+            # No re-nesting incremental ela fica de fora: o objetivo ali é responder rápido.
+            if melhor_solucao_iteracao['chapas_usadas'] > limite_inferior and not _tempo_esgotado() and estatisticas_incremental is None:
+                melhor_solucao_iteracao = _melhorar_solucao(melhor_solucao_iteracao)
+                if melhor_solucao_iteracao['chapas_usadas'] < menor_contagem:
+                    # Só a etapa de melhoria, partindo do vencedor, chegou a menos chapas.
+                    vencedores_historico = {melhor_solucao_iteracao['algoritmo'].split('+')[0]}
+
+    if melhor_solucao_iteracao is not None:
+        tempos['busca'] = time.perf_counter() - inicio_busca
+        melhor_resultado_final = _montar_resultado(melhor_solucao_iteracao)
+        tempos['materializacao'] = time.perf_counter() - inicio_busca - tempos['busca']
+        melhor_resultado_final['estatisticas_busca']['tempos'] = dict(tempos)
+        logging.info(f"Tempos: busca {tempos['busca']:.3f}s (avaliação das candidatas {tempos['avaliacao']:.3f}s), "
+                     f"materialização da vencedora {tempos['materializacao']:.3f}s.")
+        if impressao_job is not None and vencedores_historico:
+            tempos_comparados = {nome: t for nome, t in tempos_algoritmos.items() if nome in comparados_historico}
+            try:
+                historico_algoritmos.registrar(impressao_job, tempos_comparados, vencedores_historico)
+            except OSError as e:
+                logging.warning(f"Não foi possível gravar o histórico de algoritmos: {e}")
+    # --- FIM: BUSCA GUIADA POR LIMITE INFERIOR ---
+
+    logging.info(f"Busca executou {contador_packs} pack(s) a partir do limite inferior de {len(chapas_fixas) + limite_inferior} chapa(s) "
+                 f"({len(chapas_fixas)} fixa(s) dos atalhos).")
+    if status_signal_emitter: status_signal_emitter.emit(f"Busca concluída com {contador_packs} pack(s) executado(s).")
+
+    # A linha comum economiza corte e não pode custar chapas: se o plano com blocos ficou acima
+    # do limite inferior do job sem eles, o job é conferido também sem os blocos e o plano com
+    # blocos só fica se usar no máximo as mesmas chapas. A conferência só recebe chapas para
+    # contagens abaixo da do plano com blocos e o que sobrou do prazo: ela não refaz a busca
+    # inteira, só procura uma contagem menor.
+    tempo_restante = tempo_limite - (time.perf_counter() - inicio_busca) if tempo_limite else None
+    if (limite_sem_blocos is not None and (tempo_restante is None or tempo_restante > 0)
+            and (melhor_resultado_final is None or melhor_resultado_final['total_chapas'] > limite_sem_blocos)):
+        if status_signal_emitter: status_signal_emitter.emit("Conferindo o plano sem linha comum...")
+        bins_sem_blocos = bins_em_mm if melhor_resultado_final is None else bins_em_mm[:melhor_resultado_final['total_chapas'] - 1]
+        try:
+            resultado_sem_blocos = calcular_plano_de_corte_em_bins(
+                pecas, offset, espessura, bins_sem_blocos, peso_especifico_base, aninhar_viaveis=aninhar_viaveis, tempo_limite=tempo_restante,
+                cancelamento=cancelamento, resultado_anterior=resultado_anterior, historico_algoritmos=historico_algoritmos,
+                escala_inteira=escala_inteira, modo_fluxo=modo_fluxo, forma_real=forma_real, guilhotina=guilhotina, corte_comum=False)
+        except PecasInviaveisError:
+            # Alguma peça só cabia nas chapas que ficaram de fora da conferência.
+            resultado_sem_blocos = None
+        if resultado_sem_blocos is not None and (melhor_resultado_final is None
+                                                  or resultado_sem_blocos['total_chapas'] < melhor_resultado_final['total_chapas']):
+            logging.info(f"Linha comum descartada: {resultado_sem_blocos['total_chapas']} chapa(s) sem os blocos contra "
+                         f"{melhor_resultado_final['total_chapas'] if melhor_resultado_final else '-'} com eles.")
+            melhor_resultado_final = resultado_sem_blocos
+            melhor_resultado_final['estatisticas_busca']['corte_comum_descartado'] = True
 
     if melhor_resultado_final:
         logging.info(f"Cálculo finalizado. Melhor resultado: {melhor_resultado_final['total_chapas']} chapas, {melhor_resultado_final['aproveitamento_geral']} de aproveitamento.")
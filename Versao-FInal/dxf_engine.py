@@ -5,6 +5,7 @@ import math
 import io
 import ezdxf
 from ezdxf import bbox
+from ezdxf import path as ezdxf_path
 
 # --- FUNÇÕES DE CRIAÇÃO DE DXF ---
 def create_dxf_drawing(params: dict):
@@ -114,4 +115,67 @@ def get_dxf_bounding_box(file_path: str):
         return overall_bbox.size.x, overall_bbox.size.y
     except (IOError, ezdxf.DXFStructureError) as e:
         print(f"Erro ao ler ou processar o DXF '{file_path}': {e}")
-        return None, None
\ No newline at end of file
+        return None, None
+
+def _area_poligono(pontos):
+    """Área com sinal (fórmula do laço); positiva no sentido anti-horário."""
+    return 0.5 * sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(pontos, pontos[1:] + pontos[:1]))
+
+def _encadear_trechos(trechos, tolerancia):
+    """Une trechos abertos (listas de pontos) pelas pontas em laços fechados."""
+    lacos, pendentes = [], [list(t) for t in trechos]
+    while pendentes:
+        laco = pendentes.pop()
+        emendou = True
+        while emendou and math.dist(laco[0], laco[-1]) > tolerancia:
+            emendou = False
+            for i, trecho in enumerate(pendentes):
+                if math.dist(laco[-1], trecho[0]) <= tolerancia:
+                    laco += trecho[1:]
+                elif math.dist(laco[-1], trecho[-1]) <= tolerancia:
+                    laco += trecho[-2::-1]
+                else:
+                    continue
+                del pendentes[i]
+                emendou = True
+                break
+        if math.dist(laco[0], laco[-1]) <= tolerancia and len(laco) > 3:
+            lacos.append(laco[:-1])
+    return lacos
+
+def get_dxf_outer_contour(file_path: str, distancia_maxima=0.5, tolerancia=0.01):
+    """
+    Lê um arquivo DXF e extrai o contorno externo da peça como polígono.
+    Linhas, arcos, círculos, polilinhas e splines do modelspace são discretizados (a corda
+    se afasta no máximo 'distancia_maxima' mm da curva) e encadeados pelas pontas; o laço
+    fechado de maior área é o contorno externo (os furos ficam de fora).
+
+    :param file_path: Caminho para o arquivo DXF.
+    :return: Lista de pontos (x, y) no sentido anti-horário, ou None se não houver laço fechado.
+    """
+    try:
+        doc = ezdxf.readfile(file_path)
+    except (IOError, ezdxf.DXFStructureError) as e:
+        print(f"Erro ao ler ou processar o DXF '{file_path}': {e}")
+        return None
+
+    fechados, abertos = [], []
+    for entidade in doc.modelspace():
+        try:
+            trajeto = ezdxf_path.make_path(entidade)
+        except TypeError:
+            continue # Textos, cotas e outras entidades sem geometria de corte
+        pontos = [(v.x, v.y) for v in trajeto.flattening(distancia_maxima)]
+        if len(pontos) < 2:
+            continue
+        if trajeto.is_closed or math.dist(pontos[0], pontos[-1]) <= tolerancia:
+            if len(pontos) > 3:
+                fechados.append(pontos[:-1] if math.dist(pontos[0], pontos[-1]) <= tolerancia else pontos)
+        else:
+            abertos.append(pontos)
+
+    lacos = fechados + _encadear_trechos(abertos, tolerancia)
+    if not lacos:
+        return None
+    contorno = max(lacos, key=lambda laco: abs(_area_poligono(laco)))
+    return contorno if _area_poligono(contorno) > 0 else contorno[::-1]
@@ -2,17 +2,20 @@
 
 from PyQt5.QtWidgets import (QDialog, QHBoxLayout, QVBoxLayout, QGroupBox, 
                              QListWidget, QTableWidget, QTableWidgetItem, 
-                             QPushButton, QMessageBox)
+                             QPushButton, QMessageBox, QAbstractItemView)
 
 # A ÚNICA importação de outro módulo do nosso projeto deve ser esta:
 from history_manager import HistoryManager
 
 class HistoryDialog(QDialog):
-    def __init__(self, history_manager: HistoryManager, parent=None):
+    def __init__(self, history_manager: HistoryManager, parent=None, selecao_multipla=False):
         super().__init__(parent)
         self.setWindowTitle("Histórico de Projetos")
         self.history_manager = history_manager
         self.loaded_project_data = None
+        # Seleção múltipla (aproveitamento em lote): {número do projeto: peças} dos projetos escolhidos.
+        self.selecao_multipla = selecao_multipla
+        self.loaded_projects = {}
         self.setMinimumSize(800, 600)
 
         layout = QHBoxLayout(self)
@@ -21,6 +24,9 @@ class HistoryDialog(QDialog):
         left_panel = QGroupBox("Projetos Salvos")
         left_layout = QVBoxLayout()
         self.project_list_widget = QListWidget()
+        if selecao_multipla:
+            self.setWindowTitle("Aproveitamento em Lote - Selecione os Projetos")
+            self.project_list_widget.setSelectionMode(QAbstractItemView.MultiSelection)
         left_layout.addWidget(self.project_list_widget)
         left_panel.setLayout(left_layout)
 
@@ -35,6 +41,9 @@ class HistoryDialog(QDialog):
         self.delete_btn = QPushButton("Excluir Projeto do Histórico")
         close_btn = QPushButton("Fechar")
         
+        if selecao_multipla:
+            self.load_btn.setText("Calcular Projetos Selecionados em Lote")
+            self.delete_btn.setVisible(False)
         button_layout.addWidget(self.load_btn)
         button_layout.addWidget(self.delete_btn)
         button_layout.addStretch()
@@ -47,6 +56,7 @@ class HistoryDialog(QDialog):
         
         # Conexões
         self.project_list_widget.currentItemChanged.connect(self.display_project_details)
+        self.project_list_widget.itemSelectionChanged.connect(self.update_buttons_state)
         self.load_btn.clicked.connect(self.load_project)
         self.delete_btn.clicked.connect(self.delete_project)
         close_btn.clicked.connect(self.reject)
@@ -90,10 +100,17 @@ class HistoryDialog(QDialog):
 
     def update_buttons_state(self):
         has_selection = self.project_list_widget.currentItem() is not None
+        if self.selecao_multipla:
+            has_selection = bool(self.project_list_widget.selectedItems())
         self.load_btn.setEnabled(has_selection)
         self.delete_btn.setEnabled(has_selection)
 
     def load_project(self):
+        if self.selecao_multipla:
+            self.loaded_projects = {item.text(): self.history_manager.get_project_data(item.text())
+                                    for item in self.project_list_widget.selectedItems()}
+            self.accept()
+            return
         if self.project_list_widget.currentItem():
             project_number = self.project_list_widget.currentItem().text()
             self.loaded_project_data = self.history_manager.get_project_data(project_number)
@@ -5,6 +5,7 @@ from openpyxl import load_workbook
 import sys
 import os
 import json
+import multiprocessing
 import pandas as pd
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QLabel, QTextEdit, 
@@ -21,7 +22,7 @@ from history_dialog import HistoryDialog
 from processing import ProcessThread
 from nesting_dialog import NestingDialog
 from dxf_engine import get_dxf_bounding_box # <<< IMPORTAÇÃO NECESSÁRIA >>>
-from calculo_cortes import orquestrar_planos_de_corte
+from calculo_cortes import orquestrar_planos_de_corte, PecasInviaveisError
 
 # =============================================================================
 # ESTILO VISUAL DA APLICAÇÃO (QSS - Qt StyleSheet)
@@ -180,6 +181,7 @@ class MainWindow(QMainWindow):
         self.excel_df = pd.DataFrame(columns=self.colunas_df)
         self.furos_atuais = []
         self.project_directory = None
+        self.resultados_nesting = {} # Último resultado de nesting por espessura (re-nesting incremental)
 
         self.initUI() # Chama o método que constrói a UI
         self.connect_signals() # Chama o método que conecta os eventos
@@ -206,8 +208,10 @@ class MainWindow(QMainWindow):
         project_layout = QVBoxLayout()
         self.start_project_btn = QPushButton("Iniciar Novo Projeto...")
         self.history_btn = QPushButton("Ver Histórico de Projetos")
+        self.batch_nesting_btn = QPushButton("Aproveitamento em Lote...")
         project_layout.addWidget(self.start_project_btn)
         project_layout.addWidget(self.history_btn)
+        project_layout.addWidget(self.batch_nesting_btn)
         project_group.setLayout(project_layout)
         left_v_layout.addWidget(project_group)
         
@@ -368,6 +372,7 @@ class MainWindow(QMainWindow):
         self.calculate_nesting_btn.clicked.connect(self.open_nesting_dialog)
         self.start_project_btn.clicked.connect(self.start_new_project)
         self.history_btn.clicked.connect(self.show_history_dialog)
+        self.batch_nesting_btn.clicked.connect(self.open_batch_nesting_dialog)
         self.select_file_btn.clicked.connect(self.select_file)
         self.import_dxf_btn.clicked.connect(self.import_dxfs) # <<< CONEXÃO DO SINAL >>>
         self.clear_excel_btn.clicked.connect(self.clear_excel_data)
@@ -429,6 +434,7 @@ class MainWindow(QMainWindow):
         self.calculate_nesting_btn.setEnabled(is_project_active and has_items)
         self.start_project_btn.setEnabled(True)
         self.history_btn.setEnabled(True)
+        self.batch_nesting_btn.setEnabled(True)
         self.select_file_btn.setEnabled(is_project_active)
         self.import_dxf_btn.setEnabled(is_project_active) # <<< ATUALIZAÇÃO DE ESTADO >>>
         self.clear_excel_btn.setEnabled(is_project_active and not self.excel_df.empty)
@@ -530,8 +536,47 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "Nenhuma Peça Válida", "O cálculo de aproveitamento só pode ser feito com peças da forma 'rectangle', 'circle', 'right_triangle', 'trapezoid' ou 'dxf_shape'.")
             return
         # Passa o DataFrame com as formas válidas para o diálogo
-        dialog = NestingDialog(valid_df, self)
+        dialog = NestingDialog(valid_df, self, resultados_anteriores=self.resultados_nesting)
         dialog.exec_()
+        # Guarda os planos para que, depois de editar uma peça, só as chapas afetadas sejam refeitas.
+        self.resultados_nesting = dialog.resultados_anteriores
+
+    def open_batch_nesting_dialog(self):
+        """
+        Aproveitamento em lote: junta as peças de vários projetos do histórico (e a lista aberta,
+        com o número do projeto ativo) e calcula tudo junto, espessura por espessura. Cada peça
+        mantém o seu 'project_number' e o resultado sai rateado por projeto.
+        """
+        dialog = HistoryDialog(self.history_manager, self, selecao_multipla=True)
+        if dialog.exec_() != QDialog.Accepted or not dialog.loaded_projects:
+            return
+
+        dfs_to_concat = []
+        for project_number, pieces in dialog.loaded_projects.items():
+            df = pd.DataFrame(pieces)
+            if not df.empty:
+                df['project_number'] = project_number
+                dfs_to_concat.append(df)
+        projeto_ativo = self.projeto_input.text().strip()
+        lista_aberta = [df for df in [self.excel_df, self.manual_df] if not df.empty]
+        if lista_aberta and projeto_ativo and projeto_ativo not in dialog.loaded_projects:
+            df = pd.concat(lista_aberta, ignore_index=True)
+            df['project_number'] = projeto_ativo
+            dfs_to_concat.append(df)
+
+        num_projetos = len(dfs_to_concat)
+        if num_projetos < 2:
+            QMessageBox.information(self, "Aproveitamento em Lote", "Selecione ao menos dois projetos com peças (o projeto aberto também conta).")
+            return
+        combined_df = pd.concat(dfs_to_concat, ignore_index=True)
+        valid_df = combined_df[combined_df['forma'].isin(['rectangle', 'circle', 'right_triangle', 'trapezoid', 'dxf_shape'])].copy()
+        if valid_df.empty:
+            QMessageBox.information(self, "Nenhuma Peça Válida", "Os projetos selecionados não têm peças válidas para o cálculo de aproveitamento.")
+            return
+        self.log_text.append(f"Aproveitamento em lote com {num_projetos} projetos: {', '.join(sorted(valid_df['project_number'].unique()))}.")
+        nesting_dialog = NestingDialog(valid_df, self)
+        nesting_dialog.setWindowTitle(f"Aproveitamento em Lote ({num_projetos} projetos)")
+        nesting_dialog.exec_()
 
     def export_project_to_excel(self):
         chapa_largura_str, ok1 = QInputDialog.getText(self, "Parâmetro de Aproveitamento", "Largura da Chapa (mm):", text="3000")
@@ -634,15 +679,15 @@ class MainWindow(QMainWindow):
                     # Adiciona peças à lista de cálculo, já com offset
                     # (A lógica para diferentes formas permanece a mesma)
                     if row['forma'] == 'rectangle' and row['largura'] > 0 and row['altura'] > 0:
-                        pecas_para_calcular.append({'forma': 'rectangle', 'largura': row['largura'] + current_offset, 'altura': row['altura'] + current_offset, 'quantidade': int(row['qtd'])})
+                        pecas_para_calcular.append({'nome_arquivo': row.get('nome_arquivo'), 'forma': 'rectangle', 'largura': row['largura'] + current_offset, 'altura': row['altura'] + current_offset, 'quantidade': int(row['qtd'])})
                     elif row['forma'] == 'circle' and row['diametro'] > 0:
-                        pecas_para_calcular.append({'forma': 'circle', 'largura': row['diametro'] + current_offset, 'altura': row['diametro'] + current_offset, 'diametro': row['diametro'], 'quantidade': int(row['qtd'])})
+                        pecas_para_calcular.append({'nome_arquivo': row.get('nome_arquivo'), 'forma': 'circle', 'largura': row['diametro'] + current_offset, 'altura': row['diametro'] + current_offset, 'diametro': row['diametro'], 'quantidade': int(row['qtd'])})
                     elif row['forma'] == 'right_triangle' and row['rt_base'] > 0 and row['rt_height'] > 0:
-                        pecas_para_calcular.append({'forma': 'right_triangle', 'largura': row['rt_base'] + current_offset, 'altura': row['rt_height'] + current_offset, 'quantidade': int(row['qtd'])})
+                        pecas_para_calcular.append({'nome_arquivo': row.get('nome_arquivo'), 'forma': 'right_triangle', 'largura': row['rt_base'] + current_offset, 'altura': row['rt_height'] + current_offset, 'quantidade': int(row['qtd'])})
                     elif row['forma'] == 'trapezoid' and row['trapezoid_large_base'] > 0 and row['trapezoid_height'] > 0:
-                        pecas_para_calcular.append({'forma': 'trapezoid', 'largura': row['trapezoid_large_base'] + current_offset, 'altura': row['trapezoid_height'] + current_offset, 'small_base': row['trapezoid_small_base'] + current_offset, 'quantidade': int(row['qtd'])})
+                        pecas_para_calcular.append({'nome_arquivo': row.get('nome_arquivo'), 'forma': 'trapezoid', 'largura': row['trapezoid_large_base'] + current_offset, 'altura': row['trapezoid_height'] + current_offset, 'small_base': row['trapezoid_small_base'] + current_offset, 'quantidade': int(row['qtd'])})
                     elif row['forma'] == 'dxf_shape' and row['largura'] > 0 and row['altura'] > 0:
-                        pecas_para_calcular.append({'forma': 'dxf_shape', 'largura': row['largura'] + current_offset, 'altura': row['altura'] + current_offset, 'dxf_path': row['dxf_path'], 'quantidade': int(row['qtd'])})
+                        pecas_para_calcular.append({'nome_arquivo': row.get('nome_arquivo'), 'forma': 'dxf_shape', 'largura': row['largura'] + current_offset, 'altura': row['altura'] + current_offset, 'dxf_path': row['dxf_path'], 'quantidade': int(row['qtd'])})
 
                 if not pecas_para_calcular: continue
 
@@ -651,7 +696,11 @@ class MainWindow(QMainWindow):
                 # Ela executa o cálculo em duas fases para maximizar o aproveitamento.
                 self.log_text.append(f"Otimizando espessura {espessura}mm (pode levar um momento)...")
                 QApplication.processEvents()
-                resultado = orquestrar_planos_de_corte(chapa_largura, chapa_altura, pecas_para_calcular, current_offset, effective_margin, espessura, status_signal_emitter=None)
+                try:
+                    resultado = orquestrar_planos_de_corte(chapa_largura, chapa_altura, pecas_para_calcular, current_offset, effective_margin, espessura, status_signal_emitter=None)
+                except PecasInviaveisError as e:
+                    self.log_text.append(f"AVISO: Espessura {espessura}mm não calculada. {e}")
+                    continue
                 
                 if not resultado: continue
 
@@ -762,6 +811,7 @@ class MainWindow(QMainWindow):
         if clear_project_number: 
             self.excel_df = pd.DataFrame(columns=self.colunas_df)
             self.manual_df = pd.DataFrame(columns=self.colunas_df)
+            self.resultados_nesting = {}
             self.update_table_display()
 
     def set_buttons_enabled_on_process(self, enabled):
@@ -770,6 +820,7 @@ class MainWindow(QMainWindow):
         self.calculate_nesting_btn.setEnabled(enabled and is_project_active and has_items)
         self.start_project_btn.setEnabled(enabled)
         self.history_btn.setEnabled(enabled)
+        self.batch_nesting_btn.setEnabled(enabled)
         self.select_file_btn.setEnabled(enabled and is_project_active)
         self.import_dxf_btn.setEnabled(enabled and is_project_active) # <<< ATUALIZAÇÃO DE ESTADO >>>
         self.clear_excel_btn.setEnabled(enabled and is_project_active and not self.excel_df.empty)
@@ -1030,5 +1081,7 @@ def main():
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
+    # Necessário para o pool de processos do nesting no executável gerado pelo PyInstaller.
+    multiprocessing.freeze_support()
     main()
     
\ No newline at end of file
@@ -0,0 +1,110 @@
+# nesting_cache.py
+
+import os
+import json
+import hashlib
+
+class NestingCache:
+    """
+    Cache em disco dos resultados de nesting, com descarte LRU.
+    Cada resultado fica em um arquivo JSON próprio dentro de 'cache_dir' (ao lado do
+    project_history.json); a data de modificação do arquivo marca o último acesso.
+    """
+    def __init__(self, cache_dir="nesting_cache", max_entries=200):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    @staticmethod
+    def _normalizar(valor):
+        if hasattr(valor, 'item'): # Tipos numéricos do numpy/pandas
+            valor = valor.item()
+        # 200 e 200.0 são a mesma medida: todo número vira float antes de entrar na chave.
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            return round(float(valor), 3)
+        return valor
+
+    @staticmethod
+    def _versao_dxf(dxf_path):
+        """(caminho, mtime) do DXF: editar o arquivo muda a chave, como em 'carregar_contorno'."""
+        if not dxf_path:
+            return None
+        try:
+            return (dxf_path, os.path.getmtime(dxf_path))
+        except (OSError, TypeError):
+            return (dxf_path, None)
+
+    @classmethod
+    def make_key(cls, chapa_largura, chapa_altura, offset, margin, espessura, pecas, versao_motor, **opcoes):
+        """
+        Gera a chave canônica de um job: a mesma chapa, offset, margem, espessura e o mesmo
+        multiconjunto de peças produzem a mesma chave, independente da ordem da lista. As peças
+        DXF entram com a data de modificação do arquivo.
+        """
+        n = cls._normalizar
+        contagem = {}
+        for p in pecas:
+            furos = sorted((n(f.get('diam')), n(f.get('x')), n(f.get('y'))) for f in (p.get('furos') or []))
+            descritor = (
+                p.get('forma', 'rectangle'), n(p['largura']), n(p['altura']), n(p.get('diametro', 0)),
+                n(p.get('small_base', 0)), cls._versao_dxf(p.get('dxf_path')), p.get('project_number'), tuple(furos),
+                p.get('nome_arquivo')
+            )
+            contagem[descritor] = contagem.get(descritor, 0) + int(p['quantidade'])
+
+        assinatura = {
+            'versao_motor': versao_motor,
+            'chapa': [n(chapa_largura), n(chapa_altura)],
+            'offset': n(offset), 'margin': n(margin), 'espessura': n(espessura),
+            'pecas': sorted([list(d) + [q] for d, q in contagem.items()], key=repr),
+            'opcoes': {k: opcoes[k] for k in sorted(opcoes)}
+        }
+        texto = json.dumps(assinatura, sort_keys=True, default=str)
+        return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                resultado = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        try:
+            os.utime(path, None) # Marca o acesso para a política LRU
+        except OSError:
+            pass
+        return resultado
+
+    def put(self, key, resultado):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._entry_path(key)
+        # Escreve em um arquivo temporário e troca de uma vez, pois vários processos
+        # de cálculo podem gravar no cache ao mesmo tempo.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, default=lambda o: o.item() if hasattr(o, 'item') else str(o))
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        try:
+            entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith('.json')]
+        except FileNotFoundError:
+            return
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda p: os.path.getmtime(p))
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.cache_dir, name))
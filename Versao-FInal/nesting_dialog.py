@@ -4,19 +4,21 @@ import colorsys
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QFormLayout, QLineEdit, 
                              QPushButton, QDialogButtonBox, QMessageBox, 
                              QGroupBox, QLabel, QWidget, QHBoxLayout, QScrollArea,
-                             QFileDialog)
+                             QFileDialog, QCheckBox, QComboBox)
 
 
 import logging
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QPointF
-from PyQt5.QtGui import QPainter, QColor, QPen, QBrush, QPainterPath
+from PyQt5.QtGui import QPainter, QColor, QPen, QBrush, QPainterPath, QPolygonF
 # Importações para gerar PDF
 import ezdxf
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 import pdf_generator
+import toolpath
+from remnant_inventory import RemnantInventory
 # Importe sua função de cálculo
-from calculo_cortes import orquestrar_planos_de_corte, status_signaler
+from calculo_cortes import orquestrar_espessuras_em_paralelo, status_signaler, CancelamentoToken, NestingCancelado, ESCALA_INTEIRA_PADRAO, KERF_PADRAO
 
 # --- INÍCIO: CLASSE DA THREAD DE CÁLCULO ---
 class CalculationThread(QThread):
@@ -49,24 +51,42 @@ class CalculationThread(QThread):
     # --- FIM: NOVA FUNÇÃO PARA OFFSET DINÂMICO ---
     # Sinal que emite o resultado para uma espessura: (espessura, resultado_dict)
     result_ready = pyqtSignal(float, dict)
-    # Sinal emitido quando todos os cálculos terminam
-    finished = pyqtSignal()
+    # O fim de todos os cálculos é o 'finished' da própria QThread, emitido quando 'run' retorna.
     # Sinal para reportar erros: (titulo_erro, mensagem_erro)
     error = pyqtSignal(str, str)
     # Sinal para atualizações de status em tempo real
     status_update = pyqtSignal(str)
 
-    def __init__(self, chapa_largura, chapa_altura, offset, margin, grouped_df, parent=None):
+    def __init__(self, chapa_largura, chapa_altura, offset, margin, grouped_df, aninhar_viaveis=False, tempo_limite=None,
+                 resultados_anteriores=None, escala_inteira=None, modo_fluxo=False, catalogo_chapas=None,
+                 usar_estoque_sobras=False, forma_real=True, guilhotina=False, corte_comum=False, kerf=KERF_PADRAO, parent=None):
         super().__init__(parent)
         self.chapa_largura = chapa_largura
         self.chapa_altura = chapa_altura
         self.offset = offset
         self.grouped_df = grouped_df
         self.margin = margin
+        self.aninhar_viaveis = aninhar_viaveis
+        self.tempo_limite = tempo_limite
+        self.resultados_anteriores = resultados_anteriores or {} # Base do re-nesting incremental
+        self.escala_inteira = escala_inteira
+        self.modo_fluxo = modo_fluxo
+        self.catalogo_chapas = catalogo_chapas # Formatos em estoque; None usa a chapa única
+        self.usar_estoque_sobras = usar_estoque_sobras
+        self.forma_real = forma_real
+        self.guilhotina = guilhotina
+        self.corte_comum = corte_comum
+        self.kerf = kerf
+        self.cancelamento = CancelamentoToken()
+
+    def cancelar(self):
+        """Pede o cancelamento; o cálculo para no próximo ponto de verificação e libera os processos."""
+        self.cancelamento.cancelar()
 
     def run(self):
         try:
             logging.info("Thread de cálculo iniciada.")
+            tarefas = []
             for espessura, group in self.grouped_df:
                 # --- INÍCIO: LÓGICA DE OFFSET E MARGEM DINÂMICOS ---
                 current_offset, current_margin = self._get_dynamic_offset_and_margin(espessura, self.offset, self.margin)
@@ -79,47 +99,59 @@ class CalculationThread(QThread):
                 pecas_para_calcular = []
                 # --- INÍCIO: LÓGICA PARA INCLUIR CÍRCULOS NO CÁLCULO ---
                 for _, row in group.iterrows():
+                    # Cada peça leva o número do seu projeto: no nesting em lote os relatórios são separados por ele.
+                    projeto = row.get('project_number') if isinstance(row.get('project_number'), str) else None
                     if row['forma'] == 'rectangle' and row['largura'] > 0 and row['altura'] > 0:
                         pecas_para_calcular.append({
+                            'nome_arquivo': row.get('nome_arquivo'),
                             'forma': 'rectangle',
                             'largura': row['largura'] + current_offset,
                             'altura': row['altura'] + current_offset,
                             'quantidade': int(row['qtd']),
+                            'project_number': projeto,
                             'furos': row.get('furos', [])
                         })
                     elif row['forma'] == 'circle' and row['diametro'] > 0:
                         pecas_para_calcular.append({
+                            'nome_arquivo': row.get('nome_arquivo'),
                             'forma': 'circle',
                             'largura': row['diametro'] + current_offset, # Bounding box
                             'altura': row['diametro'] + current_offset, # Bounding box
                             'diametro': row['diametro'], # Diâmetro original
                             'quantidade': int(row['qtd']),
+                            'project_number': projeto,
                             'furos': row.get('furos', [])
                         })
                     elif row['forma'] == 'right_triangle' and row['rt_base'] > 0 and row['rt_height'] > 0:
                         pecas_para_calcular.append({
+                            'nome_arquivo': row.get('nome_arquivo'),
                             'forma': 'right_triangle',
                             'largura': row['rt_base'] + current_offset, # Bounding box
                             'altura': row['rt_height'] + current_offset, # Bounding box
                             'quantidade': int(row['qtd']),
+                            'project_number': projeto,
                             'furos': [] # Furos em triângulos não implementado
                         })
                     elif row['forma'] == 'trapezoid' and row['trapezoid_large_base'] > 0 and row['trapezoid_height'] > 0:
                         pecas_para_calcular.append({
+                            'nome_arquivo': row.get('nome_arquivo'),
                             'forma': 'trapezoid',
                             'largura': row['trapezoid_large_base'] + current_offset, # Bounding box
                             'altura': row['trapezoid_height'] + current_offset, # Bounding box
                             'small_base': row['trapezoid_small_base'] + current_offset,
                             'quantidade': int(row['qtd']),
+                            'project_number': projeto,
                             'furos': row.get('furos', [])
                         })
                     elif row['forma'] == 'dxf_shape' and row['largura'] > 0 and row['altura'] > 0:
                         pecas_para_calcular.append({
+                            'nome_arquivo': row.get('nome_arquivo'),
                             'forma': 'dxf_shape',
                             'largura': row['largura'] + current_offset,
                             'altura': row['altura'] + current_offset,
                             'dxf_path': row['dxf_path'],
                             'quantidade': int(row['qtd']),
+                            'project_number': projeto,
                             'furos': row.get('furos', [])
                         })
                 # --- FIM: LÓGICA PARA INCLUIR CÍRCULOS ---
@@ -127,17 +159,48 @@ class CalculationThread(QThread):
                 if not pecas_para_calcular:
                     continue
                 
-                logging.debug(f"Iniciando cálculo para espessura {espessura} com {len(pecas_para_calcular)} tipos de peças.")
-                # Chama a função de cálculo pesada
-                resultado = orquestrar_planos_de_corte(self.chapa_largura, self.chapa_altura, pecas_para_calcular, current_offset, effective_margin, espessura, status_signal_emitter=self.status_update)
-                logging.debug(f"Cálculo para espessura {espessura} concluído. Emitindo resultado.")
-                self.result_ready.emit(espessura, resultado)
+                logging.debug(f"Preparando cálculo para espessura {espessura} com {len(pecas_para_calcular)} tipos de peças.")
+                tarefas.append({
+                    'chapa_largura': self.chapa_largura, 'chapa_altura': self.chapa_altura,
+                    'pecas': pecas_para_calcular, 'offset': current_offset,
+                    'margin': effective_margin, 'espessura': espessura,
+                    'aninhar_viaveis': self.aninhar_viaveis,
+                    'tempo_limite': self.tempo_limite,
+                    'resultado_anterior': self.resultados_anteriores.get(espessura),
+                    'escala_inteira': self.escala_inteira,
+                    'modo_fluxo': self.modo_fluxo,
+                    'catalogo_chapas': self.catalogo_chapas,
+                    'usar_estoque_sobras': self.usar_estoque_sobras,
+                    'forma_real': self.forma_real,
+                    'guilhotina': self.guilhotina,
+                    'corte_comum': self.corte_comum,
+                    'kerf': self.kerf
+                })
+
+            # --- INÍCIO: CÁLCULO DAS ESPESSURAS EM PARALELO ---
+            # Cada espessura roda em um processo próprio; os resultados chegam em qualquer ordem.
+            orquestrar_espessuras_em_paralelo(tarefas, self._on_espessura_concluida, self._on_espessura_com_erro, status_signal_emitter=self.status_update,
+                                              parcial_callback=self._on_espessura_parcial, cancelamento=self.cancelamento)
+            # --- FIM: CÁLCULO DAS ESPESSURAS EM PARALELO ---
+        except NestingCancelado:
+            logging.info("Cálculo cancelado antes de terminar.")
         except Exception as e:
             logging.error(f"Erro na thread de cálculo: {e}", exc_info=True) # exc_info=True para logar o traceback
-            self.error.emit(f"Erro no Cálculo (Espessura {espessura}mm)", str(e))
+            self.error.emit("Erro no Cálculo", str(e))
         finally:
             logging.info("Thread de cálculo finalizada.")
-            self.finished.emit()
+
+    def _on_espessura_concluida(self, espessura, resultado):
+        logging.debug(f"Cálculo para espessura {espessura} concluído. Emitindo resultado.")
+        self.result_ready.emit(espessura, resultado)
+
+    def _on_espessura_parcial(self, espessura, resultado):
+        # O melhor plano até agora já vai para a tela; o resultado final o substitui depois.
+        self.status_update.emit(f"Espessura {espessura}mm: melhor plano até agora com {resultado['total_chapas']} chapa(s). Buscando melhorias...")
+        self.result_ready.emit(espessura, resultado)
+
+    def _on_espessura_com_erro(self, espessura, mensagem):
+        self.error.emit(f"Erro no Cálculo (Espessura {espessura}mm)", mensagem)
 
 # --- INÍCIO: FUNÇÃO PARA GERAR CORES DISTINTAS ---
 def generate_distinct_colors(n):
@@ -265,6 +328,9 @@ class CuttingPlanWidget(QWidget):
                     path2.lineTo(rect_x + large_base_scaled - offset_x_trap, rect_y + height_scaled)
                     path2.closeSubpath()
                     painter.drawPath(path1); painter.drawPath(path2)
+            elif forma == 'dxf_shape' and peca.get('contorno'):
+                # Encaixada pela forma real: o contorno já vem girado na posição do plano.
+                painter.drawPolygon(QPolygonF([QPointF(offset_x + (x + cx) * scale, offset_y + (y + cy) * scale) for cx, cy in peca['contorno']]))
             elif forma == 'dxf_shape':
                 _draw_dxf_entities(painter, peca['dxf_path'], rect_x, rect_y, scale)
             else: # 'rectangle'
@@ -302,6 +368,16 @@ class CuttingPlanWidget(QWidget):
                 painter.drawRect(rect_x, rect_y, rect_w, rect_h)
                 painter.drawText(rect_x + 4, rect_y + 12, f"{sobra['largura']:.0f}x{sobra['altura']:.0f}")
 
+        # 5. Desenha a sequência de cortes (modo guilhotina), numerada na ordem de execução
+        cortes = self.parent().plano_cortes
+        if cortes:
+            painter.setPen(QPen(QColor("#D9534F"), 1, Qt.DashDotLine))
+            for corte in cortes:
+                x0, y0 = offset_x + corte['x0'] * scale, offset_y + corte['y0'] * scale
+                x1, y1 = offset_x + corte['x1'] * scale, offset_y + corte['y1'] * scale
+                painter.drawLine(QPointF(x0, y0), QPointF(x1, y1))
+                painter.drawText(QPointF((x0 + x1) / 2 + 2, (y0 + y1) / 2 - 2), str(corte['ordem']))
+
 class PlanVisualizationDialog(QDialog):
     def __init__(self, chapa_largura, chapa_altura, plano_info, offset, color_map, parent=None):
         super().__init__(parent)
@@ -313,6 +389,7 @@ class PlanVisualizationDialog(QDialog):
         # O cálculo agora retorna uma lista de dicionários, não um dicionário com chaves.
         sobras_raw = plano_info.get('sobras', [])
         self.plano_sobras = sobras_raw if isinstance(sobras_raw, list) else []
+        self.plano_cortes = plano_info.get('cortes') or []
         self.resumo_pecas = plano_info['resumo_pecas']
         self.offset = offset
         self.color_map = color_map
@@ -343,6 +420,10 @@ class PlanVisualizationDialog(QDialog):
             # --- CORREÇÃO: Exibe a identificação da peça diretamente ---
             texto_peca = f"- {item['qtd']}x de {item['tipo']}"
             info_layout.addWidget(QLabel(texto_peca))
+        if plano_info.get('corte_comum'):
+            corte_comum = plano_info['corte_comum']
+            info_layout.addWidget(QLabel(f"<b>Corte em Linha Comum:</b> {corte_comum['blocos']} bloco(s), "
+                                         f"{corte_comum['comprimento_economizado'] / 1000:.2f} m de corte economizados por chapa"))
         info_group.setLayout(info_layout)
         details_layout.addWidget(info_group)
 
@@ -366,6 +447,15 @@ class PlanVisualizationDialog(QDialog):
                     sucata_layout.addWidget(QLabel(f"- Retalho {i+1}: {sobra['largura']:.0f} x {sobra['altura']:.0f} mm"))
                 sucata_group.setLayout(sucata_layout)
                 details_layout.addWidget(sucata_group)
+
+        if self.plano_cortes:
+            cortes_group = QGroupBox("Sequência de Cortes (Guilhotina)")
+            cortes_layout = QVBoxLayout()
+            for corte in self.plano_cortes:
+                posicao = f"X = {corte['x0']:.1f}" if corte['orientacao'] == 'vertical' else f"Y = {corte['y0']:.1f}"
+                cortes_layout.addWidget(QLabel(f"{corte['ordem']}. Estágio {corte['nivel']}: corte {corte['orientacao']} em {posicao} mm"))
+            cortes_group.setLayout(cortes_layout)
+            details_layout.addWidget(cortes_group)
         # --- FIM: NOVOS LABELS DE INFORMAÇÃO ---
 
         layout.addWidget(self.details_container)
@@ -412,11 +502,17 @@ class PlanVisualizationDialog(QDialog):
 
 
 class NestingDialog(QDialog):
-    def __init__(self, dataframe, parent=None):
+    def __init__(self, dataframe, parent=None, resultados_anteriores=None):
         super().__init__(parent)
         self.df = dataframe
         self.calculation_results = None # Armazena os resultados completos
+        # Último resultado de cada espessura, usado para refazer só o que mudou no próximo cálculo
+        self.resultados_anteriores = dict(resultados_anteriores or {})
         self.color_map = {} # Armazena o mapa de cores por tipo de peça
+        self.result_group_boxes = {} # Caixa de resultado exibida para cada espessura
+        self.thread = None
+        self._threads_canceladas = [] # Mantém as threads canceladas vivas até terminarem
+        self._thread_pendente = None # Nova thread à espera do fim de uma thread cancelada
         self.setWindowTitle("Cálculo de Aproveitamento de Chapa")
         self.setMinimumWidth(600)
         self.resize(800, 700) # Define um tamanho inicial maior
@@ -447,6 +543,33 @@ class NestingDialog(QDialog):
         form_layout.addRow("Altura da Chapa (mm):", self.chapa_altura_input)
         form_layout.addRow("Offset entre Peças (mm):", self.offset_input)
         form_layout.addRow("Margem da Chapa (mm):", self.margin_input) # <<< NOVA LINHA
+        # Estoque com vários formatos: o cálculo escolhe a mistura de chapas mais barata.
+        self.catalogo_input = QLineEdit("")
+        self.catalogo_input.setPlaceholderText("Ex.: 3000x1500:6.50; 2000x1000:6.80 (vazio = chapa acima)")
+        form_layout.addRow("Estoque de Chapas (LxA:custo/kg):", self.catalogo_input)
+        self.aninhar_viaveis_check = QCheckBox("Calcular as demais peças se alguma não couber na chapa")
+        form_layout.addRow("", self.aninhar_viaveis_check)
+        self.escala_inteira_check = QCheckBox("Calcular com medidas inteiras (centésimos de mm)")
+        form_layout.addRow("", self.escala_inteira_check)
+        self.modo_fluxo_check = QCheckBox("Modo rápido para listas muito grandes (usa mais chapas)")
+        form_layout.addRow("", self.modo_fluxo_check)
+        self.usar_sobras_check = QCheckBox("Usar as sobras do estoque antes das chapas inteiras")
+        form_layout.addRow("", self.usar_sobras_check)
+        self.forma_real_check = QCheckBox("Encaixar peças DXF pela forma real")
+        self.forma_real_check.setChecked(True)
+        form_layout.addRow("", self.forma_real_check)
+        self.guilhotina_check = QCheckBox("Layout para guilhotina/serra (só cortes de ponta a ponta)")
+        form_layout.addRow("", self.guilhotina_check)
+        # Corte em linha comum: retângulos iguais encostados, separados só pelo kerf.
+        self.corte_comum_check = QCheckBox("Corte em linha comum para retângulos iguais")
+        form_layout.addRow("", self.corte_comum_check)
+        self.kerf_input = QLineEdit(f"{KERF_PADRAO:g}")
+        form_layout.addRow("Kerf da Linha Comum (mm):", self.kerf_input)
+        # Tempo limite da busca: ao atingi-lo, fica o melhor plano encontrado até ali.
+        self.tempo_limite_combo = QComboBox()
+        for texto, segundos in [("Sem limite", None), ("5 s", 5), ("30 s", 30), ("2 min", 120)]:
+            self.tempo_limite_combo.addItem(texto, segundos)
+        form_layout.addRow("Tempo Limite da Busca:", self.tempo_limite_combo)
         input_group.setLayout(form_layout)
         self.main_layout.addWidget(input_group)
         
@@ -454,15 +577,24 @@ class NestingDialog(QDialog):
         action_layout = QHBoxLayout()
         self.calculate_btn = QPushButton("Calcular")
         self.calculate_btn.clicked.connect(self.run_calculation)
+        self.cancel_btn = QPushButton("Cancelar")
+        self.cancel_btn.clicked.connect(self.cancel_calculation)
+        self.cancel_btn.setEnabled(False)
         self.export_report_btn = QPushButton("Exportar Relatório (PDF)")
         self.export_dxf_btn = QPushButton("Exportar Planos (DXF)") # Novo botão
         self.export_report_btn.clicked.connect(self.export_full_report_to_pdf)
         self.export_report_btn.setEnabled(False) # Desabilitado até o cálculo ser feito
         self.export_dxf_btn.setEnabled(False) # Desabilitado até o cálculo ser feito
         self.export_dxf_btn.clicked.connect(self.export_layouts_to_dxf)
+        # Confirma o nesting: baixa as sobras usadas e guarda as sobras aproveitáveis no estoque.
+        self.registrar_sobras_btn = QPushButton("Confirmar Sobras no Estoque")
+        self.registrar_sobras_btn.setEnabled(False)
+        self.registrar_sobras_btn.clicked.connect(self.registrar_sobras_no_estoque)
         action_layout.addWidget(self.calculate_btn)
+        action_layout.addWidget(self.cancel_btn)
         action_layout.addWidget(self.export_report_btn)
         action_layout.addWidget(self.export_dxf_btn)
+        action_layout.addWidget(self.registrar_sobras_btn)
         self.main_layout.addLayout(action_layout)
 
         # --- Área de Resultados ---
@@ -491,12 +623,29 @@ class NestingDialog(QDialog):
         else:
             self.showMaximized()
 
+    def _ler_catalogo(self):
+        """
+        Lê o estoque de chapas no formato "3000x1500:6.50; 2000x1000:6.80" (o custo por kg é
+        opcional). Retorna a lista de formatos ou None se o campo estiver vazio; levanta ValueError.
+        """
+        catalogo = []
+        for item in self.catalogo_input.text().split(';'):
+            if not item.strip():
+                continue
+            dimensoes, _, custo = item.partition(':')
+            largura, altura = dimensoes.lower().split('x')
+            catalogo.append({'largura': float(largura), 'altura': float(altura),
+                             'custo_kg': float(custo.replace(',', '.')) if custo.strip() else None})
+        return catalogo or None
+
     def run_calculation(self):
         try:
             chapa_largura = float(self.chapa_largura_input.text())
             chapa_altura = float(self.chapa_altura_input.text())
             offset = float(self.offset_input.text())
             margin = float(self.margin_input.text())
+            kerf = float(self.kerf_input.text())
+            catalogo_chapas = self._ler_catalogo()
         except ValueError:
             QMessageBox.critical(self, "Erro de Entrada", "Por favor, insira valores numéricos válidos.")
             return
@@ -512,18 +661,83 @@ class NestingDialog(QDialog):
             return
 
         # --- INÍCIO: LÓGICA DA THREAD ---
-        # 1. Prepara a UI para o cálculo
+        # 1. Cancela o cálculo em andamento, se houver; o novo substitui o antigo.
+        self._cancelar_thread_atual()
+
+        # 2. Prepara a UI para o cálculo
         self.prepare_for_calculation()
 
-        # 2. Cria e inicia a thread
-        self.thread = CalculationThread(chapa_largura, chapa_altura, offset, margin, grouped)
+        # 3. Cria e inicia a thread
+        self.thread = CalculationThread(chapa_largura, chapa_altura, offset, margin, grouped,
+                                        aninhar_viaveis=self.aninhar_viaveis_check.isChecked(),
+                                        tempo_limite=self.tempo_limite_combo.currentData(),
+                                        resultados_anteriores=dict(self.resultados_anteriores),
+                                        escala_inteira=ESCALA_INTEIRA_PADRAO if self.escala_inteira_check.isChecked() else None,
+                                        modo_fluxo=self.modo_fluxo_check.isChecked(),
+                                        catalogo_chapas=catalogo_chapas,
+                                        usar_estoque_sobras=self.usar_sobras_check.isChecked(),
+                                        forma_real=self.forma_real_check.isChecked(),
+                                        guilhotina=self.guilhotina_check.isChecked(),
+                                        corte_comum=self.corte_comum_check.isChecked(),
+                                        kerf=kerf)
         self.thread.result_ready.connect(self.on_result_ready)
         self.thread.finished.connect(self.on_calculation_finished)
         self.thread.error.connect(self.on_calculation_error)
         self.thread.status_update.connect(self.on_status_update) # Conecta o novo sinal
-        self.thread.start()
+        # O pool de processos é compartilhado: a nova thread só parte quando a cancelada
+        # tiver terminado, senão o cancelamento dela alcançaria as tarefas da nova.
+        self._thread_pendente = self.thread
+        if not any(thread.isRunning() for thread in self._threads_canceladas):
+            self._iniciar_thread_pendente()
         # --- FIM: LÓGICA DA THREAD ---
 
+    def _iniciar_thread_pendente(self):
+        """Inicia a thread que aguardava o fim da cancelada; chamadas repetidas não fazem nada."""
+        thread, self._thread_pendente = self._thread_pendente, None
+        if thread is not None:
+            thread.start()
+
+    def _cancelar_thread_atual(self):
+        """
+        Cancela a thread de cálculo em andamento (ou a que ainda aguardava para partir),
+        desconectando os seus sinais para que resultados atrasados não cheguem à tela.
+        Retorna True se havia um cálculo para cancelar.
+        """
+        thread = self.thread
+        self.thread = None
+        self._thread_pendente = None
+        if thread is None or not thread.isRunning():
+            return thread is not None and not thread.isFinished()
+        for sinal in (thread.result_ready, thread.finished, thread.error, thread.status_update):
+            sinal.disconnect()
+        # Conectados antes do pedido de cancelamento, para que o 'finished' de uma thread que
+        # termina em seguida não se perca.
+        thread.finished.connect(self._iniciar_thread_pendente)
+        thread.finished.connect(lambda: self._threads_canceladas.remove(thread))
+        self._threads_canceladas.append(thread)
+        thread.cancelar()
+        return True
+
+    def cancel_calculation(self):
+        """Slot do botão 'Cancelar'."""
+        if not self._cancelar_thread_atual():
+            return
+        self.calculate_btn.setText("Calcular")
+        self.cancel_btn.setEnabled(False)
+        self.status_label.setText("Cálculo cancelado.")
+        self.status_label.setStyleSheet("font-style: italic; color: #888888;")
+        if self.calculation_results:
+            self.export_report_btn.setEnabled(True)
+            self.export_dxf_btn.setEnabled(True)
+
+    def done(self, r):
+        # Fechar a janela (X, Esc ou aceitar) cancela o cálculo e aguarda as threads,
+        # pois uma QThread não pode ser destruída ainda rodando.
+        self._cancelar_thread_atual()
+        for thread in list(self._threads_canceladas):
+            thread.wait()
+        super().done(r)
+
     def prepare_for_calculation(self):
         """Limpa a UI e a prepara para receber novos resultados."""
         # Limpa resultados anteriores
@@ -533,9 +747,13 @@ class NestingDialog(QDialog):
                 widget.setParent(None)
         
         self.calculation_results = {}
+        self.result_group_boxes = {}
         self.export_report_btn.setEnabled(False)
-        self.calculate_btn.setEnabled(False)
-        self.calculate_btn.setText("Calculando...")
+        self.export_dxf_btn.setEnabled(False)
+        self.registrar_sobras_btn.setEnabled(False)
+        # O botão continua habilitado: clicar de novo reinicia o cálculo com os novos parâmetros.
+        self.calculate_btn.setText("Recalcular")
+        self.cancel_btn.setEnabled(True)
         self.status_label.setText("Calculando, por favor aguarde...")
         self.status_label.setStyleSheet("font-style: normal; color: #FFFFFF;")
 
@@ -556,15 +774,45 @@ class NestingDialog(QDialog):
 
     def on_calculation_finished(self):
         """Slot chamado quando todos os cálculos terminam."""
-        self.calculate_btn.setEnabled(True)
         self.calculate_btn.setText("Calcular")
+        self.cancel_btn.setEnabled(False)
+        self.thread = None
+        self.resultados_anteriores.update(self.calculation_results or {})
         self.status_label.setText("Cálculo concluído.")
         self.status_label.setStyleSheet("font-style: italic; color: #4CAF50;") # Verde
         # Habilita o botão de exportar se houver resultados
         if self.calculation_results:
             self.export_report_btn.setEnabled(True)
             self.export_dxf_btn.setEnabled(True)
-
+            self.registrar_sobras_btn.setEnabled(True)
+
+    def registrar_sobras_no_estoque(self):
+        """
+        Confirma o nesting calculado no estoque de sobras: para cada espessura, baixa as sobras
+        do estoque usadas pelos planos e guarda as sobras aproveitáveis que eles deixam, tudo
+        em uma única transação por espessura.
+        """
+        inventario = RemnantInventory()
+        baixadas, guardadas, conflitos = 0, 0, []
+        for espessura, resultado in self.calculation_results.items():
+            ids_usados = [s['id'] for s in resultado.get('sobras_usadas', [])]
+            sobras_novas = [sobra for plano in resultado.get('planos_unicos', []) for sobra in plano.get('sobras', [])
+                            if sobra.get('tipo_sobra') == 'aproveitavel' for _ in range(plano['repeticoes'])]
+            ids_novos = inventario.registrar_nesting(espessura, ids_usados, sobras_novas, origem=f"Nesting {espessura} mm")
+            if ids_novos is None:
+                conflitos.append(espessura)
+                continue
+            baixadas += len(ids_usados)
+            guardadas += len(ids_novos)
+
+        self.registrar_sobras_btn.setEnabled(False)
+        mensagem = f"{baixadas} sobra(s) baixada(s) e {guardadas} sobra(s) nova(s) guardada(s) no estoque."
+        if conflitos:
+            espessuras = ", ".join(f"{e} mm" for e in conflitos)
+            QMessageBox.warning(self, "Estoque de Sobras", f"{mensagem}\n\nAs espessuras {espessuras} usam sobras que já foram "
+                                "consumidas por outro nesting e não foram registradas. Recalcule essas espessuras.")
+        else:
+            QMessageBox.information(self, "Estoque de Sobras", mensagem)
 
     def export_full_report_to_pdf(self):
         if not self.calculation_results:
@@ -644,48 +892,56 @@ class NestingDialog(QDialog):
         try:
             doc = ezdxf.new('R2010')
             msp = doc.modelspace()
-            chapa_w = float(self.chapa_largura_input.text())
-            chapa_h = float(self.chapa_altura_input.text())
+            chapa_largura = float(self.chapa_largura_input.text())
+            chapa_altura = float(self.chapa_altura_input.text())
             margin = float(self.margin_input.text())
             x_offset = 0
 
             for espessura, resultado in self.calculation_results.items():
                 for plano_info in resultado['planos_unicos']:
+                    # Com estoque de vários formatos, cada plano traz a sua chapa.
+                    chapa_w = plano_info.get('chapa_largura', chapa_largura)
+                    chapa_h = plano_info.get('chapa_altura', chapa_altura)
                     for i in range(plano_info['repeticoes']):
                         # Desenha o contorno da chapa
                         msp.add_lwpolyline([(x_offset, 0), (x_offset + chapa_w, 0), (x_offset + chapa_w, chapa_h), (x_offset, chapa_h)], close=True, dxfattribs={'layer': 'CONTORNO_CHAPA'})
 
-                        # Desenha as peças
-                        for peca in plano_info['plano']:
+                        # Desenha os contornos na ordem de corte (furos antes do contorno externo de cada peça),
+                        # para a máquina seguir a ordem das entidades; os deslocamentos rápidos vão numa layer à parte.
+                        sequencia = toolpath.sequencia_do_plano(plano_info, chapa_w, chapa_h)
+                        if sequencia['sequencia'] and 'SEQUENCIA_CORTE' not in doc.layers:
+                            doc.layers.new(name='SEQUENCIA_CORTE', dxfattribs={'color': 3})
+                        anterior = (x_offset, 0)
+                        for item in sequencia['sequencia']:
+                            peca = plano_info['plano'][item['peca']]
                             layer_name = peca['tipo_key'].replace(' ', '_').replace('Ø', 'D').replace('/', '_')
                             if layer_name not in doc.layers:
                                 doc.layers.new(name=layer_name)
-                            
-                            px, py, pw, ph = peca['x'], peca['y'], peca['largura'], peca['altura']
-                            
-                            # Converte Y para o sistema de coordenadas do DXF (origem embaixo)
-                            # A coordenada 'py' já vem com a origem no topo, então a conversão é direta.
-                            py_dxf = chapa_h - py - ph 
-                            forma = peca.get('forma', 'rectangle')
-                            if forma == 'rectangle':
-                                msp.add_lwpolyline([(x_offset + px, py_dxf), (x_offset + px + pw, py_dxf), (x_offset + px + pw, py_dxf + ph), (x_offset + px, py_dxf + ph)], close=True, dxfattribs={'layer': layer_name})
-                            elif forma == 'circle':
-                                cx = x_offset + px + pw / 2
-                                cy = py_dxf + ph / 2
-                                msp.add_circle((cx, cy), radius=peca['diametro']/2, dxfattribs={'layer': layer_name})
-                            elif forma == 'paired_triangle':
-                                x, y = x_offset + px, py_dxf
-                                msp.add_lwpolyline([(x, y), (x + pw, y), (x, y + ph)], close=True, dxfattribs={'layer': layer_name})
-                                msp.add_lwpolyline([(x + pw, y + ph), (x, y + ph), (x + pw, y)], close=True, dxfattribs={'layer': layer_name})
-                            elif forma == 'paired_trapezoid':
-                                dims = peca['orig_dims']
-                                l_base, s_base, h = dims['large_base'], dims['small_base'], dims['height']
-                                x_trap_offset = (l_base - s_base) / 2
-                                x, y = x_offset + px, py_dxf
-                                # Trapézio 1
-                                msp.add_lwpolyline([(x, y), (x + l_base, y), (x + l_base - x_trap_offset, y + h), (x + x_trap_offset, y + h)], close=True, dxfattribs={'layer': layer_name})
-                                # Trapézio 2
-                                msp.add_lwpolyline([(x + l_base, y), (x + pw, y), (x + pw - x_trap_offset, y + h), (x + l_base, y + h)], close=True, dxfattribs={'layer': layer_name})
+
+                            # Converte Y para o sistema de coordenadas do DXF (origem embaixo).
+                            if item['circulo']:
+                                cx, cy, raio = item['circulo']
+                                msp.add_circle((x_offset + cx, chapa_h - cy), radius=raio, dxfattribs={'layer': layer_name})
+                            elif item['pontos']:
+                                msp.add_lwpolyline([(x_offset + px, chapa_h - py) for px, py in item['pontos']], close=True, dxfattribs={'layer': layer_name})
+                            # Bloco de linha comum: cada aresta compartilhada sai uma vez só, no meio do kerf.
+                            for (ax, ay), (bx, by) in item['linhas']:
+                                msp.add_line((x_offset + ax, chapa_h - ay), (x_offset + bx, chapa_h - by), dxfattribs={'layer': layer_name})
+
+                            entrada = (x_offset + item['entrada'][0], chapa_h - item['entrada'][1])
+                            msp.add_line(anterior, entrada, dxfattribs={'layer': 'SEQUENCIA_CORTE'})
+                            msp.add_text(str(item['ordem']), dxfattribs={'layer': 'SEQUENCIA_CORTE', 'height': 10, 'insert': entrada})
+                            anterior = entrada
+
+                        # Sequência de cortes em guilhotina, numerada na ordem de execução.
+                        if plano_info.get('cortes'):
+                            if 'CORTES_GUILHOTINA' not in doc.layers:
+                                doc.layers.new(name='CORTES_GUILHOTINA', dxfattribs={'color': 1})
+                            for corte in plano_info['cortes']:
+                                inicio, fim = (x_offset + corte['x0'], chapa_h - corte['y0']), (x_offset + corte['x1'], chapa_h - corte['y1'])
+                                msp.add_line(inicio, fim, dxfattribs={'layer': 'CORTES_GUILHOTINA'})
+                                msp.add_text(str(corte['ordem']), dxfattribs={'layer': 'CORTES_GUILHOTINA', 'height': 20,
+                                                                              'insert': ((inicio[0] + fim[0]) / 2, (inicio[1] + fim[1]) / 2)})
 
                         x_offset += chapa_w + 100 # Espaço entre as chapas
 
@@ -700,10 +956,40 @@ class NestingDialog(QDialog):
         group_layout = QVBoxLayout()
         
         # Adiciona informações gerais
-        info_label = QLabel(f"Total de Chapas: {resultado['total_chapas']} | Aproveitamento Geral: {resultado['aproveitamento_geral']}")
+        estatisticas = resultado.get('estatisticas_busca', {})
+        situacao = ""
+        if estatisticas.get('parcial'):
+            situacao = " | Parcial: buscando melhorias..."
+        elif estatisticas.get('interrompida_por_tempo'):
+            situacao = " | Melhor plano dentro do tempo limite"
+        elif estatisticas.get('incremental'):
+            situacao = f" | Incremental: {estatisticas['incremental']['chapas_mantidas']} chapa(s) mantida(s) do cálculo anterior"
+        estoque = resultado.get('estoque')
+        if estoque:
+            formatos = ", ".join(f"{qtd}x {nome}" for nome, qtd in estoque['chapas_por_formato'].items())
+            situacao += f" | Chapas: {formatos} | Custo Estimado: {estoque['custo_total']:.2f}"
+        if resultado.get('sobras_usadas'):
+            situacao += f" | {len(resultado['sobras_usadas'])} sobra(s) do estoque"
+        info_label = QLabel(f"Total de Chapas: {resultado['total_chapas']} | Aproveitamento Geral: {resultado['aproveitamento_geral']}{situacao}")
         info_label.setStyleSheet("font-weight: bold;")
         group_layout.addWidget(info_label)
 
+        # Nesting em lote: a parte de cada projeto nas chapas, rateada pela área das peças.
+        for projeto, dados in sorted(resultado.get('projetos', {}).items()):
+            planos_str = ", ".join(f"{p['plano']} ({p['pecas_por_chapa']} pç x{p['repeticoes']})" for p in dados['planos'])
+            projeto_label = QLabel(f"Projeto {projeto}: {dados['pecas']} peça(s) | {dados['chapas_rateadas']:.2f} chapa(s) rateada(s) | "
+                                   f"{dados['peso_chapas']:.2f} kg | Planos: {planos_str}")
+            projeto_label.setWordWrap(True)
+            group_layout.addWidget(projeto_label)
+
+        # Peças deixadas de fora pela pré-análise (só quando o usuário pediu para calcular as demais).
+        if resultado.get('pecas_inviaveis'):
+            nomes = ", ".join(f"{p['nome_arquivo'] or 'Sem nome'} ({p['quantidade']} un.)" for p in resultado['pecas_inviaveis'])
+            inviaveis_label = QLabel(f"Não couberam na chapa e ficaram de fora: {nomes}")
+            inviaveis_label.setWordWrap(True)
+            inviaveis_label.setStyleSheet("color: #FDBA74; font-style: italic;") # Laranja claro
+            group_layout.addWidget(inviaveis_label)
+
         # --- INÍCIO: CORREÇÃO DO ERRO "INDEX OUT OF RANGE" ---
         # Verifica se existem planos de corte antes de tentar acessá-los.
         # Isso acontece se nenhuma peça couber na chapa.
@@ -724,11 +1010,15 @@ class NestingDialog(QDialog):
                 
                 resumo_pecas_str = ", ".join([f"{p['qtd']}x ({p['tipo']})" for p in plano_info['resumo_pecas']])
                 
-                plan_label = QLabel(f"Plano {i+1}: {plano_info['repeticoes']}x | Peças: {resumo_pecas_str}")
+                plano_w, plano_h = plano_info.get('chapa_largura', chapa_w), plano_info.get('chapa_altura', chapa_h)
+                formato_str = f" | Chapa {plano_w:g}x{plano_h:g}" if resultado.get('estoque') or resultado.get('sobras_usadas') else ""
+                if plano_info.get('sobra_id') is not None:
+                    formato_str = f" | Sobra #{plano_info['sobra_id']} {plano_w:g}x{plano_h:g}"
+                plan_label = QLabel(f"Plano {i+1}: {plano_info['repeticoes']}x{formato_str} | Peças: {resumo_pecas_str}")
                 
                 view_btn = QPushButton("Ver Detalhes")
                 # --- MUDANÇA: Passa o dicionário 'plano_info' completo e o offset ---
-                view_btn.clicked.connect(lambda _, p_info=plano_info, w=chapa_w, h=chapa_h: self.show_plan_visualization(p_info, w, h, self.color_map))
+                view_btn.clicked.connect(lambda _, p_info=plano_info, w=plano_w, h=plano_h: self.show_plan_visualization(p_info, w, h, self.color_map))
                 
                 plano_layout.addWidget(plan_label)
                 plano_layout.addStretch()
@@ -743,7 +1033,15 @@ class NestingDialog(QDialog):
         # --- FIM: CORREÇÃO ---
 
         group_box.setLayout(group_layout)
-        self.results_scroll_layout.addWidget(group_box)
+        # Um resultado novo da mesma espessura (parcial ou final) substitui o anterior no mesmo lugar.
+        anterior = self.result_group_boxes.get(espessura)
+        if anterior is not None:
+            posicao = self.results_scroll_layout.indexOf(anterior)
+            anterior.setParent(None)
+            self.results_scroll_layout.insertWidget(posicao, group_box)
+        else:
+            self.results_scroll_layout.addWidget(group_box)
+        self.result_group_boxes[espessura] = group_box
 
     def show_plan_visualization(self, plano_info, chapa_w, chapa_h, color_map):
         offset = float(self.offset_input.text())
@@ -0,0 +1,56 @@
+# nfp_cache.py
+
+import os
+import json
+
+class NFPCache:
+    """
+    Cache em disco dos no-fit polygons (NFP) do nesting pela forma real.
+    A chave identifica o par de peças (assinatura do contorno de cada uma), a rotação de cada
+    uma e o offset; o valor é a lista de polígonos convexos cuja união forma o NFP. Os NFPs
+    só dependem da geometria, então valem para qualquer job e qualquer chapa.
+    """
+    def __init__(self, cache_path="nfp_cache.json", max_entries=20000):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self._entradas = None
+        self._alterado = False
+
+    @staticmethod
+    def make_key(assinatura_fixa, rotacao_fixa, assinatura_movel, rotacao_movel, offset):
+        return f"{assinatura_fixa}@{rotacao_fixa}|{assinatura_movel}@{rotacao_movel}|{round(float(offset), 3)}"
+
+    def _load_cache(self):
+        if self._entradas is None:
+            try:
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    self._entradas = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._entradas = {}
+        return self._entradas
+
+    def get(self, key):
+        return self._load_cache().get(key)
+
+    def put(self, key, poligonos):
+        entradas = self._load_cache()
+        entradas[key] = poligonos
+        # Descarta as entradas mais antigas (ordem de inserção) acima do limite.
+        for antiga in list(entradas)[:max(0, len(entradas) - self.max_entries)]:
+            del entradas[antiga]
+        self._alterado = True
+
+    def save(self):
+        """Grava as entradas novas; escreve em um arquivo temporário e troca de uma vez."""
+        if not self._alterado:
+            return
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entradas, f)
+        os.replace(tmp_path, self.cache_path)
+        self._alterado = False
+
+    def clear(self):
+        self._entradas, self._alterado = {}, False
+        if os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
@@ -0,0 +1,380 @@
+# nfp_engine.py
+
+import os
+import json
+import math
+import time
+import hashlib
+import logging
+import numpy as np
+from dxf_engine import get_dxf_outer_contour
+from nfp_cache import NFPCache
+
+# Rotações testadas para cada peça no nesting pela forma real (graus, sentido anti-horário).
+ROTACOES_NFP = (0, 90, 180, 270)
+# Desvio máximo (mm) entre o contorno do DXF e o polígono simplificado usado no nesting.
+TOLERANCIA_SIMPLIFICACAO = 0.5
+# Contornos que ocupam pelo menos esta fração do bounding box seguem pelo rectpack.
+FRACAO_RETANGULAR = 0.98
+# O custo do nesting por NFP cresce com as peças por chapa (medido: 50 peças em L levam ~2,5s,
+# 100 ~15s e 200 ~90s). Acima deste número de peças de forma o nesting por NFP fica de fora.
+LIMITE_PECAS_NFP = 60
+# Retângulos de complemento oferecidos aos vãos, no máximo (os maiores); os demais vão para a busca.
+LIMITE_COMPLEMENTOS_NFP = 100
+# Tempo máximo (s) do nesting por NFP em um job.
+TEMPO_MAXIMO_NFP = 10.0
+# Candidatos testados por vez contra os NFPs (limita a memória das comparações vetorizadas).
+TAMANHO_LOTE_CANDIDATOS = 4096
+_EPS = 1e-6
+
+# Contornos já extraídos nesta sessão: (caminho, mtime) -> contorno simplificado.
+_contornos_carregados = {}
+
+# --- INÍCIO: CONTORNOS ---
+def _area(pontos):
+    """Área com sinal de um polígono (array Nx2); positiva no sentido anti-horário."""
+    x, y = pontos[:, 0], pontos[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+def _douglas_peucker(pontos, tolerancia):
+    """Simplifica uma polilinha aberta (array Nx2) mantendo as pontas; retorna os índices mantidos."""
+    manter = np.zeros(len(pontos), dtype=bool)
+    manter[0] = manter[-1] = True
+    pilha = [(0, len(pontos) - 1)]
+    while pilha:
+        ini, fim = pilha.pop()
+        if fim - ini < 2:
+            continue
+        a, b = pontos[ini], pontos[fim]
+        meio = pontos[ini + 1:fim]
+        direcao = b - a
+        comprimento = math.hypot(*direcao)
+        if comprimento < _EPS:
+            distancias = np.hypot(*(meio - a).T)
+        else:
+            distancias = np.abs(direcao[0] * (meio[:, 1] - a[1]) - direcao[1] * (meio[:, 0] - a[0])) / comprimento
+        k = int(np.argmax(distancias))
+        if distancias[k] > tolerancia:
+            manter[ini + 1 + k] = True
+            pilha.extend([(ini, ini + 1 + k), (ini + 1 + k, fim)])
+    return np.flatnonzero(manter)
+
+def simplificar_contorno(pontos, tolerancia=TOLERANCIA_SIMPLIFICACAO):
+    """
+    Simplifica um contorno fechado com Douglas-Peucker, orienta no sentido anti-horário e
+    translada o canto inferior esquerdo do bounding box para a origem.
+    Retorna uma lista de (x, y), ou None se sobrar menos de um triângulo.
+    """
+    pontos = np.asarray(pontos, dtype=float)
+    if len(pontos) < 3:
+        return None
+    # O contorno fechado é partido no ponto mais distante do primeiro; cada metade é uma polilinha.
+    k = int(np.argmax(np.hypot(*(pontos - pontos[0]).T)))
+    if k == 0:
+        return None
+    metade_1 = pontos[:k + 1]
+    metade_2 = np.vstack([pontos[k:], pontos[:1]])
+    simplificado = np.vstack([metade_1[_douglas_peucker(metade_1, tolerancia)][:-1],
+                              metade_2[_douglas_peucker(metade_2, tolerancia)][:-1]])
+    if len(simplificado) < 3 or abs(_area(simplificado)) < _EPS:
+        return None
+    if _area(simplificado) < 0:
+        simplificado = simplificado[::-1]
+    simplificado = simplificado - simplificado.min(axis=0)
+    return [(round(float(x), 4), round(float(y), 4)) for x, y in simplificado]
+
+def carregar_contorno(dxf_path):
+    """Contorno externo simplificado de um DXF, extraído uma única vez por versão do arquivo."""
+    try:
+        chave = (dxf_path, os.path.getmtime(dxf_path))
+    except (OSError, TypeError):
+        return None
+    if chave not in _contornos_carregados:
+        contorno = get_dxf_outer_contour(dxf_path)
+        _contornos_carregados[chave] = simplificar_contorno(contorno) if contorno else None
+    return _contornos_carregados[chave]
+
+def e_retangular(contorno):
+    """True se o contorno praticamente preenche o próprio bounding box."""
+    pontos = np.asarray(contorno, dtype=float)
+    largura, altura = pontos.max(axis=0) - pontos.min(axis=0)
+    return abs(_area(pontos)) >= FRACAO_RETANGULAR * largura * altura
+
+def area_contorno(contorno):
+    return abs(_area(np.asarray(contorno, dtype=float)))
+
+def assinatura_contorno(contorno):
+    """Identifica a geometria de um contorno entre execuções (chave do cache de NFPs)."""
+    return hashlib.sha1(json.dumps([[round(x, 3), round(y, 3)] for x, y in contorno]).encode('utf-8')).hexdigest()[:16]
+
+def girar_contorno(contorno, rotacao):
+    """Gira o contorno em múltiplos de 90° e devolve o bounding box para a origem."""
+    pontos = np.asarray(contorno, dtype=float)
+    for _ in range((rotacao // 90) % 4):
+        pontos = np.column_stack([-pontos[:, 1], pontos[:, 0]])
+    return pontos - pontos.min(axis=0)
+# --- FIM: CONTORNOS ---
+
+# --- INÍCIO: DECOMPOSIÇÃO CONVEXA E NO-FIT POLYGONS ---
+def _cruz(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+def _casco_convexo(pontos):
+    """Casco convexo (cadeia monótona de Andrew), no sentido anti-horário e sem pontos colineares."""
+    pontos = sorted(set((round(float(x), 6), round(float(y), 6)) for x, y in pontos))
+    if len(pontos) < 3:
+        return np.asarray(pontos, dtype=float)
+    inferior, superior = [], []
+    for p in pontos:
+        while len(inferior) >= 2 and _cruz(inferior[-2], inferior[-1], p) <= 0:
+            inferior.pop()
+        inferior.append(p)
+    for p in reversed(pontos):
+        while len(superior) >= 2 and _cruz(superior[-2], superior[-1], p) <= 0:
+            superior.pop()
+        superior.append(p)
+    return np.asarray(inferior[:-1] + superior[:-1], dtype=float)
+
+def _e_convexo(pontos, indices):
+    n = len(indices)
+    return all(_cruz(pontos[indices[i - 1]], pontos[indices[i]], pontos[indices[(i + 1) % n]]) >= -_EPS for i in range(n))
+
+def _triangular(pontos):
+    """Triangulação por corte de orelhas de um polígono simples anti-horário; None se falhar."""
+    restantes = list(range(len(pontos)))
+    triangulos = []
+    while len(restantes) > 3:
+        n = len(restantes)
+        for i in range(n):
+            a, b, c = restantes[i - 1], restantes[i], restantes[(i + 1) % n]
+            if _cruz(pontos[a], pontos[b], pontos[c]) <= _EPS:
+                continue
+            if any(_cruz(pontos[a], pontos[b], pontos[p]) >= 0 and _cruz(pontos[b], pontos[c], pontos[p]) >= 0
+                   and _cruz(pontos[c], pontos[a], pontos[p]) >= 0 for p in restantes if p not in (a, b, c)):
+                continue
+            triangulos.append([a, b, c])
+            del restantes[i]
+            break
+        else:
+            # Sem orelha: sobra um vértice colinear; descartá-lo não muda a área.
+            colineares = [i for i in range(n) if abs(_cruz(pontos[restantes[i - 1]], pontos[restantes[i]], pontos[restantes[(i + 1) % n]])) <= _EPS]
+            if not colineares:
+                return None
+            del restantes[colineares[0]]
+    if _cruz(*(pontos[i] for i in restantes)) > _EPS:
+        triangulos.append(restantes)
+    return triangulos
+
+def decompor_convexo(contorno):
+    """
+    Parte o polígono em peças convexas: triangulação seguida da fusão de Hertel-Mehlhorn
+    (remove as diagonais cuja retirada mantém a peça convexa). Se a triangulação falhar,
+    usa o casco convexo, que é conservador (nunca deixa duas peças se sobreporem).
+    """
+    pontos = [tuple(p) for p in np.asarray(contorno, dtype=float)]
+    if _e_convexo(pontos, list(range(len(pontos)))):
+        return [np.asarray(pontos)]
+    partes = _triangular(pontos)
+    if not partes:
+        return [_casco_convexo(pontos)]
+    fundiu = True
+    while fundiu:
+        fundiu = False
+        arestas = {}
+        for k, parte in enumerate(partes):
+            for i in range(len(parte)):
+                arestas[(parte[i], parte[(i + 1) % len(parte)])] = k
+        for (a, b), k in arestas.items():
+            j = arestas.get((b, a))
+            if j is None or j == k:
+                continue
+            p, q = partes[k], partes[j]
+            p_rot = p[p.index(b):] + p[:p.index(b)]   # b ... a
+            q_rot = q[q.index(a):] + q[:q.index(a)]   # a ... b
+            fundida = p_rot + q_rot[1:-1]
+            if _e_convexo(pontos, fundida):
+                partes = [parte for i, parte in enumerate(partes) if i not in (j, k)] + [fundida]
+                fundiu = True
+                break
+    return [np.asarray([pontos[i] for i in parte]) for parte in partes]
+
+def _octogono(offset):
+    """Octógono circunscrito ao círculo de raio 'offset': garante o espaçamento mínimo entre peças."""
+    if offset <= 0:
+        return np.zeros((1, 2))
+    raio = offset / math.cos(math.pi / 8)
+    angulos = np.arange(8) * (math.pi / 4) + math.pi / 8
+    return np.column_stack([np.cos(angulos), np.sin(angulos)]) * raio
+
+def _soma_minkowski(a, b):
+    """Soma de Minkowski de dois polígonos convexos (casco das somas dos vértices)."""
+    return _casco_convexo((a[:, None, :] + b[None, :, :]).reshape(-1, 2))
+
+def calcular_nfp(partes_fixa, partes_movel, offset):
+    """
+    NFP da peça móvel em torno da fixa (ambas com o canto do bounding box na origem): o
+    conjunto das posições do canto da móvel em que ela invade a fixa ou o espaçamento 'offset'.
+    Retorna a lista das peças convexas cuja união é o NFP.
+    """
+    octogono = _octogono(offset)
+    nfp = []
+    for a in partes_fixa:
+        a_folga = _soma_minkowski(a, octogono)
+        for b in partes_movel:
+            parte = _soma_minkowski(a_folga, -b)
+            if len(parte) >= 3:
+                nfp.append(parte)
+    return nfp
+# --- FIM: DECOMPOSIÇÃO CONVEXA E NO-FIT POLYGONS ---
+
+# --- INÍCIO: NESTING PELA FORMA REAL ---
+class _Forma:
+    """Uma peça em uma rotação: contorno girado, decomposição convexa e dimensões do corpo."""
+    def __init__(self, contorno, largura, altura, rotacao):
+        self.rotacao = rotacao
+        self.contorno = girar_contorno(contorno, rotacao)
+        self.assinatura = assinatura_contorno(contorno)
+        self.largura, self.altura = (altura, largura) if rotacao % 180 else (largura, altura)
+        self.largura = max(self.largura, float(self.contorno[:, 0].max()))
+        self.altura = max(self.altura, float(self.contorno[:, 1].max()))
+        self._partes = None
+
+    @property
+    def partes(self):
+        if self._partes is None:
+            self._partes = decompor_convexo(self.contorno)
+        return self._partes
+
+class _ArestasNFP:
+    """NFPs de uma chapa contra uma forma móvel, em arrays com as arestas de cada peça convexa."""
+    def __init__(self, poligonos):
+        k = max(len(p) for p in poligonos)
+        self.inicio = np.empty((len(poligonos), k, 2))
+        self.fim = np.empty((len(poligonos), k, 2))
+        for m, p in enumerate(poligonos):
+            indices = np.arange(k) % len(p)
+            self.inicio[m], self.fim[m] = p[indices], p[(indices + 1) % len(p)]
+        self.minimo = np.array([p.min(axis=0) for p in poligonos])
+        self.maximo = np.array([p.max(axis=0) for p in poligonos])
+        self.vertices = np.concatenate(poligonos)
+
+    def bloqueados(self, candidatos):
+        """Máscara dos candidatos estritamente dentro de algum NFP (encostar é permitido)."""
+        dentro_caixa = ((candidatos[:, None, :] > self.minimo[None, :, :] + _EPS) &
+                        (candidatos[:, None, :] < self.maximo[None, :, :] - _EPS)).all(axis=2)
+        ci, pj = np.nonzero(dentro_caixa)
+        bloqueado = np.zeros(len(candidatos), dtype=bool)
+        if len(ci):
+            a, b, c = self.inicio[pj], self.fim[pj], candidatos[ci][:, None, :]
+            cruz = (b[..., 0] - a[..., 0]) * (c[..., 1] - a[..., 1]) - (b[..., 1] - a[..., 1]) * (c[..., 0] - a[..., 0])
+            bloqueado[ci[(cruz > _EPS).all(axis=1)]] = True
+        return bloqueado
+
+def aninhar_formas(pecas, bins, offset, verificar=None, cache=None, complementos=(), prazo=None):
+    """
+    Nesting pela forma real com no-fit polygons, em first-fit sobre as chapas de 'bins'
+    ((largura, altura, margem), na ordem em que devem ser abertas).
+    Cada peça é um dicionário com 'rid', 'contorno' (simplificado, na origem) e 'largura'/
+    'altura' do corpo (sem offset). A peça vai para a primeira chapa aberta em que cabe,
+    na posição mais à esquerda (e mais abaixo) entre as rotações de ROTACOES_NFP; os
+    candidatos são os vértices dos NFPs das peças já colocadas e os cantos da área útil.
+    'complementos' (mesmo formato) só preenchem os vãos das chapas já abertas pelas peças, sem
+    abrir chapas novas. 'verificar' é chamado a cada peça (cancelamento cooperativo). Passado
+    'prazo' (em time.perf_counter()), as peças que ainda faltam voltam como não alocadas.
+
+    :return: (chapas, rids_nao_alocados). 'chapas[i]' usa bins[i] e é uma lista de
+             (rid, x, y, forma), com (x, y) o canto inferior esquerdo do corpo na área de nesting.
+    """
+    cache = cache if cache is not None else NFPCache()
+    formas = {}  # (id do contorno, rotação) -> _Forma
+    nfps = {}    # (assinatura fixa, rotação fixa, assinatura móvel, rotação móvel) -> [arrays]
+
+    def _forma(peca, rotacao):
+        chave = (id(peca['contorno']), rotacao)
+        if chave not in formas:
+            formas[chave] = _Forma(peca['contorno'], peca['largura'], peca['altura'], rotacao)
+        return formas[chave]
+
+    def _nfp(fixa, movel):
+        chave = (fixa.assinatura, fixa.rotacao, movel.assinatura, movel.rotacao)
+        if chave not in nfps:
+            chave_disco = NFPCache.make_key(fixa.assinatura, fixa.rotacao, movel.assinatura, movel.rotacao, offset)
+            guardado = cache.get(chave_disco)
+            if guardado is None:
+                calculado = calcular_nfp(fixa.partes, movel.partes, offset)
+                cache.put(chave_disco, [np.round(p, 4).tolist() for p in calculado])
+                nfps[chave] = calculado
+            else:
+                nfps[chave] = [np.asarray(p, dtype=float) for p in guardado]
+        return nfps[chave]
+
+    def _posicao(chapa, bid, forma):
+        """Melhor posição da forma na chapa, ou None se ela não cabe."""
+        largura_util, altura_util = bid[0] - 2 * bid[2], bid[1] - 2 * bid[2]
+        x0, y0 = offset / 2, offset / 2
+        x1, y1 = largura_util - offset / 2 - forma.largura, altura_util - offset / 2 - forma.altura
+        if x1 < x0 - _EPS or y1 < y0 - _EPS:
+            return None
+        x1, y1 = max(x0, x1), max(y0, y1)
+        cantos = np.array([[x0, y0], [x0, y1], [x1, y0], [x1, y1]])
+        if not chapa:
+            return x0, y0
+        poligonos = [p + (x, y) for _, x, y, fixa in chapa for p in _nfp(fixa, forma)]
+        arestas = _ArestasNFP(poligonos)
+        v = arestas.vertices
+        candidatos = np.concatenate([cantos, v, np.column_stack([np.full(len(v), x0), v[:, 1]]),
+                                     np.column_stack([v[:, 0], np.full(len(v), y0)])])
+        dentro = ((candidatos[:, 0] >= x0 - _EPS) & (candidatos[:, 0] <= x1 + _EPS) &
+                  (candidatos[:, 1] >= y0 - _EPS) & (candidatos[:, 1] <= y1 + _EPS))
+        candidatos = np.unique(np.round(candidatos[dentro], 6), axis=0)  # já ordenados por (x, y)
+        for inicio in range(0, len(candidatos), TAMANHO_LOTE_CANDIDATOS):
+            lote = candidatos[inicio:inicio + TAMANHO_LOTE_CANDIDATOS]
+            livres = np.flatnonzero(~arestas.bloqueados(lote))
+            if len(livres):
+                x, y = lote[livres[0]]
+                return float(x), float(y)
+        return None
+
+    def _ordenar(lista):
+        return sorted(lista, key=lambda p: (-p['largura'] * p['altura'], id(p['contorno'])))
+    pecas, complementos = _ordenar(pecas), _ordenar(complementos)
+    chapas, nao_alocados = [], []
+    # Um tipo que não coube numa chapa não cabe mais nela (a chapa só enche).
+    tipos_recusados = []
+    todas = pecas + complementos
+    for ordem, peca in enumerate(todas):
+        if verificar:
+            verificar()
+        if prazo is not None and time.perf_counter() >= prazo:
+            nao_alocados.extend(p['rid'] for p in todas[ordem:])
+            logging.info(f"Nesting pela forma real: prazo esgotado com {len(todas) - ordem} peça(s) por alocar.")
+            break
+        colocada = False
+        for i in range(len(bins) if ordem < len(pecas) else len(chapas)):
+            if i == len(chapas):
+                chapas.append([])
+                tipos_recusados.append(set())
+            if id(peca['contorno']) in tipos_recusados[i]:
+                continue
+            melhor = None
+            for rotacao in ROTACOES_NFP:
+                forma = _forma(peca, rotacao)
+                posicao = _posicao(chapas[i], bins[i], forma)
+                if posicao is not None and (melhor is None or (posicao[0] + forma.largura, posicao[1]) < (melhor[0] + melhor[2].largura, melhor[1])):
+                    melhor = (posicao[0], posicao[1], forma)
+            if melhor is None:
+                tipos_recusados[i].add(id(peca['contorno']))
+                continue
+            chapas[i].append((peca['rid'],) + melhor)
+            colocada = True
+            break
+        if not colocada:
+            nao_alocados.append(peca['rid'])
+    while chapas and not chapas[-1]:
+        chapas.pop()
+
+    cache.save()
+    logging.info(f"Nesting pela forma real: {len(pecas) + len(complementos) - len(nao_alocados)} peça(s) em {len(chapas)} chapa(s), "
+                 f"{len(nfps)} NFP(s) usados.")
+    return chapas, nao_alocados
+# --- FIM: NESTING PELA FORMA REAL ---
@@ -1,6 +1,7 @@
 # pdf_generator.py
 
 import ezdxf
+import toolpath
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
@@ -17,6 +18,9 @@ FOOTER_AREA_ALTURA = 25 * mm
 # Aumenta o tamanho de todas as fontes nos desenhos técnicos em 20%.
 FONT_SCALE_FACTOR = 1.2
 
+# Acima desse número de contornos a sequência de corte é desenhada sem os números.
+LIMITE_NUMERACAO_SEQUENCIA = 80
+
 # =============================================================================
 # FUNÇÕES UTILITÁRIAS E DE DESENHO DE COMPONENTES
 # Estas devem ser definidas ANTES das funções que as usam.
@@ -102,6 +106,15 @@ def desenhar_cota_vertical(c, y1, y2, x, texto):
     c.drawCentredString(0, -1.5*mm, texto)
     c.restoreState()
 
+def _desenhar_contorno_pdf(c, contorno, x_esquerda, y_topo, escala):
+    """Desenha o contorno de uma peça encaixada pela forma real (pontos relativos ao canto superior esquerdo)."""
+    path = c.beginPath()
+    path.moveTo(x_esquerda + contorno[0][0] * escala, y_topo - contorno[0][1] * escala)
+    for cx, cy in contorno[1:]:
+        path.lineTo(x_esquerda + cx * escala, y_topo - cy * escala)
+    path.close()
+    c.drawPath(path, stroke=1, fill=1)
+
 def _draw_dxf_entities_pdf(c, dxf_path, offset_x, offset_y, scale):
     """
     Lê um arquivo DXF e desenha suas entidades em um canvas do ReportLab.
@@ -400,6 +413,8 @@ def gerar_pdf_plano_de_corte(c, chapa_largura, chapa_altura, plano, color_map_qt
 
                 path2 = c.beginPath(); path2.moveTo(rect_x + large_base_s, rect_y); path2.lineTo(rect_x + rect_w, rect_y); path2.lineTo(rect_x + rect_w - offset_x_s, rect_y + height_s); path2.lineTo(rect_x + large_base_s, rect_y + height_s); path2.close()
                 c.drawPath(path2, stroke=1, fill=1)
+        elif forma == 'dxf_shape' and peca.get('contorno'):
+            _desenhar_contorno_pdf(c, peca['contorno'], rect_x, rect_y + rect_h, escala)
         elif forma == 'dxf_shape':
             # O offset Y precisa ser o topo do bounding box da peça
             _draw_dxf_entities_pdf(c, peca['dxf_path'], rect_x, rect_y + rect_h, escala)
@@ -524,6 +539,52 @@ def _desenhar_tabela_pecas(c, y_start, pecas_consolidadas):
 
     return y_cursor
 
+def _desenhar_tabela_projetos(c, y_start, projetos):
+    """Desenha o rateio de um nesting em lote por projeto (peças, chapas e peso)."""
+    c.setFont("Helvetica-Bold", 11)
+    c.drawString(MARGEM_GERAL, y_start, "Rateio por Projeto (Nesting em Lote)")
+    y_cursor = y_start - 5*mm
+
+    headers = ["Projeto", "Peças", "Chapas (rateio)", "Peso (kg)", "Plano(s)"]
+    col_widths = [
+        (PAGE_WIDTH - 2 * MARGEM_GERAL) * 0.30,
+        (PAGE_WIDTH - 2 * MARGEM_GERAL) * 0.12,
+        (PAGE_WIDTH - 2 * MARGEM_GERAL) * 0.18,
+        (PAGE_WIDTH - 2 * MARGEM_GERAL) * 0.15,
+        (PAGE_WIDTH - 2 * MARGEM_GERAL) * 0.25
+    ]
+
+    c.setFont("Helvetica-Bold", 9)
+    x_cursor = MARGEM_GERAL
+    for i, header in enumerate(headers):
+        c.drawString(x_cursor + 2*mm, y_cursor - 3*mm, header)
+        x_cursor += col_widths[i]
+    y_cursor -= 5*mm
+    c.line(MARGEM_GERAL, y_cursor, PAGE_WIDTH - MARGEM_GERAL, y_cursor)
+    y_cursor -= 4*mm
+
+    c.setFont("Helvetica", 8)
+    for projeto, dados in sorted(projetos.items()):
+        if y_cursor < MARGEM_GERAL + 10*mm:
+            c.showPage()
+            y_cursor = PAGE_HEIGHT - MARGEM_GERAL
+            c.setFont("Helvetica", 8)
+
+        row_data = [
+            projeto,
+            str(dados['pecas']),
+            formatar_numero(round(dados['chapas_rateadas'], 2)),
+            formatar_numero(round(dados['peso_chapas'], 2)),
+            ", ".join(str(p['plano']) for p in dados['planos'])
+        ]
+        x_cursor = MARGEM_GERAL
+        for i, data in enumerate(row_data):
+            c.drawString(x_cursor + 2*mm, y_cursor, str(data))
+            x_cursor += col_widths[i]
+        y_cursor -= 4*mm
+
+    return y_cursor - 4*mm
+
 def _desenhar_plano_unico_com_detalhes(c, y_start, plano_info, chapa_largura, chapa_altura, plano_idx, color_map):
     """
     Função auxiliar para desenhar um único plano de corte com seus detalhes em uma área específica da página.
@@ -605,6 +666,8 @@ def _desenhar_plano_unico_com_detalhes(c, y_start, plano_info, chapa_largura, ch
                 # path2.lineTo(x + w - offset_x_s, y + height_s) # Ponto sup dir
                 # path2.lineTo(x + large_base_s, y + height_s) # Ponto sup esq (coincide com sup dir do 1º)
                 c.drawPath(path2, stroke=1, fill=1)
+        elif peca.get('forma') == 'dxf_shape' and peca.get('contorno'):
+            _desenhar_contorno_pdf(c, peca['contorno'], x_origem_desenho + peca['x'] * escala, rect_y_inferior + peca['altura'] * escala, escala)
         elif peca.get('forma') == 'dxf_shape':
             # Para o PDF, o Y do offset precisa ser o topo do bounding box da peça alocada
             _draw_dxf_entities_pdf(c, peca['dxf_path'], x_origem_desenho + peca['x'] * escala, rect_y_inferior + peca['altura'] * escala, escala)
@@ -627,6 +690,40 @@ def _desenhar_plano_unico_com_detalhes(c, y_start, plano_info, chapa_largura, ch
             sobra_y_inferior = y_origem_desenho - (sobra['y'] * escala) - (sobra['altura'] * escala)
             c.rect(x_origem_desenho + sobra['x'] * escala, sobra_y_inferior, sobra['largura'] * escala, sobra['altura'] * escala, stroke=1, fill=1)
 
+    # Sequência de cortes em guilhotina: linhas tracejadas numeradas na ordem de execução.
+    cortes = plano_info.get('cortes') or []
+    if cortes:
+        c.saveState()
+        c.setStrokeColorRGB(0.85, 0.33, 0.31)
+        c.setFillColorRGB(0.85, 0.33, 0.31)
+        c.setDash(3, 2)
+        c.setFont("Helvetica", 5)
+        for corte in cortes:
+            x0, y0 = x_origem_desenho + corte['x0'] * escala, y_origem_desenho - corte['y0'] * escala
+            x1, y1 = x_origem_desenho + corte['x1'] * escala, y_origem_desenho - corte['y1'] * escala
+            c.line(x0, y0, x1, y1)
+            c.drawString((x0 + x1) / 2 + 1, (y0 + y1) / 2 + 1, str(corte['ordem']))
+        c.restoreState()
+
+    # Sequência de corte: deslocamentos rápidos pontilhados entre os pontos de entrada,
+    # numerados quando o plano tem poucos contornos para não poluir o desenho.
+    sequencia = toolpath.sequencia_do_plano(plano_info, chapa_largura, chapa_altura)
+    if sequencia['sequencia']:
+        c.saveState()
+        c.setStrokeColorRGB(0.2, 0.6, 0.3)
+        c.setFillColorRGB(0.2, 0.6, 0.3)
+        c.setLineWidth(0.3)
+        c.setDash(1, 1.5)
+        c.setFont("Helvetica", 4)
+        numerar = len(sequencia['sequencia']) <= LIMITE_NUMERACAO_SEQUENCIA
+        anterior = (x_origem_desenho, y_origem_desenho - dh)
+        for item in sequencia['sequencia']:
+            ponto = (x_origem_desenho + item['entrada'][0] * escala, y_origem_desenho - item['entrada'][1] * escala)
+            c.line(anterior[0], anterior[1], ponto[0], ponto[1])
+            if numerar:
+                c.drawString(ponto[0] + 0.5, ponto[1] + 0.5, str(item['ordem']))
+            anterior = ponto
+        c.restoreState()
 
     x_lista = (PAGE_WIDTH / 2) + (MARGEM_GERAL / 2)
     y_lista = y_cursor
@@ -670,6 +767,29 @@ def _desenhar_plano_unico_com_detalhes(c, y_start, plano_info, chapa_largura, ch
             y_lista -= 3.5*mm
     # --- FIM: ADIÇÃO DO RESUMO DE SOBRAS NO PDF ---
 
+    if cortes:
+        y_lista -= 2*mm
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(x_lista, y_lista, f"Cortes em guilhotina: {len(cortes)} ({max(corte['nivel'] for corte in cortes)} estágio(s))")
+        y_lista -= 4*mm
+        c.setFont("Helvetica", 8)
+        c.drawString(x_lista, y_lista, "Executar na ordem numerada do desenho.")
+
+    if sequencia['sequencia']:
+        y_lista -= 2*mm
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(x_lista, y_lista, f"Sequência de corte: {sequencia['perfuracoes']} perfurações")
+        y_lista -= 4*mm
+        c.setFont("Helvetica", 8)
+        c.drawString(x_lista, y_lista, f"Deslocamento rápido: {sequencia['deslocamento_rapido'] / 1000:.1f} m "
+                                       f"(sem sequenciar: {sequencia['deslocamento_original'] / 1000:.1f} m)")
+
+    corte_comum = plano_info.get('corte_comum')
+    if corte_comum:
+        y_lista -= 4*mm
+        c.drawString(x_lista, y_lista, f"Linha comum: {corte_comum['blocos']} bloco(s), "
+                                       f"{corte_comum['comprimento_economizado'] / 1000:.2f} m de corte economizados")
+
     return y_cursor - area_desenho_h - 5*mm # Retorna a nova posição Y
 
 def gerar_relatorio_completo_pdf(c, resultados_completos, chapa_largura, chapa_altura):
@@ -684,7 +804,15 @@ def gerar_relatorio_completo_pdf(c, resultados_completos, chapa_largura, chapa_a
     c.setFont("Helvetica-Bold", 16)
     c.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 12*mm, "Relatório de Aproveitamento de Chapa")
     c.setFont("Helvetica", 11)
-    c.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 19*mm, f"Dimensões da Chapa: {formatar_numero(chapa_largura)} x {formatar_numero(chapa_altura)} mm")
+    # Com estoque de vários formatos, cada plano traz a sua chapa: lista todos os formatos usados.
+    formatos = sorted({(p.get('chapa_largura', chapa_largura), p.get('chapa_altura', chapa_altura))
+                       for resultado in resultados_completos.values() for p in resultado['planos_unicos']}, reverse=True)
+    if len(formatos) > 1:
+        texto_formatos = ", ".join(f"{formatar_numero(w)} x {formatar_numero(h)}" for w, h in formatos)
+        c.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 19*mm, f"Formatos de Chapa: {texto_formatos} mm")
+    else:
+        largura, altura = formatos[0] if formatos else (chapa_largura, chapa_altura)
+        c.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 19*mm, f"Dimensões da Chapa: {formatar_numero(largura)} x {formatar_numero(altura)} mm")
     c.restoreState()
     # --- FIM: MELHORIA NO DESIGN DO CABEÇALHO ---
 
@@ -715,10 +843,13 @@ def gerar_relatorio_completo_pdf(c, resultados_completos, chapa_largura, chapa_a
         # Sumário da Espessura
         c.setFont("Helvetica", 10)
         sumario = f"Total de Chapas: {resultado['total_chapas']}   |   Aproveitamento Geral: {resultado['aproveitamento_geral']}"
+        if resultado.get('estoque'):
+            sumario += f"   |   Custo Estimado: {resultado['estoque']['custo_total']:.2f}"
         c.drawString(MARGEM_GERAL, y_cursor, sumario)
         
         # --- INÍCIO: CÁLCULO E EXIBIÇÃO DO PESO TOTAL DAS CHAPAS ---
-        peso_total_chapas_kg = (chapa_largura / 1000) * (chapa_altura / 1000) * espessura * 7.85 * resultado['total_chapas']
+        peso_total_chapas_kg = sum((p.get('chapa_largura', chapa_largura) / 1000) * (p.get('chapa_altura', chapa_altura) / 1000) * p['repeticoes']
+                                   for p in resultado['planos_unicos']) * espessura * 7.85
         c.setFont("Helvetica-Bold", 10)
         c.drawRightString(PAGE_WIDTH - MARGEM_GERAL, y_cursor, f"Peso Total das Chapas: {peso_total_chapas_kg:.2f} kg")
         # --- FIM: CÁLCULO E EXIBIÇÃO DO PESO TOTAL DAS CHAPAS ---
@@ -752,11 +883,27 @@ def gerar_relatorio_completo_pdf(c, resultados_completos, chapa_largura, chapa_a
         c.setFont("Helvetica", 9)
         c.setFillColorRGB(0, 0, 0) # Garante que o texto seja preto
         c.drawRightString(PAGE_WIDTH - MARGEM_GERAL, y_cursor, f"Perda de Corte (Offset): {offset_weight:.2f} kg")
+        # Tempo de máquina: perfurações e deslocamento rápido de todas as chapas, já sequenciadas.
+        sequencias = [(toolpath.sequencia_do_plano(p, chapa_largura, chapa_altura), p['repeticoes']) for p in resultado['planos_unicos']]
+        perfuracoes = sum(s['perfuracoes'] * rep for s, rep in sequencias)
+        deslocamento_m = sum(s['deslocamento_rapido'] * rep for s, rep in sequencias) / 1000
+        texto_maquina = f"Perfurações: {perfuracoes}   |   Deslocamento Rápido: {deslocamento_m:.1f} m"
+        economia_m = sum(p['corte_comum']['comprimento_economizado'] * p['repeticoes'] for p in resultado['planos_unicos'] if p.get('corte_comum')) / 1000
+        if economia_m:
+            texto_maquina += f"   |   Linha Comum: -{economia_m:.1f} m de corte"
+        c.drawString(MARGEM_GERAL, y_cursor, texto_maquina)
         y_cursor -= 4*mm
         c.drawRightString(PAGE_WIDTH - MARGEM_GERAL, y_cursor, f"Perda de Processo (cavacos, etc.): {demais_sucatas_peso:.2f} kg")
         y_cursor -= 8*mm
         # --- FIM: REORGANIZAÇÃO DA SEÇÃO DE PERDAS ---
 
+        # Nesting em lote: quanto de cada chapa cabe a cada projeto.
+        if resultado.get('projetos'):
+            if y_cursor < MARGEM_GERAL + 30*mm:
+                c.showPage()
+                y_cursor = PAGE_HEIGHT - MARGEM_GERAL
+            y_cursor = _desenhar_tabela_projetos(c, y_cursor, resultado['projetos'])
+
         # Desenha cada plano de corte único
         for i, plano_info in enumerate(resultado['planos_unicos']):
             # Verifica se o plano cabe na página atual, se não, cria uma nova
@@ -769,7 +916,8 @@ def gerar_relatorio_completo_pdf(c, resultados_completos, chapa_largura, chapa_a
                 c.drawString(MARGEM_GERAL, y_cursor, f"Continuação - Espessura: {espessura} mm")
                 y_cursor -= 10*mm
 
-            y_cursor = _desenhar_plano_unico_com_detalhes(c, y_cursor, plano_info, chapa_largura, chapa_altura, i, resultado['color_map'])
+            y_cursor = _desenhar_plano_unico_com_detalhes(c, y_cursor, plano_info, plano_info.get('chapa_largura', chapa_largura),
+                                                          plano_info.get('chapa_altura', chapa_altura), i, resultado['color_map'])
             
             # Linha separadora
             if i < len(resultado['planos_unicos']) - 1:
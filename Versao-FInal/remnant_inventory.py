@@ -0,0 +1,117 @@
+# remnant_inventory.py
+
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+class RemnantInventory:
+    """
+    Estoque local das sobras aproveitáveis dos nestings, em um banco SQLite.
+    Cada sobra guarda a espessura e as dimensões normalizadas (maior x menor, pois a sobra pode
+    girar); o índice parcial sobre (espessura, menor, maior) das sobras disponíveis faz a busca
+    das que servem para um job ser uma descida de índice, sem varrer o estoque.
+    """
+    def __init__(self, db_path="remnant_inventory.db"):
+        self.db_path = db_path
+
+    def _conectar(self):
+        # isolation_level=None: as transações são abertas explicitamente com BEGIN IMMEDIATE,
+        # que reserva a escrita já no início e evita que dois cálculos baixem a mesma sobra.
+        conexao = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conexao.row_factory = sqlite3.Row
+        conexao.executescript("""
+            CREATE TABLE IF NOT EXISTS sobras (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                espessura REAL NOT NULL,
+                maior REAL NOT NULL,
+                menor REAL NOT NULL,
+                origem TEXT,
+                criada_em TEXT NOT NULL,
+                consumida_em TEXT,
+                consumida_por TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_sobras_disponiveis
+                ON sobras (espessura, menor, maior) WHERE consumida_em IS NULL;
+        """)
+        return conexao
+
+    @staticmethod
+    def _agora():
+        return datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+
+    def _inserir(self, conexao, espessura, sobras, origem):
+        ids = []
+        for s in sobras:
+            maior, menor = max(s['largura'], s['altura']), min(s['largura'], s['altura'])
+            cursor = conexao.execute(
+                "INSERT INTO sobras (espessura, maior, menor, origem, criada_em) VALUES (?, ?, ?, ?, ?)",
+                (round(float(espessura), 3), round(float(maior), 3), round(float(menor), 3), origem, self._agora()))
+            ids.append(cursor.lastrowid)
+        return ids
+
+    def _baixar(self, conexao, ids, consumida_por):
+        """Marca as sobras como consumidas; retorna False se alguma já não estava disponível."""
+        if not ids:
+            return True
+        marcadores = ", ".join("?" * len(ids))
+        cursor = conexao.execute(
+            f"UPDATE sobras SET consumida_em = ?, consumida_por = ? WHERE id IN ({marcadores}) AND consumida_em IS NULL",
+            (self._agora(), consumida_por, *ids))
+        return cursor.rowcount == len(set(ids))
+
+    def registrar(self, espessura, sobras, origem=None):
+        """Guarda as sobras (dicionários com 'largura' e 'altura') e retorna os ids criados."""
+        with closing(self._conectar()) as conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            ids = self._inserir(conexao, espessura, sobras, origem)
+            conexao.execute("COMMIT")
+        return ids
+
+    def buscar(self, espessura, menor_minimo=0, maior_minimo=0, limite=None):
+        """
+        Sobras disponíveis da espessura com a dimensão menor >= 'menor_minimo' e a maior >=
+        'maior_minimo', da maior para a menor área. Retorna dicionários com 'id', 'largura'
+        (a dimensão maior), 'altura', 'espessura', 'origem' e 'criada_em'.
+        """
+        sql = ("SELECT id, espessura, maior, menor, origem, criada_em FROM sobras "
+               "WHERE espessura = ? AND menor >= ? AND maior >= ? AND consumida_em IS NULL "
+               "ORDER BY maior * menor DESC, id")
+        parametros = [round(float(espessura), 3), menor_minimo, maior_minimo]
+        if limite is not None:
+            sql += " LIMIT ?"
+            parametros.append(int(limite))
+        with closing(self._conectar()) as conexao:
+            linhas = conexao.execute(sql, parametros).fetchall()
+        return [{'id': l['id'], 'largura': l['maior'], 'altura': l['menor'], 'espessura': l['espessura'],
+                 'origem': l['origem'], 'criada_em': l['criada_em']} for l in linhas]
+
+    def consumir(self, ids, consumida_por=None):
+        """
+        Baixa as sobras de uma vez: ou todas estavam disponíveis e são marcadas como consumidas,
+        ou nada muda e o retorno é False.
+        """
+        return self.registrar_nesting(None, ids, [], consumida_por) is not None
+
+    def registrar_nesting(self, espessura, ids_consumidos, sobras_novas, origem=None):
+        """
+        Fecha um nesting em uma única transação: baixa as sobras do estoque que ele usou e
+        guarda as sobras aproveitáveis que ele deixou. Retorna os ids das sobras novas, ou None
+        (sem gravar nada) se alguma sobra usada já tinha sido consumida por outro nesting.
+        """
+        with closing(self._conectar()) as conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                if not self._baixar(conexao, list(ids_consumidos), origem):
+                    conexao.execute("ROLLBACK")
+                    return None
+                ids = self._inserir(conexao, espessura, sobras_novas, origem)
+                conexao.execute("COMMIT")
+            except sqlite3.Error:
+                conexao.execute("ROLLBACK")
+                raise
+        return ids
+
+    def clear(self):
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
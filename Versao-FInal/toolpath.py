@@ -0,0 +1,231 @@
+# toolpath.py
+
+import math
+import time
+import logging
+import numpy as np
+
+# --- INÍCIO: SEQUENCIAMENTO DE CORTE (TOOLPATH) ---
+# Ordena os contornos de um plano para o plasma/laser: furos antes do contorno externo da
+# própria peça (a peça solta da chapa ao fechar o contorno externo) e o menor deslocamento
+# rápido possível entre um contorno e o próximo. O caminho sai do vizinho mais próximo e é
+# melhorado com 2-opt; ao final escolhe o ponto de entrada de cada contorno.
+# Coordenadas em mm na chapa, origem no topo (as mesmas do plano de corte).
+
+LIMITE_PASSADAS_2OPT = 50
+TEMPO_LIMITE_2OPT = 1.0  # segundos por plano
+MAX_CANDIDATOS_ENTRADA = 24  # vértices testados como ponto de entrada em contornos longos
+
+
+def _pontos_circulo(cx, cy, r):
+    return [(cx + r, cy), (cx, cy - r), (cx - r, cy), (cx, cy + r)]
+
+
+def _contornos_externos(peca):
+    """Polilinhas (ou círculo) do contorno externo de uma peça, na mesma geometria exportada para o DXF."""
+    x, y, w, h = peca['x'], peca['y'], peca['largura'], peca['altura']
+    forma = peca.get('forma', 'rectangle')
+    if forma == 'circle':
+        return [{'circulo': (x + w / 2, y + h / 2, peca['diametro'] / 2)}]
+    if forma == 'paired_triangle':
+        return [{'pontos': [(x, y + h), (x + w, y + h), (x, y)]},
+                {'pontos': [(x + w, y), (x, y), (x + w, y + h)]}]
+    if forma == 'paired_trapezoid' and peca.get('orig_dims'):
+        dims = peca['orig_dims']
+        l_base, s_base, altura = dims['large_base'], dims['small_base'], dims['height']
+        d, base = (l_base - s_base) / 2, y + h
+        return [{'pontos': [(x, base), (x + l_base, base), (x + l_base - d, base - altura), (x + d, base - altura)]},
+                {'pontos': [(x + l_base, base), (x + w, base), (x + w - d, base - altura), (x + l_base, base - altura)]}]
+    if forma == 'dxf_shape' and peca.get('contorno'):
+        return [{'pontos': [(x + cx, y + cy) for cx, cy in peca['contorno']]}]
+    caixa = [(x, y + h), (x + w, y + h), (x + w, y), (x, y)]
+    if forma == 'rectangle':
+        return [{'pontos': caixa}]
+    # Formas sem geometria no plano (DXF sem contorno real, triângulo ou trapézio sem par):
+    # a peça conta uma perfuração e a estimativa usa o bounding box.
+    return [{'pontos': None, 'caixa': caixa}]
+
+
+def _contorno_do_bloco(membros):
+    """
+    Bloco de linha comum: um contorno externo em volta de todas as peças e, no meio de cada
+    vão de kerf entre colunas e entre linhas, uma linha de ponta a ponta cortada uma vez só.
+    """
+    x0, y0 = min(m['x'] for m in membros), min(m['y'] for m in membros)
+    x1, y1 = max(m['x'] + m['largura'] for m in membros), max(m['y'] + m['altura'] for m in membros)
+    linhas = []
+    for inicio, fim, vertical in (('x', 'largura', True), ('y', 'altura', False)):
+        faixas = sorted({(round(m[inicio], 6), round(m[inicio] + m[fim], 6)) for m in membros})
+        for (_, fim_anterior), (proximo, _) in zip(faixas, faixas[1:]):
+            meio = (fim_anterior + proximo) / 2
+            linhas.append(((meio, y0), (meio, y1)) if vertical else ((x0, meio), (x1, meio)))
+    return {'pontos': [(x0, y1), (x1, y1), (x1, y0), (x0, y0)], 'linhas': linhas}
+
+
+def contornos_do_plano(plano):
+    """
+    Lista os contornos de corte de um plano. Cada item traz o índice da peça no plano, o tipo
+    ('furo' ou 'externo'), a geometria ('pontos' ou 'circulo', None quando só existe no DXF de
+    origem; 'linhas' com as linhas comuns de um bloco) e os pontos candidatos a entrada da tocha.
+    As peças de um bloco de linha comum (chave 'bloco') viram um contorno só: as linhas comuns
+    partem do corte externo, sem perfuração própria, e o deslocamento entre elas não é contado.
+    """
+    contornos, blocos = [], {}
+    for indice, peca in enumerate(plano):
+        if peca.get('bloco') is not None:
+            blocos.setdefault(peca['bloco'], []).append(indice)
+    for indice, peca in enumerate(plano):
+        # Os furos de todas as peças de um bloco vêm antes do contorno do bloco.
+        membros = blocos.get(peca.get('bloco'))
+        grupo = membros[0] if membros else indice
+        for furo in peca.get('furos') or []:
+            cx, cy, r = peca['x'] + furo['x'], peca['y'] + furo['y'], furo['diam'] / 2
+            contornos.append({'peca': grupo, 'tipo': 'furo', 'pontos': None, 'circulo': (cx, cy, r), 'linhas': [],
+                              'candidatos': _pontos_circulo(cx, cy, r)})
+        if membros:
+            if indice == grupo:
+                bloco = _contorno_do_bloco([plano[i] for i in membros])
+                contornos.append({'peca': grupo, 'tipo': 'externo', 'pontos': bloco['pontos'], 'circulo': None,
+                                  'linhas': bloco['linhas'], 'candidatos': bloco['pontos']})
+            continue
+        for externo in _contornos_externos(peca):
+            if 'circulo' in externo:
+                candidatos = _pontos_circulo(*externo['circulo'])
+            else:
+                vertices = externo['pontos'] or externo['caixa']
+                passo = max(1, math.ceil(len(vertices) / MAX_CANDIDATOS_ENTRADA))
+                candidatos = vertices[::passo]
+            contornos.append({'peca': indice, 'tipo': 'externo', 'pontos': externo.get('pontos'),
+                              'circulo': externo.get('circulo'), 'linhas': [], 'candidatos': candidatos})
+    return contornos
+
+
+def _comprimento_caminho(pontos, origem):
+    if not len(pontos):
+        return 0.0
+    caminho = np.vstack([origem, pontos])
+    return float(np.hypot(*np.diff(caminho, axis=0).T).sum())
+
+
+def _vizinho_mais_proximo(contornos, origem):
+    """Caminho guloso: a cada passo vai ao candidato liberado mais próximo (externo só depois dos furos da peça)."""
+    pecas = np.array([c['peca'] for c in contornos])
+    furo = np.array([c['tipo'] == 'furo' for c in contornos])
+    furos_pendentes = np.bincount(pecas[furo], minlength=pecas.max() + 1)
+    candidatos = np.array([p for c in contornos for p in c['candidatos']], dtype=float)
+    dono = np.repeat(np.arange(len(contornos)), [len(c['candidatos']) for c in contornos])
+    liberado = furo | (furos_pendentes[pecas] == 0)
+    ordem, pontos = [], []
+    atual = np.asarray(origem, dtype=float)
+    for _ in range(len(contornos)):
+        distancias = np.hypot(*(candidatos - atual).T)
+        distancias[~liberado[dono]] = np.inf
+        k = int(distancias.argmin())
+        i = int(dono[k])
+        liberado[i] = False
+        ordem.append(i)
+        pontos.append(candidatos[k])
+        if furo[i]:
+            furos_pendentes[pecas[i]] -= 1
+            if not furos_pendentes[pecas[i]]:
+                liberado |= (pecas == pecas[i]) & ~furo
+        atual = candidatos[k]
+    return ordem, np.array(pontos, dtype=float)
+
+
+def _limites_precedencia(pecas, furo, ordem):
+    """
+    Para cada início s de segmento, a primeira posição cuja inversão de [s..j] colocaria um
+    contorno externo antes de um furo da mesma peça: inverter é válido só para j abaixo dela.
+    """
+    n = len(ordem)
+    pecas_ordem, furo_ordem = pecas[ordem], furo[ordem]
+    posicoes = np.arange(n)
+    ultimo_furo = np.full(pecas.max() + 1, -1)
+    np.maximum.at(ultimo_furo, pecas_ordem[furo_ordem], posicoes[furo_ordem])
+    externos = ~furo_ordem & (ultimo_furo[pecas_ordem] >= 0)
+    # Um segmento que começa em s <= último furo e vai até o externo contém os dois.
+    limite_no_furo = np.full(n, n)
+    np.minimum.at(limite_no_furo, ultimo_furo[pecas_ordem[externos]], posicoes[externos])
+    return np.minimum.accumulate(limite_no_furo[::-1])[::-1]
+
+
+def _dois_opt(contornos, ordem, pontos, origem, tempo_limite):
+    """Inverte segmentos do caminho aberto enquanto encurtar o deslocamento, respeitando furos antes do externo."""
+    n = len(ordem)
+    if n < 3:
+        return ordem, pontos
+    pecas = np.array([c['peca'] for c in contornos])
+    furo = np.array([c['tipo'] == 'furo' for c in contornos])
+    ordem, pontos = np.array(ordem), pontos.copy()
+    inicio = time.monotonic()
+    for _ in range(LIMITE_PASSADAS_2OPT):
+        melhorou = False
+        limites = _limites_precedencia(pecas, furo, ordem)
+        for s in range(n - 1):
+            # Inverte ordem[s..j]; 'a' é o ponto antes do segmento (a origem quando s == 0).
+            a = pontos[s - 1] if s > 0 else origem
+            j = np.arange(s + 1, min(n, limites[s]))
+            if not len(j):
+                continue
+            d_a_s = math.hypot(*(pontos[s] - a))
+            d_a_j = np.hypot(*(pontos[j] - a).T)
+            seguintes = np.minimum(j + 1, n - 1)
+            d_j_prox = np.where(j + 1 < n, np.hypot(*(pontos[j] - pontos[seguintes]).T), 0.0)
+            d_s_prox = np.where(j + 1 < n, np.hypot(*(pontos[s] - pontos[seguintes]).T), 0.0)
+            ganho = (d_a_s + d_j_prox) - (d_a_j + d_s_prox)
+            k = int(ganho.argmax())
+            if ganho[k] > 1e-9:
+                fim = int(j[k])
+                ordem[s:fim + 1] = ordem[s:fim + 1][::-1]
+                pontos[s:fim + 1] = pontos[s:fim + 1][::-1]
+                limites = _limites_precedencia(pecas, furo, ordem)
+                melhorou = True
+            if time.monotonic() - inicio > tempo_limite:
+                return ordem.tolist(), pontos
+        if not melhorou:
+            break
+    return ordem.tolist(), pontos
+
+
+def sequenciar_plano(plano, chapa_largura, chapa_altura, origem=None, tempo_limite=TEMPO_LIMITE_2OPT):
+    """
+    Sequencia os contornos de um plano de corte. A tocha parte de 'origem' (padrão: canto
+    inferior esquerdo da chapa, a origem da máquina) e o retorno ao final não é contado.
+    Retorna um dicionário com a ordem de corte (cada item com 'ordem', 'peca', 'tipo',
+    geometria e 'entrada'), o número de perfurações e o deslocamento rápido em mm, junto
+    com o deslocamento da ordem original do plano para comparação.
+    """
+    origem = np.asarray(origem if origem is not None else (0.0, chapa_altura), dtype=float)
+    contornos = contornos_do_plano(plano)
+    if not contornos:
+        return {'sequencia': [], 'perfuracoes': 0, 'deslocamento_rapido': 0.0, 'deslocamento_original': 0.0}
+
+    # Referência: ordem do plano, furos antes do externo, entrando sempre no primeiro candidato.
+    original = _comprimento_caminho(np.array([c['candidatos'][0] for c in contornos], dtype=float), origem)
+
+    ordem, pontos = _vizinho_mais_proximo(contornos, origem)
+    ordem, pontos = _dois_opt(contornos, ordem, pontos, origem, tempo_limite)
+
+    # Com a ordem fixada, cada contorno entra pelo candidato mais próximo da saída do anterior.
+    sequencia, atual = [], origem
+    for posicao, i in enumerate(ordem):
+        c = contornos[i]
+        candidatos = np.asarray(c['candidatos'], dtype=float)
+        entrada = candidatos[int(np.hypot(*(candidatos - atual).T).argmin())]
+        sequencia.append({'ordem': posicao + 1, 'peca': c['peca'], 'tipo': c['tipo'], 'pontos': c['pontos'],
+                          'circulo': c['circulo'], 'linhas': c['linhas'], 'entrada': (float(entrada[0]), float(entrada[1]))})
+        atual = entrada
+    deslocamento = _comprimento_caminho(np.array([item['entrada'] for item in sequencia]), origem)
+    logging.debug(f"Toolpath: {len(sequencia)} contornos, deslocamento rápido {deslocamento:.0f} mm (ordem original {original:.0f} mm).")
+    return {'sequencia': sequencia, 'perfuracoes': len(sequencia),
+            'deslocamento_rapido': deslocamento, 'deslocamento_original': original}
+
+
+def sequencia_do_plano(plano_info, chapa_largura=None, chapa_altura=None):
+    """Sequência do plano, calculada na primeira vez e guardada em plano_info['sequencia_corte']."""
+    if plano_info.get('sequencia_corte') is None:
+        plano_info['sequencia_corte'] = sequenciar_plano(plano_info['plano'], plano_info.get('chapa_largura', chapa_largura),
+                                                         plano_info.get('chapa_altura', chapa_altura))
+    return plano_info['sequencia_corte']
+# --- FIM: SEQUENCIAMENTO DE CORTE (TOOLPATH) ---
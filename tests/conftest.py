@@ -0,0 +1,7 @@
+# conftest.py
+
+import os
+import sys
+
+# Os módulos do programa ficam em Versao-FInal e são importados pelo nome, como no main.py.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Versao-FInal'))
@@ -0,0 +1,49 @@
+# test_catalogo.py
+
+import os
+import pytest
+import calculo_cortes
+
+CATALOGO = [{'largura': 3000, 'altura': 1500, 'custo_kg': 1.0}, {'largura': 2000, 'altura': 1000, 'custo_kg': 1.0}]
+
+
+@pytest.fixture(autouse=True)
+def ambiente(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 1)
+
+
+def _calcular(pecas, catalogo=CATALOGO):
+    return calculo_cortes.orquestrar_planos_de_corte(3000, 1500, pecas, 10, 10, 5, usar_cache=False, usar_historico_algoritmos=False,
+                                                     catalogo_chapas=catalogo)
+
+
+def _peca(largura, altura, quantidade):
+    return {'forma': 'rectangle', 'largura': largura, 'altura': altura, 'quantidade': quantidade, 'furos': []}
+
+
+def test_job_pequeno_vai_para_a_chapa_menor():
+    estoque = _calcular([_peca(900, 450, 4)])['estoque']
+
+    assert estoque['mistura_escolhida'] == '2000x1000'
+    assert estoque['chapas_por_formato'] == {'2000x1000': 1}
+    # Custo = peso da chapa (m² x espessura x peso específico) vezes o custo por kg.
+    assert estoque['custo_total'] == pytest.approx(2.0 * 5 * 7.85)
+
+
+def test_cauda_em_chapa_menor_sai_mais_barata():
+    resultado = _calcular([_peca(1400, 700, 9)])
+    estoque = resultado['estoque']
+
+    assert estoque['mistura_escolhida'] == '2x 3000x1500 + 2000x1000'
+    assert estoque['chapas_por_formato'] == {'3000x1500': 2, '2000x1000': 1}
+    custos = {m['nome']: m['custo'] for m in estoque['misturas_avaliadas']}
+    assert estoque['custo_total'] == min(custos.values())
+    formatos = sorted((p['chapa_largura'], p['chapa_altura'], p['repeticoes']) for p in resultado['planos_unicos'])
+    assert sum(r for *_, r in formatos) == resultado['total_chapas'] == 3
+
+
+def test_custo_por_kg_decide_entre_os_formatos():
+    catalogo = [dict(CATALOGO[0], custo_kg=0.1), CATALOGO[1]]
+    estoque = _calcular([_peca(900, 450, 4)], catalogo)['estoque']
+    assert estoque['mistura_escolhida'] == '3000x1500'
@@ -0,0 +1,74 @@
+# test_corte_comum.py
+
+import os
+import random
+import pytest
+import calculo_cortes
+
+
+@pytest.fixture(autouse=True)
+def um_processo(monkeypatch):
+    # Busca sequencial: o teste fica determinístico e não sobe o pool de processos.
+    monkeypatch.setattr(os, 'cpu_count', lambda: 1)
+
+
+def _total_chapas(pecas, **opcoes):
+    resultado = calculo_cortes.orquestrar_planos_de_corte(3000, 1500, pecas, 10, 10, 5, usar_cache=False,
+                                                          usar_historico_algoritmos=False, **opcoes)
+    return resultado['total_chapas'], resultado
+
+
+def test_blocos_enchem_a_chapa_como_o_padrao_sem_linha_comum():
+    # 510x310 com offset: a grade pura leva 20 por chapa e o padrão em regiões leva 25.
+    grades = calculo_cortes._grades_da_chapa(2980, 1480, {'largura': 510, 'altura': 310}, 10, 2)
+    assert sum(colunas * linhas for colunas, linhas in grades) >= len(calculo_cortes._padrao_grade(2980, 1480, 510, 310))
+
+
+def test_linha_comum_nao_aumenta_as_chapas_do_job_homogeneo():
+    pecas = [{'forma': 'rectangle', 'largura': 510, 'altura': 310, 'quantidade': 100, 'furos': []}]
+    sem_blocos, _ = _total_chapas(pecas)
+    com_blocos, resultado = _total_chapas(pecas, corte_comum=True)
+    assert com_blocos <= sem_blocos == 4
+    assert sum(p['corte_comum']['blocos'] * p['repeticoes'] for p in resultado['planos_unicos'] if p['corte_comum']) > 0
+
+
+@pytest.mark.parametrize('semente', [0, 5, 6, 12])
+def test_linha_comum_nao_aumenta_as_chapas_de_jobs_mistos(semente):
+    aleatorio = random.Random(semente)
+    pecas = [{'forma': 'rectangle', 'largura': aleatorio.randint(100, 900) + 10, 'altura': aleatorio.randint(100, 600) + 10,
+              'quantidade': aleatorio.randint(2, 40), 'furos': []} for _ in range(aleatorio.randint(1, 5))]
+    sem_blocos, _ = _total_chapas(pecas)
+    com_blocos, _ = _total_chapas(pecas, corte_comum=True)
+    assert com_blocos <= sem_blocos
+
+
+def test_plano_sem_blocos_fica_quando_os_blocos_custam_chapas(monkeypatch):
+    # Blocos de uma linha só desperdiçam a chapa; o job refeito sem os blocos tem que vencer.
+    monkeypatch.setattr(calculo_cortes, '_grades_da_chapa', lambda *args: [(2, 1)])
+    pecas = [{'forma': 'rectangle', 'largura': 510, 'altura': 310, 'quantidade': 100, 'furos': []}]
+    com_blocos, resultado = _total_chapas(pecas, corte_comum=True)
+    assert com_blocos == 4
+    assert resultado['estatisticas_busca']['corte_comum_descartado']
+
+
+def test_conferencia_sem_blocos_so_procura_contagens_menores(monkeypatch):
+    # A conferência recebe só as chapas abaixo da contagem com blocos: não refaz a busca inteira.
+    monkeypatch.setattr(calculo_cortes, '_grades_da_chapa', lambda *args: [(2, 1)])
+    calcular = calculo_cortes.calcular_plano_de_corte_em_bins
+    chamadas = []
+
+    def espiao(pecas, offset, espessura, bins, *args, **opcoes):
+        resultado = calcular(pecas, offset, espessura, bins, *args, **opcoes)
+        chamadas.append((opcoes.get('corte_comum'), len(bins), resultado['total_chapas']))
+        return resultado
+
+    monkeypatch.setattr(calculo_cortes, 'calcular_plano_de_corte_em_bins', espiao)
+    pecas = [{'forma': 'rectangle', 'largura': 510, 'altura': 310, 'quantidade': 100, 'furos': []}]
+    _total_chapas(pecas, corte_comum=True)
+
+    # A conferência roda dentro da busca com blocos, então termina antes dela.
+    (sem_blocos, chapas_conferencia, total_conferencia), (com_blocos, chapas_job, total_final) = chamadas
+    assert sem_blocos is False and com_blocos is True
+    # Os blocos de uma linha só levam 5 chapas: a conferência só tem 4 e acha o plano de 4.
+    assert chapas_conferencia == 4 < chapas_job
+    assert total_conferencia == total_final == 4
@@ -0,0 +1,50 @@
+# test_escala_inteira.py
+
+import os
+import numpy as np
+import pytest
+import calculo_cortes
+
+
+@pytest.fixture(autouse=True)
+def sem_pool(monkeypatch):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 1)
+
+
+def _peca(largura, altura, quantidade):
+    return {'forma': 'rectangle', 'largura': largura, 'altura': altura, 'quantidade': quantidade, 'furos': []}
+
+
+def test_chapa_escalada_nao_perde_area_util():
+    # 12.3 * 100 vira 1230.0000000000002 em ponto flutuante: o arredondamento prévio evita 1231.
+    assert calculo_cortes._inteiro_acima(12.3, 100) == 1230
+    largura, altura, margem = calculo_cortes._escalar_bid((3000, 1500, 10.004), 100)
+    # Área útil de 2979.992 x 1479.992 mm: arredonda para cima, como as peças.
+    assert (largura - 2 * margem, altura - 2 * margem) == (298_000, 148_000)
+    # O id de uma sobra do estoque passa adiante.
+    assert calculo_cortes._escalar_bid((1000, 800, 0, 7), 100) == (100_000, 80_000, 0, 7)
+
+
+def test_peca_do_tamanho_da_area_util_cabe():
+    resultado = calculo_cortes.calcular_plano_de_corte_em_bins([_peca(1490, 2990, 1)], 10, 5, [(3000, 1500, 5)] * 3, escala_inteira=100)
+
+    (plano,) = resultado['planos_unicos']
+    assert resultado['total_chapas'] == 1
+    assert (plano['plano'][0]['largura'], plano['plano'][0]['altura']) == (2980, 1480)
+
+
+def test_planos_voltam_com_as_medidas_exatas():
+    pecas = [_peca(510.37, 310.71, 13), _peca(200.15, 100.05, 9)]
+    resultado = calculo_cortes.calcular_plano_de_corte_em_bins(pecas, 10, 5, [(3000, 1500, 10)] * 3, escala_inteira=100)
+
+    medidas = {tuple(sorted((p['largura'], p['altura']))) for plano in resultado['planos_unicos'] for p in plano['plano']}
+    assert medidas == {(300.71, 500.37), (90.05, 190.15)}
+    assert resultado['estatisticas_busca']['escala_inteira'] == 100
+
+
+def test_sobras_fundidas_em_inteiros_voltam_em_mm():
+    sobras = calculo_cortes.encontrar_sobras(100_000, 50_000, np.array([[0, 0, 33_333, 50_000], [33_333, 0, 10_000, 25_000]]), escala=100)
+
+    medidas = sorted((s['x'], s['y'], s['largura'], s['altura']) for s in sobras)
+    # Sem resíduo de ponto flutuante: 333.33 + 666.67 fecha a chapa exatamente.
+    assert medidas == [(333.33, 0.0, 666.67, 250.0), (433.33, 250.0, 566.67, 250.0)]
@@ -0,0 +1,38 @@
+# test_fluxo.py
+
+import os
+import pytest
+import calculo_cortes
+
+
+@pytest.fixture(autouse=True)
+def sem_pool(monkeypatch):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 1)
+
+
+def _peca(largura, altura, quantidade):
+    return {'forma': 'rectangle', 'largura': largura, 'altura': altura, 'quantidade': quantidade, 'furos': []}
+
+
+def test_tabela_acha_o_tipo_sem_array_por_peca():
+    tipos = [{'largura_com_offset': w, 'altura_com_offset': 10, 'largura_sem_offset': w, 'altura_sem_offset': 10} for w in (10, 20, 30)]
+    tabela = calculo_cortes.TabelaPecas(tipos, [2, 0, 3])
+
+    assert len(tabela) == 5
+    # O tipo sem peças é pulado: os rids 2 a 4 são do terceiro tipo.
+    assert [tabela[rid]['largura_com_offset'] for rid in range(5)] == [10, 10, 30, 30, 30]
+    assert tabela.area_real([0, 4]) == 10 * 10 + 30 * 10
+
+
+def test_parciais_espacadas_pelo_crescimento_das_chapas(monkeypatch):
+    monkeypatch.setattr(calculo_cortes, 'INTERVALO_PARCIAIS_FLUXO', 0)
+    parciais = []
+    resultado = calculo_cortes.calcular_plano_de_corte_em_bins([_peca(1400, 700, 120)], 10, 5, [(3000, 1500, 10)] * 60, modo_fluxo=True,
+                                                               resultado_parcial_callback=parciais.append)
+
+    chapas = [p['total_chapas'] for p in parciais]
+    assert resultado['total_chapas'] == 30 and chapas
+    # Cada entrega espera as chapas crescerem pelo fator; a primeira sai logo na primeira chapa.
+    assert chapas[0] == 1
+    assert all(b >= a * calculo_cortes.FATOR_PARCIAIS_FLUXO for a, b in zip(chapas, chapas[1:]))
+    assert all(p['estatisticas_busca']['parcial'] for p in parciais)
@@ -0,0 +1,37 @@
+# test_grade_analitica.py
+
+import itertools
+import math
+import os
+import pytest
+import calculo_cortes
+
+
+@pytest.fixture(autouse=True)
+def sem_pool(monkeypatch):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 1)
+
+
+def _sobrepoem(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+@pytest.mark.parametrize('largura, altura, w, h', [(3000, 1500, 510, 310), (2980, 1480, 520, 320), (1000, 1000, 300, 200)])
+def test_padrao_em_blocos_supera_a_grade_pura(largura, altura, w, h):
+    posicoes = calculo_cortes._padrao_grade(largura, altura, w, h)
+
+    assert len(posicoes) > calculo_cortes._melhor_grade_pura(largura, altura, w, h)[0]
+    assert all(sorted((p, q)) == sorted((w, h)) for _, _, p, q in posicoes)
+    assert all(x >= 0 and y >= 0 and x + p <= largura and y + q <= altura for x, y, p, q in posicoes)
+    assert not any(_sobrepoem(a, b) for a, b in itertools.combinations(posicoes, 2))
+
+
+def test_job_homogeneo_sai_da_grade_com_so_a_cauda_no_rectpack():
+    pecas = [{'forma': 'rectangle', 'largura': 510, 'altura': 310, 'quantidade': 160, 'furos': []}]
+    resultado = calculo_cortes.calcular_plano_de_corte_em_bins(pecas, 0, 5, [(3000, 1500, 0)] * 50)
+
+    assert resultado['estatisticas_busca']['algoritmo_vencedor'] == 'GradeAnalitica'
+    assert resultado['total_chapas'] == math.ceil(160 / len(calculo_cortes._padrao_grade(3000, 1500, 510, 310)))
+    assert sum(len(plano['plano']) * plano['repeticoes'] for plano in resultado['planos_unicos']) == 160
+    # As chapas cheias repetem o mesmo padrão: um plano com repetições e, no máximo, a cauda.
+    assert len(resultado['planos_unicos']) <= 2
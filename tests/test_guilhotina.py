@@ -0,0 +1,54 @@
+# test_guilhotina.py
+
+import os
+import pytest
+import calculo_cortes
+
+
+@pytest.fixture(autouse=True)
+def ambiente(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 1)
+
+
+def _peca(largura, altura, quantidade):
+    return {'forma': 'rectangle', 'largura': largura, 'altura': altura, 'quantidade': quantidade, 'furos': []}
+
+
+def test_arvore_de_um_layout_em_faixas():
+    # Duas faixas verticais; a da esquerda com duas peças empilhadas.
+    cortes = calculo_cortes._arvore_de_cortes([(0, 0, 60, 40), (0, 40, 60, 60), (60, 0, 40, 100)], 100, 100)
+
+    assert [(c['ordem'], c['nivel'], c['pai'], c['orientacao']) for c in cortes] == [(1, 1, None, 'vertical'), (2, 2, 1, 'horizontal')]
+    assert (cortes[0]['x0'], cortes[0]['y0'], cortes[0]['x1'], cortes[0]['y1']) == (60, 0, 60, 100)
+    # O corte do segundo estágio vai de ponta a ponta só dentro da faixa que o primeiro soltou.
+    assert (cortes[1]['x0'], cortes[1]['y0'], cortes[1]['x1'], cortes[1]['y1']) == (0, 40, 60, 40)
+
+
+def test_catavento_nao_e_guilhotinavel():
+    catavento = [(0, 0, 2, 1), (2, 0, 1, 2), (1, 2, 2, 1), (0, 1, 1, 2), (1, 1, 1, 1)]
+    assert calculo_cortes._arvore_de_cortes(catavento, 3, 3) is None
+    assert not calculo_cortes._guilhotinavel((5, 5, 1), catavento)
+
+
+def test_peca_unica_do_tamanho_da_area_nao_precisa_de_corte():
+    assert calculo_cortes._arvore_de_cortes([(0, 0, 100, 50)], 100, 50) == []
+
+
+def test_modo_guilhotina_traz_os_cortes_em_todos_os_planos():
+    pecas = [_peca(700, 400, 9), _peca(450, 300, 14), _peca(1100, 250, 6)]
+    resultado = calculo_cortes.orquestrar_planos_de_corte(3000, 1500, pecas, 10, 10, 5, usar_cache=False, usar_historico_algoritmos=False,
+                                                          guilhotina=True)
+
+    assert resultado['planos_unicos']
+    for plano in resultado['planos_unicos']:
+        assert plano['cortes'] is not None
+        ordens = [c['ordem'] for c in plano['cortes']]
+        assert ordens == list(range(1, len(ordens) + 1))
+        # Todo corte pai vem antes dos filhos e os cortes ficam dentro da área útil da chapa.
+        assert all(c['pai'] is None or c['pai'] < c['ordem'] for c in plano['cortes'])
+        for c in plano['cortes']:
+            for x in (c['x0'], c['x1']):
+                assert plano['margin'] - 1e-6 <= x <= plano['chapa_largura'] - plano['margin'] + 1e-6
+            for y in (c['y0'], c['y1']):
+                assert plano['margin'] - 1e-6 <= y <= plano['chapa_altura'] - plano['margin'] + 1e-6
@@ -0,0 +1,50 @@
+# test_incremental.py
+
+import os
+import pytest
+import calculo_cortes
+
+
+@pytest.fixture(autouse=True)
+def sem_pool(monkeypatch):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 1)
+
+
+def _peca(largura, altura, quantidade):
+    return {'forma': 'rectangle', 'largura': largura, 'altura': altura, 'quantidade': quantidade, 'furos': []}
+
+
+PECAS = [_peca(1200, 700, 6), _peca(800, 600, 8), _peca(600, 400, 10), _peca(450, 300, 12), _peca(900, 350, 6)]
+
+
+def _calcular(pecas, **opcoes):
+    return calculo_cortes.orquestrar_planos_de_corte(3000, 1500, pecas, 10, 10, 5, usar_cache=False, usar_historico_algoritmos=False, **opcoes)
+
+
+def _layout(plano):
+    return sorted((p['x'], p['y'], p['largura'], p['altura']) for p in plano['plano'])
+
+
+@pytest.fixture
+def anterior():
+    return _calcular(PECAS)
+
+
+def test_job_sem_mudanca_devolve_o_resultado_anterior(anterior):
+    assert _calcular([dict(p) for p in PECAS], resultado_anterior=anterior) is anterior
+
+
+def test_peca_acrescentada_mantem_as_chapas_nao_afetadas(anterior):
+    resultado = _calcular(PECAS + [_peca(300, 300, 2)], resultado_anterior=anterior)
+    incremental = resultado['estatisticas_busca']['incremental']
+
+    assert incremental is not None and incremental['chapas_mantidas'] >= 1
+    assert sum(len(p['plano']) * p['repeticoes'] for p in resultado['planos_unicos']) == 44
+    layouts_anteriores = [_layout(p) for p in anterior['planos_unicos']]
+    mantidos = sum(p['repeticoes'] for p in resultado['planos_unicos'] if _layout(p) in layouts_anteriores)
+    assert mantidos >= incremental['chapas_mantidas']
+
+
+def test_outras_opcoes_de_busca_refazem_o_job(anterior):
+    resultado = _calcular(PECAS + [_peca(300, 300, 2)], resultado_anterior=anterior, guilhotina=True)
+    assert resultado['estatisticas_busca']['incremental'] is None
@@ -0,0 +1,63 @@
+# test_limite_inferior.py
+
+import os
+import pytest
+import calculo_cortes
+
+CHAPA = (3000, 1500, 0)
+
+
+@pytest.fixture(autouse=True)
+def sem_pool(monkeypatch):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 1)
+
+
+def _peca(largura, altura, quantidade):
+    return {'forma': 'rectangle', 'largura': largura, 'altura': altura, 'quantidade': quantidade, 'furos': []}
+
+
+def _calcular(pecas):
+    return calculo_cortes.calcular_plano_de_corte_em_bins(pecas, 0, 5, [CHAPA] * 50)
+
+
+def test_limite_de_area():
+    assert calculo_cortes._limite_inferior_chapas([(1000, 500, i) for i in range(10)], [CHAPA] * 10) == 2
+
+
+def test_limite_dimensional_de_pecas_maiores_que_meia_chapa():
+    # Cinco peças maiores que meia chapa nos dois eixos: uma por chapa, embora a área peça só duas.
+    assert calculo_cortes._limite_inferior_chapas([(1600, 800, i) for i in range(5)], [CHAPA] * 10) == 5
+
+
+def test_busca_no_limite_inferior_para_no_primeiro_pack_viavel():
+    resultado = _calcular([_peca(1000, 500, 20), _peca(500, 500, 20)])
+    estatisticas = resultado['estatisticas_busca']
+
+    assert resultado['total_chapas'] == estatisticas['limite_inferior'] == 4
+    # Sem o limite, a busca testaria 1, 2 e 3 chapas com o portfólio inteiro antes de chegar a 4.
+    assert estatisticas['packs_executados'] <= len(calculo_cortes.ALGORITMOS_PORTFOLIO)
+
+
+def test_galope_e_bissecao_acima_do_limite():
+    # Só três peças de 1100x800 cabem por chapa, mas a área comporta cinco.
+    resultado = _calcular([_peca(1100, 800, 8), _peca(1100, 790, 7)])
+
+    assert resultado['estatisticas_busca']['limite_inferior'] == 3
+    assert resultado['total_chapas'] == 5
+
+
+def test_packs_dos_atalhos_sao_contados():
+    resultado = _calcular([_peca(510, 310, 100)])
+    estatisticas = resultado['estatisticas_busca']
+
+    assert estatisticas['algoritmo_vencedor'] == 'GradeAnalitica'
+    assert estatisticas['packs_executados'] > 0
+
+
+def test_limite_informado_soma_as_chapas_fixas():
+    pecas = [_peca(100 + 37 * i, 100 + 23 * i, 100) for i in range(12)]
+    resultado = calculo_cortes.calcular_plano_de_corte_em_bins(pecas, 10, 5, [(3000, 1500, 10)] * 200)
+    estatisticas = resultado['estatisticas_busca']
+
+    assert estatisticas['chapas_fixas'] > 0
+    assert estatisticas['chapas_fixas'] < estatisticas['limite_inferior'] <= resultado['total_chapas']
@@ -0,0 +1,56 @@
+# test_lote_projetos.py
+
+import os
+import pytest
+import calculo_cortes
+
+
+@pytest.fixture(autouse=True)
+def ambiente(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 1)
+
+
+def _peca(largura, altura, quantidade, projeto, forma='rectangle'):
+    return {'forma': forma, 'largura': largura, 'altura': altura, 'quantidade': quantidade, 'furos': [], 'project_number': projeto}
+
+
+def _calcular(pecas):
+    return calculo_cortes.orquestrar_planos_de_corte(3000, 1500, pecas, 10, 10, 5, usar_cache=False, usar_historico_algoritmos=False)
+
+
+def test_rateio_proporcional_a_area_ocupada():
+    def peca(largura, projeto):
+        return {'forma': 'rectangle', 'largura': largura, 'altura': 100, 'tipo_key': f'R {largura}x100', 'project_number': projeto}
+    resultado = {'planos_unicos': [
+        {'chapa_largura': 1000, 'chapa_altura': 1000, 'repeticoes': 2, 'plano': [peca(300, 'A'), peca(100, 'B')]},
+        {'chapa_largura': 1000, 'chapa_altura': 1000, 'repeticoes': 1, 'plano': [peca(200, None)]},
+    ]}
+    projetos = calculo_cortes.dividir_resultado_por_projeto(resultado, 5)
+
+    assert projetos['A']['chapas_rateadas'] == pytest.approx(1.5)
+    assert projetos['B']['chapas_rateadas'] == pytest.approx(0.5)
+    assert projetos['Sem projeto']['chapas_rateadas'] == pytest.approx(1.0)
+    assert projetos['A']['peso_chapas'] == pytest.approx(1.5 * 5 * 7.85)
+    assert projetos['A']['planos'] == [{'plano': 1, 'pecas_por_chapa': 1, 'repeticoes': 2}]
+    assert projetos['B']['resumo_pecas'] == [{'tipo': 'R 100x100', 'qtd': 2}]
+
+
+def test_lote_sai_separado_por_projeto():
+    resultado = _calcular([_peca(1000, 500, 4, 'A'), _peca(500, 500, 6, 'B')])
+    projetos = resultado['projetos']
+
+    assert set(projetos) == {'A', 'B'}
+    assert (projetos['A']['pecas'], projetos['B']['pecas']) == (4, 6)
+    assert sum(p['chapas_rateadas'] for p in projetos.values()) == pytest.approx(resultado['total_chapas'])
+    # Cada peça posicionada continua marcada com o projeto de origem.
+    assert {p['project_number'] for plano in resultado['planos_unicos'] for p in plano['plano']} == {'A', 'B'}
+
+
+def test_job_de_um_projeto_nao_e_dividido():
+    assert 'projetos' not in _calcular([_peca(1000, 500, 4, 'A')])
+
+
+def test_triangulos_de_projetos_diferentes_nao_formam_par():
+    projetos = _calcular([_peca(600, 400, 1, 'A', 'right_triangle'), _peca(600, 400, 1, 'B', 'right_triangle')])['projetos']
+    assert (projetos['A']['pecas'], projetos['B']['pecas']) == (1, 1)
@@ -0,0 +1,69 @@
+# test_nesting_cache.py
+
+import os
+import pytest
+import calculo_cortes
+from nesting_cache import NestingCache
+
+
+@pytest.fixture(autouse=True)
+def ambiente(tmp_path, monkeypatch):
+    # O cache fica no diretório de trabalho; a busca roda sem o pool de processos.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 1)
+
+
+def _peca(largura, altura, quantidade, **extra):
+    return dict({'forma': 'rectangle', 'largura': largura, 'altura': altura, 'quantidade': quantidade, 'furos': []}, **extra)
+
+
+def _chave(pecas, **extra):
+    parametros = dict(chapa_largura=3000, chapa_altura=1500, offset=10, margin=10, espessura=5, pecas=pecas, versao_motor=1)
+    parametros.update(extra)
+    return NestingCache.make_key(**parametros)
+
+
+def test_chave_independe_da_ordem_e_da_divisao_das_linhas():
+    a = [_peca(500, 300, 4), _peca(200.0, 100, 2)]
+    b = [_peca(200, 100.0001, 1), _peca(500, 300, 4), _peca(200, 100, 1)]
+    assert _chave(a) == _chave(b)
+    assert _chave(a) != _chave(a, offset=12)
+    assert _chave(a) != _chave([_peca(500, 300, 5), _peca(200, 100, 2)])
+
+
+def test_chave_muda_quando_o_dxf_e_editado(tmp_path):
+    dxf = tmp_path / 'peca.dxf'
+    dxf.write_text('0\nEOF\n')
+    os.utime(dxf, (1_000_000, 1_000_000))
+    pecas = [_peca(500, 300, 4, forma='dxf_shape', dxf_path=str(dxf))]
+    antes = _chave(pecas)
+    assert _chave(pecas) == antes
+
+    os.utime(dxf, (2_000_000, 2_000_000))
+    assert _chave(pecas) != antes
+
+
+def test_descarte_lru(tmp_path):
+    cache = NestingCache(str(tmp_path / 'cache'), max_entries=2)
+    cache.put('a', {'n': 1})
+    cache.put('b', {'n': 2})
+    os.utime(cache._entry_path('a'), (1, 1))
+    os.utime(cache._entry_path('b'), (2, 2))
+    assert cache.get('a') == {'n': 1}  # 'a' passa a ser a mais recente
+    cache.put('c', {'n': 3})
+
+    assert cache.get('b') is None
+    assert cache.get('a') == {'n': 1} and cache.get('c') == {'n': 3}
+
+
+def test_segundo_calculo_sai_do_cache(monkeypatch):
+    pecas = [_peca(510, 310, 20), _peca(300, 200, 10)]
+    primeiro = calculo_cortes.orquestrar_planos_de_corte(3000, 1500, pecas, 10, 10, 5, usar_historico_algoritmos=False)
+
+    def _falha(*args, **kwargs):
+        raise AssertionError("o job deveria sair do cache")
+    monkeypatch.setattr(calculo_cortes, 'calcular_plano_de_corte_em_bins', _falha)
+    segundo = calculo_cortes.orquestrar_planos_de_corte(3000, 1500, list(reversed(pecas)), 10, 10, 5, usar_historico_algoritmos=False)
+
+    assert segundo['total_chapas'] == primeiro['total_chapas']
+    assert segundo['chave_job'] == primeiro['chave_job']
@@ -0,0 +1,131 @@
+# test_nfp_engine.py
+
+import itertools
+import time
+import numpy as np
+import pytest
+from nfp_cache import NFPCache
+from nfp_engine import aninhar_formas, decompor_convexo, area_contorno, simplificar_contorno
+
+OFFSET = 4
+
+# Peças não convexas (L e U) e um triângulo: o encaixe depende dos NFPs, não dos bounding boxes.
+PECA_L = [(0, 0), (120, 0), (120, 40), (40, 40), (40, 100), (0, 100)]
+PECA_U = [(0, 0), (90, 0), (90, 80), (60, 80), (60, 30), (30, 30), (30, 80), (0, 80)]
+TRIANGULO = [(0, 0), (100, 0), (0, 70)]
+
+
+def _pecas(contorno, quantidade, rid_inicial):
+    contorno = simplificar_contorno(contorno)
+    largura, altura = max(x for x, _ in contorno), max(y for _, y in contorno)
+    return [{'rid': rid_inicial + i, 'contorno': contorno, 'largura': largura, 'altura': altura} for i in range(quantidade)]
+
+
+def _poligonos_colocados(chapa):
+    return [np.asarray(forma.contorno, dtype=float) + (x, y) for _, x, y, forma in chapa]
+
+
+def _dentro(ponto, poligono):
+    """Ponto estritamente dentro do polígono (par-ímpar); pontos na borda não contam."""
+    x, y = ponto
+    dentro = False
+    for (x1, y1), (x2, y2) in zip(poligono, np.roll(poligono, -1, axis=0)):
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1) - 1e-9:
+            dentro = not dentro
+    return dentro
+
+
+def _cruzam(a, b, c, d):
+    """Os segmentos ab e cd se cruzam propriamente (encostar não conta)."""
+    def cruz(o, p, q):
+        return (p[0] - o[0]) * (q[1] - o[1]) - (p[1] - o[1]) * (q[0] - o[0])
+    return (cruz(a, b, c) * cruz(a, b, d) < -1e-9) and (cruz(c, d, a) * cruz(c, d, b) < -1e-9)
+
+
+def _distancia_ponto_segmento(p, a, b):
+    ab, ap = b - a, p - a
+    t = np.clip(np.dot(ap, ab) / max(np.dot(ab, ab), 1e-12), 0, 1)
+    return float(np.hypot(*(ap - t * ab)))
+
+
+def _distancia(p, q):
+    """Menor distância entre dois polígonos disjuntos (sempre entre um vértice e uma aresta)."""
+    arestas_p = list(zip(p, np.roll(p, -1, axis=0)))
+    arestas_q = list(zip(q, np.roll(q, -1, axis=0)))
+    return min(min(_distancia_ponto_segmento(v, a, b) for v in p for a, b in arestas_q),
+               min(_distancia_ponto_segmento(v, a, b) for v in q for a, b in arestas_p))
+
+
+def _verificar_chapa(chapa, bid):
+    largura_util, altura_util = bid[0] - 2 * bid[2], bid[1] - 2 * bid[2]
+    poligonos = _poligonos_colocados(chapa)
+    for poligono in poligonos:
+        assert poligono[:, 0].min() >= OFFSET / 2 - 1e-6 and poligono[:, 1].min() >= OFFSET / 2 - 1e-6
+        assert poligono[:, 0].max() <= largura_util - OFFSET / 2 + 1e-6
+        assert poligono[:, 1].max() <= altura_util - OFFSET / 2 + 1e-6
+    for p, q in itertools.combinations(poligonos, 2):
+        arestas_p = list(zip(p, np.roll(p, -1, axis=0)))
+        arestas_q = list(zip(q, np.roll(q, -1, axis=0)))
+        assert not any(_cruzam(a, b, c, d) for a, b in arestas_p for c, d in arestas_q)
+        assert not any(_dentro(v, q) for v in p) and not any(_dentro(v, p) for v in q)
+        # Disjuntas, as peças ainda respeitam o espaçamento do offset entre os contornos.
+        assert _distancia(p, q) >= OFFSET - 1e-6
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return NFPCache(cache_path=str(tmp_path / "nfp_cache.json"))
+
+
+def test_decomposicao_convexa_preserva_a_area():
+    for contorno in (PECA_L, PECA_U, TRIANGULO):
+        partes = decompor_convexo(np.asarray(contorno, dtype=float))
+        assert sum(area_contorno(p) for p in partes) == pytest.approx(area_contorno(contorno))
+
+
+def test_pecas_aninhadas_nao_se_sobrepoem(cache):
+    pecas = _pecas(PECA_L, 6, 0) + _pecas(PECA_U, 5, 100) + _pecas(TRIANGULO, 8, 200)
+    bins = [(420, 300, 5)] * 10
+    chapas, nao_alocados = aninhar_formas(pecas, bins, OFFSET, cache=cache)
+
+    assert nao_alocados == []
+    assert sorted(rid for chapa in chapas for rid, *_ in chapa) == sorted(p['rid'] for p in pecas)
+    for chapa, bid in zip(chapas, bins):
+        _verificar_chapa(chapa, bid)
+
+
+def test_encaixe_pela_forma_real_usa_menos_chapas_que_os_bounding_boxes(cache):
+    # Dois triângulos retângulos se encaixam pela hipotenusa; pelas caixas só um caberia.
+    pecas = _pecas(TRIANGULO, 2, 0)
+    bins = [(110 + OFFSET + 10, 80 + OFFSET + 10, 5)] * 2
+    chapas, nao_alocados = aninhar_formas(pecas, bins, OFFSET, cache=cache)
+
+    assert nao_alocados == [] and len(chapas) == 1
+    _verificar_chapa(chapas[0], bins[0])
+
+
+def test_complementos_nao_abrem_chapas(cache):
+    pecas = _pecas(PECA_L, 1, 0)
+    complementos = _pecas(PECA_U, 20, 100)
+    bins = [(300, 250, 5)] * 5
+    chapas, nao_alocados = aninhar_formas(pecas, bins, OFFSET, cache=cache, complementos=complementos)
+
+    assert len(chapas) == 1
+    colocados = {rid for rid, *_ in chapas[0]}
+    assert 0 in colocados and len(colocados) > 1
+    assert set(nao_alocados) == {p['rid'] for p in complementos} - colocados
+    _verificar_chapa(chapas[0], bins[0])
+
+
+def test_peca_maior_que_a_chapa_fica_de_fora(cache):
+    pecas = _pecas(PECA_L, 1, 0)
+    chapas, nao_alocados = aninhar_formas(pecas, [(100, 100, 5)], OFFSET, cache=cache)
+    assert chapas == [] and nao_alocados == [0]
+
+
+def test_prazo_esgotado_devolve_as_pecas_restantes(cache):
+    pecas = _pecas(PECA_L, 3, 0)
+    complementos = _pecas(PECA_U, 5, 100)
+    chapas, nao_alocados = aninhar_formas(pecas, [(300, 250, 5)] * 3, OFFSET, cache=cache, complementos=complementos,
+                                          prazo=time.perf_counter())
+    assert chapas == [] and sorted(nao_alocados) == [0, 1, 2, 100, 101, 102, 103, 104]
@@ -0,0 +1,46 @@
+# test_padroes.py
+
+import itertools
+import calculo_cortes
+
+BIN = (3000, 1500, 10)
+
+
+def _retangulos(tipos, quantidade):
+    return [(w, h, rid) for rid, (w, h) in enumerate(t for t in tipos for _ in range(quantidade))]
+
+
+def _sobrepoem(a, b):
+    return a.x < b.x + b.width and b.x < a.x + a.width and a.y < b.y + b.height and b.y < a.y + a.height
+
+
+def test_job_pequeno_nao_usa_padroes():
+    assert calculo_cortes._solucao_por_padroes(_retangulos([(300, 200)], 100), [BIN] * 50) is None
+
+
+def test_padroes_repetidos_e_residuo_pequeno():
+    retangulos = _retangulos([(110 + 37 * i, 110 + 23 * i) for i in range(12)], 100)
+    chapas_fixas, residuo = calculo_cortes._solucao_por_padroes(retangulos, [BIN] * 200)
+
+    assert chapas_fixas and len(residuo) < len(retangulos)
+    # Cada peça sai uma única vez: nas chapas fixas ou no resíduo.
+    rids = [p.rid for _, chapa in chapas_fixas for p in chapa] + [r[2] for r in residuo]
+    assert sorted(rids) == [r[2] for r in retangulos]
+    # Poucos padrões distintos, cada um repetido em várias chapas.
+    padroes = {tuple(sorted((p.x, p.y, p.width, p.height) for p in chapa)) for _, chapa in chapas_fixas}
+    assert len(padroes) < len(chapas_fixas)
+    largura_util, altura_util = BIN[0] - 2 * BIN[2], BIN[1] - 2 * BIN[2]
+    for bid, chapa in chapas_fixas:
+        assert bid == BIN
+        # Padrões fracos ficam de fora: o resto vai para a busca completa.
+        assert sum(p.width * p.height for p in chapa) >= calculo_cortes.APROVEITAMENTO_MINIMO_PADRAO * largura_util * altura_util
+        assert all(p.x >= 0 and p.y >= 0 and p.x + p.width <= largura_util and p.y + p.height <= altura_util for p in chapa)
+        assert not any(_sobrepoem(a, b) for a, b in itertools.combinations(chapa, 2))
+
+
+def test_padroes_usam_so_as_chapas_do_primeiro_formato():
+    retangulos = _retangulos([(110 + 37 * i, 110 + 23 * i) for i in range(12)], 100)
+    bins = [BIN] * 3 + [(2000, 1000, 10)] * 100
+    chapas_fixas, _ = calculo_cortes._solucao_por_padroes(retangulos, bins)
+
+    assert 0 < len(chapas_fixas) <= 3
@@ -0,0 +1,40 @@
+# test_portfolio.py
+
+import os
+import numpy as np
+import pytest
+import calculo_cortes
+
+BIN = (3000, 1500, 10)
+MEDIDAS = [(834, 767, 1), (1053, 355, 1), (421, 215, 6), (1060, 352, 7), (1213, 204, 4), (126, 321, 7), (672, 286, 7),
+           (426, 173, 3), (1365, 732, 8), (359, 235, 1), (110, 314, 4), (439, 270, 5), (742, 303, 4)]
+
+
+@pytest.fixture(autouse=True)
+def sem_pool(monkeypatch):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 1)
+
+
+def _maior_sobra_da_chapa_menos_ocupada(chapas):
+    _, chapa = min(chapas, key=lambda c: sum(r.width * r.height for r in c[1]))
+    sobras = calculo_cortes.encontrar_sobras(BIN[0] - 2 * BIN[2], BIN[1] - 2 * BIN[2], np.array([r[:4] for r in chapa]))
+    return max(s['largura'] * s['altura'] for s in sobras)
+
+
+def test_empate_no_aproveitamento_fica_com_a_maior_sobra(monkeypatch):
+    # Sem a etapa de melhoria o vencedor é um algoritmo do portfólio, sem '+Melhoria'.
+    monkeypatch.setattr(calculo_cortes, '_tempo_melhoria', lambda num_pecas: 0)
+    pecas = [{'forma': 'rectangle', 'largura': w, 'altura': h, 'quantidade': q, 'furos': []} for w, h, q in MEDIDAS]
+    resultado = calculo_cortes.calcular_plano_de_corte_em_bins(pecas, 10, 5, [BIN] * 40)
+    total = resultado['total_chapas']
+    assert total > resultado['estatisticas_busca']['limite_inferior']
+
+    # Todos os algoritmos que fecham na mesma contagem empatam no aproveitamento (chapas iguais).
+    retangulos = [(w, h, rid) for rid, (w, h) in enumerate((w, h) for w, h, q in MEDIDAS for _ in range(q))]
+    maiores = {}
+    for algo in calculo_cortes.ALGORITMOS_PORTFOLIO:
+        chapas, _ = calculo_cortes._empacotar(algo, retangulos, [BIN] * total)
+        if chapas is not None and len(chapas) == total:
+            maiores[algo.__name__] = _maior_sobra_da_chapa_menos_ocupada(chapas)
+    assert len(set(maiores.values())) > 1
+    assert maiores[resultado['estatisticas_busca']['algoritmo_vencedor']] == max(maiores.values())
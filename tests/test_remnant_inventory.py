@@ -0,0 +1,59 @@
+# test_remnant_inventory.py
+
+import threading
+import pytest
+from remnant_inventory import RemnantInventory
+
+
+@pytest.fixture
+def estoque(tmp_path):
+    return RemnantInventory(db_path=str(tmp_path / "remnant_inventory.db"))
+
+
+def test_busca_filtra_por_espessura_e_dimensoes_em_qualquer_orientacao(estoque):
+    estoque.registrar(5, [{'largura': 300, 'altura': 800}, {'largura': 200, 'altura': 200}], origem="job 1")
+    estoque.registrar(8, [{'largura': 1000, 'altura': 1000}])
+
+    encontradas = estoque.buscar(5, menor_minimo=250, maior_minimo=500)
+    assert [(s['largura'], s['altura']) for s in encontradas] == [(800, 300)]
+    assert encontradas[0]['origem'] == "job 1"
+    assert [s['largura'] for s in estoque.buscar(5)] == [800, 200]  # da maior para a menor área
+    assert estoque.buscar(6) == []
+
+
+def test_sobra_consumida_nao_volta_a_ser_consumida(estoque):
+    ids = estoque.registrar(5, [{'largura': 500, 'altura': 400}, {'largura': 300, 'altura': 300}])
+
+    assert estoque.consumir([ids[0]], consumida_por="job 2")
+    assert [s['id'] for s in estoque.buscar(5)] == [ids[1]]
+    assert not estoque.consumir([ids[0]], consumida_por="job 3")
+    # Baixa em lote é tudo ou nada: a sobra ainda livre do lote continua no estoque.
+    assert not estoque.consumir(ids, consumida_por="job 3")
+    assert [s['id'] for s in estoque.buscar(5)] == [ids[1]]
+
+
+def test_nesting_com_sobra_ja_consumida_nao_grava_nada(estoque):
+    ids = estoque.registrar(5, [{'largura': 500, 'altura': 400}])
+    assert estoque.registrar_nesting(5, ids, [{'largura': 120, 'altura': 100}], origem="job A") is not None
+    assert estoque.registrar_nesting(5, ids, [{'largura': 150, 'altura': 100}], origem="job B") is None
+
+    assert [(s['largura'], s['origem']) for s in estoque.buscar(5)] == [(120, "job A")]
+
+
+def test_consumo_concorrente_baixa_a_sobra_uma_vez(estoque):
+    (sobra,) = estoque.registrar(5, [{'largura': 1000, 'altura': 500}])
+    inicio, resultados = threading.Barrier(8), []
+
+    def nesting(n):
+        inicio.wait()
+        resultados.append(estoque.registrar_nesting(5, [sobra], [{'largura': 100 + n, 'altura': 100}], origem=f"job {n}"))
+
+    threads = [threading.Thread(target=nesting, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    vencedores = [r for r in resultados if r is not None]
+    assert len(resultados) == 8 and len(vencedores) == 1
+    assert [s['id'] for s in estoque.buscar(5)] == vencedores[0]
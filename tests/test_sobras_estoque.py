@@ -0,0 +1,78 @@
+# test_sobras_estoque.py
+
+import os
+import pytest
+import calculo_cortes
+from remnant_inventory import RemnantInventory
+
+
+@pytest.fixture(autouse=True)
+def ambiente(tmp_path, monkeypatch):
+    # O estoque de sobras fica no diretório de trabalho; a busca roda sem o pool de processos.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 1)
+
+
+def _estoque(*sobras):
+    return RemnantInventory().registrar(5, [{'largura': w, 'altura': h} for w, h in sobras])
+
+
+def _calcular(pecas, **opcoes):
+    return calculo_cortes.orquestrar_planos_de_corte(3000, 1500, pecas, 10, 10, 5, usar_cache=False, usar_historico_algoritmos=False,
+                                                     usar_estoque_sobras=True, **opcoes)
+
+
+def _peca(largura, altura, quantidade):
+    return {'forma': 'rectangle', 'largura': largura, 'altura': altura, 'quantidade': quantidade, 'furos': []}
+
+
+@pytest.mark.parametrize('escala', [None, 100])
+def test_fluxo_abre_as_sobras_e_depois_as_chapas_inteiras(escala):
+    (sobra,) = _estoque((600, 500))
+    # A primeira peça não cabe na sobra: o fluxo não pode empacotar tudo como se fosse a sobra.
+    resultado = _calcular([_peca(1210, 810, 6), _peca(310, 210, 40)], modo_fluxo=True, escala_inteira=escala)
+
+    formatos = {(p['chapa_largura'], p['chapa_altura']) for p in resultado['planos_unicos']}
+    assert (3000, 1500) in formatos
+    assert sum(len(p['plano']) * p['repeticoes'] for p in resultado['planos_unicos']) == 46
+    assert [s['id'] for s in resultado['sobras_usadas']] in ([], [sobra])
+
+
+def test_fluxo_usa_a_sobra_uma_vez_so():
+    (sobra,) = _estoque((600, 500))
+    resultado = _calcular([_peca(310, 210, 60)], modo_fluxo=True)
+
+    planos_em_sobra = [p for p in resultado['planos_unicos'] if p['sobra_id'] is not None]
+    assert len(planos_em_sobra) == 1 and planos_em_sobra[0]['repeticoes'] == 1 and planos_em_sobra[0]['sobra_id'] == sobra
+    assert [s['id'] for s in resultado['sobras_usadas']] == [sobra]
+    assert resultado['total_chapas'] == 2
+
+
+def test_catalogo_com_o_job_inteiro_nas_sobras():
+    ids = _estoque((1000, 800), (1000, 800), (1000, 800))
+    resultado = _calcular([_peca(910, 710, 2)], catalogo_chapas=[{'largura': 3000, 'altura': 1500}, {'largura': 2000, 'altura': 1000}])
+
+    assert resultado['total_chapas'] == 2
+    assert len(resultado['sobras_usadas']) == 2 and {s['id'] for s in resultado['sobras_usadas']} <= set(ids)
+    assert resultado['estoque']['custo_total'] == 0
+
+
+@pytest.mark.parametrize('escala', [None, 100])
+def test_sobras_com_as_mesmas_medidas_viram_planos_separados(escala):
+    ids = _estoque((1000, 800), (1000, 800))
+    # Sobra com as medidas de um formato do catálogo e margem zero: só o id a distingue da chapa.
+    resultado = _calcular([_peca(480, 380, 8), _peca(2900, 1400, 1)], escala_inteira=escala)
+
+    assert sorted(p['sobra_id'] for p in resultado['planos_unicos'] if p['sobra_id'] is not None) == sorted(ids)
+    assert sorted(s['id'] for s in resultado['sobras_usadas']) == sorted(ids)
+    assert resultado['total_chapas'] == 3
+
+
+def test_grade_homogenea_continua_valendo_com_sobras_no_estoque():
+    (sobra,) = _estoque((640, 440))
+    resultado = _calcular([_peca(310, 210, 200)])
+
+    assert [s['id'] for s in resultado['sobras_usadas']] == [sobra]
+    # A sobra leva 4 peças; as 196 restantes saem da grade analítica das chapas inteiras.
+    assert resultado['estatisticas_busca']['algoritmo_vencedor'] == 'GradeAnalitica'
+    assert sum(len(p['plano']) * p['repeticoes'] for p in resultado['planos_unicos']) == 200
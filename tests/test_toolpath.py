@@ -0,0 +1,84 @@
+# test_toolpath.py
+
+import random
+import pytest
+from toolpath import sequenciar_plano, sequencia_do_plano
+
+
+def _peca(x, y, largura, altura, furos=(), forma='rectangle', **extras):
+    return dict({'x': x, 'y': y, 'largura': largura, 'altura': altura, 'forma': forma, 'diametro': 0,
+                 'furos': [{'diam': d, 'x': fx, 'y': fy} for d, fx, fy in furos]}, **extras)
+
+
+def _plano_com_furos(semente=0, colunas=6, linhas=4):
+    aleatorio = random.Random(semente)
+    plano = []
+    for i in range(colunas):
+        for j in range(linhas):
+            furos = [(10, aleatorio.uniform(15, 85), aleatorio.uniform(15, 65)) for _ in range(aleatorio.randint(0, 3))]
+            plano.append(_peca(20 + i * 120, 20 + j * 100, 100, 80, furos))
+    return plano
+
+
+def _verificar_furos_antes_do_externo(resultado):
+    posicao_externo = {}
+    for item in resultado['sequencia']:
+        if item['tipo'] == 'externo':
+            assert item['peca'] not in posicao_externo, "contorno externo cortado duas vezes"
+            posicao_externo[item['peca']] = item['ordem']
+    for item in resultado['sequencia']:
+        if item['tipo'] == 'furo':
+            assert item['ordem'] < posicao_externo[item['peca']]
+
+
+@pytest.mark.parametrize('semente', range(5))
+def test_furos_antes_do_contorno_externo(semente):
+    plano = _plano_com_furos(semente)
+    resultado = sequenciar_plano(plano, 1000, 500)
+
+    _verificar_furos_antes_do_externo(resultado)
+    total_contornos = len(plano) + sum(len(p['furos']) for p in plano)
+    assert resultado['perfuracoes'] == total_contornos == len(resultado['sequencia'])
+    assert [item['ordem'] for item in resultado['sequencia']] == list(range(1, total_contornos + 1))
+
+
+def test_sequencia_nao_piora_o_deslocamento_da_ordem_original():
+    resultado = sequenciar_plano(_plano_com_furos(), 1000, 500)
+    assert resultado['deslocamento_rapido'] <= resultado['deslocamento_original'] + 1e-6
+
+
+def test_entrada_em_um_dos_pontos_do_contorno():
+    plano = [_peca(100, 100, 50, 40, [(8, 25, 20)]), _peca(300, 50, 60, 60, forma='circle', diametro=60)]
+    resultado = sequenciar_plano(plano, 500, 300)
+    furo, externo_retangulo = (item for item in resultado['sequencia'] if item['peca'] == 0)
+    assert (furo['tipo'], externo_retangulo['tipo']) == ('furo', 'externo')
+    assert externo_retangulo['entrada'] in [tuple(map(float, p)) for p in externo_retangulo['pontos']]
+    circulo = next(item for item in resultado['sequencia'] if item['peca'] == 1)
+    cx, cy, r = circulo['circulo']
+    assert (cx, cy, r) == (330, 80, 30)
+    assert circulo['entrada'] in [(360.0, 80.0), (330.0, 50.0), (300.0, 80.0), (330.0, 110.0)]
+
+
+def test_bloco_de_linha_comum_e_um_contorno_so():
+    # Bloco 2x2 com kerf de 2 mm; os furos das peças do bloco vêm antes do contorno do bloco.
+    membros = [_peca(10 + c * 52, 10 + l * 32, 50, 30, [(6, 25, 15)] if (c, l) == (1, 1) else (), bloco=0)
+               for c in range(2) for l in range(2)]
+    plano = membros + [_peca(200, 10, 50, 30, [(6, 10, 10)])]
+    resultado = sequenciar_plano(plano, 400, 200)
+
+    _verificar_furos_antes_do_externo(resultado)
+    externos = [item for item in resultado['sequencia'] if item['tipo'] == 'externo']
+    assert len(externos) == 2
+    bloco = next(item for item in externos if item['peca'] == 0)
+    assert sorted(bloco['linhas']) == [((10, 41.0), (112, 41.0)), ((61.0, 10), (61.0, 72))]
+
+
+def test_sequencia_guardada_no_plano():
+    plano_info = {'plano': _plano_com_furos(), 'chapa_largura': 1000, 'chapa_altura': 500}
+    primeira = sequencia_do_plano(plano_info)
+    assert plano_info['sequencia_corte'] is primeira
+    assert sequencia_do_plano(plano_info) is primeira
+
+
+def test_plano_vazio():
+    assert sequenciar_plano([], 1000, 500)['perfuracoes'] == 0
@@ -0,0 +1,50 @@
+# test_viabilidade.py
+
+import os
+import pytest
+import calculo_cortes
+from calculo_cortes import PecasInviaveisError
+
+BINS = [(3000, 1500, 10)] * 5
+
+
+@pytest.fixture(autouse=True)
+def sem_pool(monkeypatch):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 1)
+
+
+def _peca(largura, altura, quantidade, nome=None):
+    return {'forma': 'rectangle', 'largura': largura, 'altura': altura, 'quantidade': quantidade, 'furos': [], 'nome_arquivo': nome}
+
+
+def test_peca_que_so_cabe_girada_e_viavel():
+    relatorio = calculo_cortes.analisar_viabilidade([_peca(1400, 2900, 1)], BINS)
+    assert relatorio == {'inviaveis': [], 'area_excedente': 0}
+
+
+def test_relatorio_traz_o_excesso_na_melhor_orientacao():
+    relatorio = calculo_cortes.analisar_viabilidade([_peca(500, 300, 2), _peca(3100, 1400, 1, 'grande.dxf')], BINS)
+
+    (item,) = relatorio['inviaveis']
+    assert item['indice'] == 1 and item['nome_arquivo'] == 'grande.dxf'
+    assert (item['excesso_largura'], item['excesso_altura']) == (120, 0)
+
+
+def test_area_total_maior_que_as_chapas():
+    relatorio = calculo_cortes.analisar_viabilidade([_peca(1400, 1400, 20)], BINS)
+    assert relatorio['inviaveis'] == [] and relatorio['area_excedente'] > 0
+
+
+def test_calculo_falha_na_hora_com_o_relatorio():
+    with pytest.raises(PecasInviaveisError) as erro:
+        calculo_cortes.calcular_plano_de_corte_em_bins([_peca(500, 300, 2), _peca(3100, 1400, 1)], 10, 5, BINS)
+    assert [item['indice'] for item in erro.value.relatorio['inviaveis']] == [1]
+    assert '120mm na largura' in str(erro.value)
+
+
+def test_aninhar_viaveis_deixa_as_inviaveis_de_fora():
+    resultado = calculo_cortes.calcular_plano_de_corte_em_bins([_peca(500, 300, 2), _peca(3100, 1400, 1)], 10, 5, BINS, aninhar_viaveis=True)
+
+    assert resultado['total_chapas'] == 1
+    assert sum(len(p['plano']) for p in resultado['planos_unicos']) == 2
+    assert [item['indice'] for item in resultado['pecas_inviaveis']] == [1]